@@ -0,0 +1,275 @@
+"""Benchmarks for the JA80 framer, decoder and state pipeline.
+
+Usage:
+    python benchmarks/bench_ja80.py [--output results.json] [--baseline baseline.json] [--save-baseline] [--tolerance 0.2]
+                                    [--skip-e2e]
+
+Results are printed as JSON. When a baseline file exists the results are compared against it and the exit code is 1
+if any benchmark regressed by more than the tolerance. The end-to-end benchmark runs the JablotronAlarm entity and
+needs Home Assistant, it is only left out with --skip-e2e.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import queue
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from custom_components.Jablotron80.ja80 import JA80TConnection  # noqa: E402
+from custom_components.Jablotron80.protocol import JA80  # noqa: E402
+
+SAMPLE_PACKETS = {
+    'AlarmStatus': ['ed 40 00 00 30 00 00 00 60 ff', 'ed 53 0c 00 3e 04 00 28 0b ff'],
+    'AlarmTimestamp': ['e3 02 01 23 36 08 09 3f ff', 'e3 02 01 23 37 01 03 3f ff'],
+    'KeyPress': ['81 ff', '8e ff'],
+    'Beep': ['a0 ff', 'a1 ff'],
+    'StateStatus': ['e8 01 02 ff', 'e8 01 03 ff'],
+}
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# results where a lower value is better, all other results are rates
+LOWER_IS_BETTER = ('e2e_latency_us', )
+
+
+def _packets(hex_packets):
+    return [bytes.fromhex(packet) for packet in hex_packets]
+
+
+def _rate(func, count, repeat=5):
+    # best of repeat runs, in calls per second
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(count)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return count / best
+
+
+def bench_decode(count):
+    results = {}
+    for name, hex_packets in SAMPLE_PACKETS.items():
+        packets = _packets(hex_packets)
+
+        def run(n, packets=packets):
+            # alternate packets so the repeat cache does not hide the decoder
+            system = JA80()
+            read_state = system.read_state
+            for i in range(n):
+                read_state(packets[i & 1])
+        results[name] = round(_rate(run, count))
+
+        def run_repeat(n, packet=packets[0]):
+            system = JA80()
+            read_state = system.read_state
+            for _ in range(n):
+                read_state(packet)
+        results[name + ' (repeat)'] = round(_rate(run_repeat, count))
+    return results
+
+
+class _BenchTransport():
+    """Serial like transport returning a fixed stream in chunks."""
+
+    is_open = True
+
+    def __init__(self, stream, chunk_size):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._pos = 0
+
+    @property
+    def in_waiting(self):
+        return min(self._chunk_size, len(self._stream) - self._pos)
+
+    def read(self, size=1):
+        data = self._stream[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def bench_framer(count, chunk_size=64):
+    packets = []
+    for hex_packets in SAMPLE_PACKETS.values():
+        packets.extend(_packets(hex_packets))
+    stream = b''.join(packets) * (count // len(packets))
+
+    def run(n):
+        connection = JA80TConnection('bench', queue.Queue())
+        connection.connection = _BenchTransport(stream, chunk_size)
+        remaining = len(stream)
+        while remaining > 0:
+            remaining -= connection.connection.in_waiting
+            connection.read_send_packets()
+
+    return {'bytes_per_sec': round(_rate(run, 1) * len(stream))}
+
+
+class _FakeBus():
+
+    def async_listen(self, event_type, listener):
+        return lambda: None
+
+
+class _FakeHass():
+    """The parts of Home Assistant the JablotronAlarm entity uses outside of its state updates."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.bus = _FakeBus()
+        self.data = {}
+
+
+def bench_e2e(count):
+    # latency from the last byte of a status packet to the state update in Home Assistant, through the real
+    # JablotronAlarm and its connection; the packets are fed from a thread like _connection_loop does
+    from custom_components.Jablotron80 import alarm_control_panel as acp
+
+    loop = asyncio.new_event_loop()
+    published = threading.Event()
+    latencies = []
+    sent = [None]
+
+    async def create():
+        # the port does not exist, the I/O thread of the entity waits for it until the entity is shut down
+        alarm = acp.JablotronAlarm(_FakeHass(loop), {
+            acp.CONF_NAME: 'bench',
+            acp.CONF_SERIAL_PORT: os.path.join(os.path.dirname(os.path.abspath(__file__)), 'no-such-port'),
+            acp.CONF_CODE_SENSOR_NAMES: {},
+            acp.CONF_PUBLISH_WINDOW: 0,
+        })
+
+        def on_update():
+            # the entity is not added to Home Assistant, stop at the point it would write its state
+            latencies.append(time.perf_counter() - sent[0])
+            published.set()
+        alarm._async_update = on_update
+        return alarm
+
+    alarm = loop.run_until_complete(create())
+    while alarm._connection is None or alarm._system is None:
+        time.sleep(0.01)
+    packets = _packets(SAMPLE_PACKETS['AlarmStatus'])
+
+    def io_thread():
+        try:
+            for i in range(count):
+                published.clear()
+                sent[0] = time.perf_counter()
+                for packet in alarm._connection.handle_data(packets[i & 1]):
+                    alarm._handle_packet(packet)
+                if not published.wait(5):
+                    break
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+    thread = threading.Thread(target=io_thread)
+    thread.start()
+    loop.run_forever()
+    thread.join()
+    alarm.shutdown_threads(None)
+    alarm._io_pool_exc.shutdown()
+    loop.close()
+
+    if len(latencies) < count:
+        raise RuntimeError('Only %s of %s states were published' % (len(latencies), count))
+    latencies = sorted(latency * 1000000 for latency in latencies)
+    return {
+        'p50': round(statistics.median(latencies), 1),
+        'p95': round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        'max': round(latencies[-1], 1),
+    }
+
+
+def environment():
+    # results are only comparable on the same machine
+    return {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for group, values in baseline.items():
+        if group == 'environment':
+            if values != results.get(group):
+                print('Baseline from another environment %s' % values, file=sys.stderr)
+            continue
+        if group not in results:
+            print('Not compared, %s is missing from the results' % group, file=sys.stderr)
+            continue
+        for name, base in values.items():
+            value = results[group].get(name)
+            if not isinstance(base, (int, float)) or not isinstance(value, (int, float)):
+                continue
+            if group in LOWER_IS_BETTER:
+                regressed = value > base * (1 + tolerance)
+            else:
+                regressed = value < base * (1 - tolerance)
+            if regressed:
+                regressions.append('%s/%s: %s (baseline %s)' % (group, name, value, base))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JA80 benchmarks')
+    parser.add_argument('--count', type=int, default=20000, help='packets per decoder benchmark')
+    parser.add_argument('--output', help='write results to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression, 0.2 = 20%%')
+    parser.add_argument('--skip-e2e', action='store_true', help='skip the end-to-end benchmark, it needs Home Assistant')
+    args = parser.parse_args()
+
+    results = {
+        'environment': environment(),
+        'decode_packets_per_sec': bench_decode(args.count),
+        'framer': bench_framer(args.count),
+    }
+    if not args.skip_e2e:
+        try:
+            results['e2e_latency_us'] = bench_e2e(min(args.count, 500))
+        except ImportError as ex:
+            parser.error('the end-to-end benchmark needs Home Assistant (%s), install it or pass --skip-e2e' % ex)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(output + '\n')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,8 @@
-"""The Jablotron component."""
\ No newline at end of file
+"""The Jablotron component."""
+from .const import DATA_HASS_CONFIG
+
+
+async def async_setup(hass, config):
+    # the platforms only get their own config, async_load_platform of the binary sensors needs the full config
+    hass.data[DATA_HASS_CONFIG] = config
+    return True
@@ -0,0 +1,26 @@
+"""Map the states decoded by protocol.py to Home Assistant alarm states."""
+from .const import (
+    STATE_ALARM_ARMED_AWAY, STATE_ALARM_ARMING, STATE_ALARM_DISARMED, STATE_ALARM_DISARMING, STATE_ALARM_TRIGGERED)
+from .protocol import JA80State
+
+HASS_STATES = {
+    JA80State.UNKNOWN: 'STATE_UNKNOWN',
+    JA80State.DISARMED: STATE_ALARM_DISARMED,
+    JA80State.ARMED: STATE_ALARM_ARMED_AWAY,  # the panel does not tell the armed mode
+    JA80State.EXIT_DELAY: STATE_ALARM_ARMING,
+    JA80State.ENTRY_DELAY: STATE_ALARM_DISARMING,
+    JA80State.TRIGGERED: STATE_ALARM_TRIGGERED,
+    JA80State.ARMING: STATE_ALARM_ARMING,
+    JA80State.DISARMING: STATE_ALARM_DISARMING,
+    # not Home Assistant alarm states, passed on as before
+    JA80State.TAMPER_TRIGGERED: 'STATE_TAMPER_ALARM_TRIGGERED',
+    JA80State.TAMPER_SENSORS_OK: 'STATE_TAMPER_SENSORS_OK',
+    JA80State.CANCEL_ALARM: 'CANCEL_ALARM',
+}
+
+
+def hass_state(state):
+    # JA80.read_state result > Home Assistant state, None (nothing decoded) and False (malformed) are returned as is
+    if state is None or state is False:
+        return state
+    return HASS_STATES[state]
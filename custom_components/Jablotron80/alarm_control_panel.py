@@ -6,6 +6,7 @@ import voluptuous as vol
 import asyncio
 import threading
 import json
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import timedelta, datetime
 
 import homeassistant.components.alarm_control_panel as alarm
@@ -18,18 +19,37 @@ from homeassistant.components.alarm_control_panel.const import (
     SUPPORT_ALARM_ARM_AWAY, SUPPORT_ALARM_ARM_HOME, SUPPORT_ALARM_TRIGGER, SUPPORT_ALARM_ARM_NIGHT
     )
 from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.discovery import async_load_platform
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.typing import ConfigType, HomeAssistantType
+from homeassistant.util import slugify
 from homeassistant.components.sensor import PLATFORM_SCHEMA
 
-import queue
 #import importlib
 #import_module('homeassistant.custom_components.jablotron80.ja80')
-from .ja80 import JA80
+from .const import (
+    ACTION_ARM_AWAY, ACTION_ARM_HOME, ACTION_ARM_NIGHT, ACTION_DISARM, ACTION_DISARM_CODE, DATA_HASS_CONFIG,
+    DATA_SENSOR_ROUTERS, DOMAIN)
+from .adapter import hass_state
 from .ja80 import JA80TConnection
-from .ja80 import JA80AlarmStatus
-from .ja80 import JA80AlarmTimestamp
+from .ja80 import JA80CommandQueue
+from .ja80 import JA80TSupervisor
+from .protocol import JA80
+from .protocol import JA80AlarmStatus
+from .protocol import JA80AlarmTimestamp
+from .protocol import MSG_DISPATCH
+from .protocol import ALARM_TIMESTAMP_SCHEMA
+from .protocol import EVENT_TYPE_NAMES
+from .protocol import encode_command
+from .history import JA80EventHistory
+from .tamper import JA80TamperFilter
+from .reactor import JA80Reactor
+from .router import JA80SensorRouter
+from .metrics import JA80Metrics
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -39,8 +59,23 @@ CONF_CODE_PANEL_DISARM_REQUIRED = 'code_panel_disarm_required'
 CONF_CODE_ARM_REQUIRED = 'code_arm_required'
 CONF_CODE_DISARM_REQUIRED = 'code_disarm_required'
 CONF_CODE_SENSOR_NAMES = 'sensor_names'
+CONF_IO_MODE = 'io_mode'
+CONF_WIRE_TRACE = 'wire_trace'
+CONF_PUBLISH_WINDOW = 'publish_window'
+CONF_CAPTURE_FILE = 'capture_file'
+CONF_DIAGNOSTICS = 'diagnostics'
+CONF_HISTORY_SIZE = 'history_size'
+CONF_TAMPER_THRESHOLD = 'tamper_threshold'
+CONF_TAMPER_WINDOW = 'tamper_window'
+CONF_KEY_RETRIES = 'key_retries'
+CONF_LAST_EVENTS = 'last_events'
+
+IO_MODE_THREAD = 'thread'  # blocking serial reads in a worker thread
+IO_MODE_ASYNCIO = 'asyncio'  # serial port is read from the Home Assistant event loop
+IO_MODE_REACTOR = 'reactor'  # one I/O thread shared by all panels
 
 DEFAULT_NAME = 'Jablotron Alarm'
+DEFAULT_HISTORY_SIZE = 500
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Required(CONF_SERIAL_PORT): cv.string,
     vol.Optional(CONF_CODE): cv.string,
@@ -50,45 +85,169 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_CODE_PANEL_DISARM_REQUIRED, default=True): cv.boolean,
     vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
     vol.Optional(CONF_CODE_SENSOR_NAMES, default={}): {int: cv.string},
+    vol.Optional(CONF_IO_MODE, default=IO_MODE_THREAD): vol.In([IO_MODE_THREAD, IO_MODE_ASYNCIO, IO_MODE_REACTOR]),
+    vol.Optional(CONF_WIRE_TRACE, default=False): cv.boolean,
+    vol.Optional(CONF_PUBLISH_WINDOW, default=1.0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_CAPTURE_FILE): cv.string,
+    vol.Optional(CONF_DIAGNOSTICS, default=False): cv.boolean,
+    vol.Optional(CONF_HISTORY_SIZE, default=DEFAULT_HISTORY_SIZE): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional(CONF_TAMPER_THRESHOLD, default=0): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    vol.Optional(CONF_TAMPER_WINDOW, default=10): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_KEY_RETRIES, default=0): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    vol.Optional(CONF_LAST_EVENTS, default=0): vol.All(vol.Coerce(int), vol.Range(min=0)),
 })
 
 ATTR_CHANGED_BY = "changed_by"
 ATTR_CODE_ARM_REQUIRED = "code_arm_required"
 ATTR_TRIGGERD_BY = "triggered_by"
+ATTR_METRICS = "metrics"
+ATTR_LAST_EVENTS = "last_events"
+ATTR_LEDS = "leds"
+ATTR_STALE = "stale"
 
-JABLOTRON_KEY_MAP = {
-    "0": b'\x80',
-    "1": b'\x81',
-    "2": b'\x82',
-    "3": b'\x83',
-    "4": b'\x84',
-    "5": b'\x85',
-    "6": b'\x86',
-    "7": b'\x87',
-    "8": b'\x88',
-    "9": b'\x89',
-    "#": b'\x8e',
-    "?": b'\x8e',
-    "*": b'\x8f'
+LAST_EVENTS_COUNT = 10  # events kept in the snapshot
+
+SNAPSHOT_DELAY = 1  # seconds changes are collected before the snapshot is written
+SNAPSHOT_VERSION = 1
+SNAPSHOT_KEY = 'jablotron80.{}'  # .storage file of a panel, by slug of its name
+
+EVENT_TAMPER_SUPPRESSED = 'jablotron80_tamper_suppressed'
+TAMPER_CANCEL_TIMEOUT = 15  # seconds the triggered state is held back while a tamper alarm is cancelled
+
+# key sequence to re-arm the panel in the mode it was armed in
+ARM_ACTIONS = {
+    STATE_ALARM_ARMED_AWAY: ACTION_ARM_AWAY,
+    STATE_ALARM_ARMED_HOME: ACTION_ARM_HOME,
+    STATE_ALARM_ARMED_NIGHT: ACTION_ARM_NIGHT,
 }
 
+# states the panel stays in, a snapshot of a transient state (e.g. triggered or arming) is not restored at startup
+SNAPSHOT_STATES = (STATE_ALARM_DISARMED, ) + tuple(ARM_ACTIONS)
+
+# seconds to wait for the panel to report the requested state, arming includes the exit delay
+COMMAND_TIMEOUT_DISARM = 10
+COMMAND_TIMEOUT_ARM = 40
+
+DIAGNOSTICS_INTERVAL = timedelta(seconds=60)
+
+DATA_REACTOR = 'jablotron80_reactor'
+
+STATE_NO_SIGNAL = 'No Signal'
+
+# states that are published immediately, bypassing the publish window
+PRIORITY_STATES = (STATE_ALARM_TRIGGERED, )
+
+
+class JablotronStatePublisher():
+    """Coalesce state changes within a time window into a single Home Assistant state write."""
+
+    def __init__(self, loop, publish_callback, window, priority_states=PRIORITY_STATES):
+        self._loop = loop
+        self._publish_callback = publish_callback
+        self._window = window
+        self._priority_states = priority_states
+        self._published = None
+        self._pending = None
+        self._timer = None
+
+    def submit(self, state):
+        # must be called from the event loop
+        if self._window <= 0 or state in self._priority_states:
+            self._publish(state)
+            return
+
+        # keep the last state seen in the window, earlier (transient) states are dropped
+        self._pending = state
+        if self._timer is None:
+            self._timer = self._loop.call_later(self._window, self._flush)
+
+    def _flush(self):
+        self._timer = None
+        self._publish(self._pending)
+
+    def _publish(self, state):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending = None
+        if state == self._published:
+            # state flapped back within the window, nothing to write
+            return
+        self._published = state
+        self._publish_callback(state)
+
+
+class JablotronCommand():
+    """Arm or disarm command sent to the panel, the future resolves when the panel reports the requested state.
+
+    The future fails with a HomeAssistantError when the state is not reached in time, when the panel does not accept
+    the keys or when arming is cancelled. Must be used from the event loop.
+    """
+
+    def __init__(self, loop, desired_state, timeout):
+        self.desired_state = desired_state
+        self.future = loop.create_future()
+        self.started_at = time.perf_counter()
+        self._arming = False
+        self._timer = loop.call_later(timeout, self.fail, 'Timed out after %ss waiting for state %s'
+                                      % (timeout, desired_state))
+
+    def update(self, state):
+        # called with every state change decoded from the panel
+        if self.future.done():
+            return
+        if state == self.desired_state or (self.desired_state in ARM_ACTIONS and state in ARM_ACTIONS):
+            # the panel reports all armed modes as armed away
+            self._finish()
+            self.future.set_result(state)
+        elif state == STATE_ALARM_ARMING:
+            self._arming = True
+        elif self._arming and state == STATE_ALARM_DISARMED and self.desired_state in ARM_ACTIONS:
+            self.fail('Arming was cancelled by the panel')
+
+    def fail(self, reason):
+        if self.future.done():
+            return
+        self._finish()
+        self.future.set_exception(HomeAssistantError(reason))
+
+    def _finish(self):
+        self._timer.cancel()
+
+
 async def async_setup_platform(hass: HomeAssistantType, config: ConfigType,
                                async_add_entities, discovery_info=None):
 
-    async_add_entities([JablotronAlarm(hass, config)])
+    # the last known state, shown as stale until the panel confirms it
+    store = Store(hass, SNAPSHOT_VERSION, SNAPSHOT_KEY.format(slugify(config[CONF_NAME])))
+    snapshot = await store.async_load()
+
+    alarm = JablotronAlarm(hass, config, store, snapshot)
+    async_add_entities([alarm])
+
+    if config[CONF_CODE_SENSOR_NAMES]:
+        # binary sensors of the named sensors, fed by the router of this panel
+        hass.data.setdefault(DATA_SENSOR_ROUTERS, {})[config[CONF_NAME]] = alarm._router
+        hass.async_create_task(async_load_platform(hass, 'binary_sensor', DOMAIN, {
+            CONF_NAME: config[CONF_NAME],
+            CONF_CODE_SENSOR_NAMES: config[CONF_CODE_SENSOR_NAMES],
+        }, hass.data[DATA_HASS_CONFIG]))
 
 
 class JablotronAlarm(alarm.AlarmControlPanelEntity):
     """Representation of a Jabltron alarm status."""
 
-    def __init__(self, hass, config):
+    def __init__(self, hass, config, store=None, snapshot=None):
         """Init the Alarm Control Panel."""
-        self._state = None
+        self._state = None  # state published to Home Assistant
+        self._decoded_state = None  # last state decoded from the JA80
         self._sub_state = None
         self._changed_by = None
         self._triggered_by = None
+        self._last_trigger_time = None
         self._name = config.get(CONF_NAME)
         self._serial_port = config.get(CONF_SERIAL_PORT)
+        self._io_mode = config.get(CONF_IO_MODE, IO_MODE_THREAD)
         self._available = False
         self._code = config.get(CONF_CODE)
         self._connection = None  # serial connection handle
@@ -98,24 +257,51 @@ class JablotronAlarm(alarm.AlarmControlPanelEntity):
         self._model = 'Unknown'
         self._lock = threading.BoundedSemaphore()
         self._stop = threading.Event()
-        self._updated = asyncio.Event()
-        self._desired_state_updated = asyncio.Event()
-        self._wait_task = None
-        self._command_q = queue.Queue()
-        # self._tamper_treshold = config.get(CONF_CODE)
-        # self._tamper_window = config.get(CONF_CODE)
+        self._command = None  # JablotronCommand waiting for the panel to reach its state
+        self._command_q = JA80CommandQueue()
+        self._metrics = JA80Metrics()
+        self._decoded_at = None
+        self._reactor = None
+        self._reactor_panel = None
+        self._history = JA80EventHistory(config.get(CONF_HISTORY_SIZE, DEFAULT_HISTORY_SIZE))
+        # tamper window is configured in minutes
+        self._tamper_filter = JA80TamperFilter(config.get(CONF_TAMPER_THRESHOLD, 0), config.get(CONF_TAMPER_WINDOW, 10) * 60)
+        self._tamper_cancel_at = None  # monotonic time a tamper alarm cancel was started
+        self._armed_state = None  # mode the panel was armed in, to re-arm it after a cancelled tamper alarm
+        self._router = JA80SensorRouter()
+        self._store = store  # Store of the snapshot, None to not save it
+        self._stale = False  # state restored from the snapshot, not confirmed by the panel yet
+        self._known_state = None  # last state in SNAPSHOT_STATES, saved in the snapshot
+        self._restored_leds = None
+        if snapshot is not None:
+            self._restore_snapshot(snapshot)
 
         try:
             hass.bus.async_listen('homeassistant_stop', self.shutdown_threads)
 
-            from concurrent.futures import ThreadPoolExecutor
-            self._io_pool_exc = ThreadPoolExecutor(max_workers=5)
+            self.loop = asyncio.get_running_loop()
+
+            self._publisher = JablotronStatePublisher(self.loop, self._async_publish_state, config.get(CONF_PUBLISH_WINDOW, 1.0))
 
-            self._loop_future = self._io_pool_exc.submit(self._connection_loop)
+            if config.get(CONF_DIAGNOSTICS, False):
+                # refresh the metrics attribute, also when the state does not change
+                async_track_time_interval(hass, self._async_refresh_metrics, DIAGNOSTICS_INTERVAL)
 
-            self.loop = asyncio.get_running_loop()
+            if self._io_mode == IO_MODE_ASYNCIO:
+                self._loop_future = self.loop.create_task(self._async_connection())
+            elif self._io_mode == IO_MODE_REACTOR:
+                self._reactor = hass.data.get(DATA_REACTOR)
+                if self._reactor is None:
+                    self._reactor = hass.data[DATA_REACTOR] = JA80Reactor()
+                self._connection = self._create_connection()
+                self._system = JA80()  # holds the JA80 alarm system's specific logic
+                self._model = 'Jablotron Oasis JA-82K'
+                self._reactor_panel = self._reactor.add(self._connection, self._handle_packet, self._handle_signal)
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+                self._io_pool_exc = ThreadPoolExecutor(max_workers=5)
 
-            self.loop.create_task(self.state_loop())
+                self._loop_future = self._io_pool_exc.submit(self._connection_loop)
 
         except Exception as ex:
             _LOGGER.error('Unexpected error: %s', format(ex))
@@ -125,8 +311,26 @@ class JablotronAlarm(alarm.AlarmControlPanelEntity):
         _LOGGER.debug('handle_shutdown() called')
 
         self._stop.set()
-        if self._wait_task is not None:
-            self._wait_task.cancel()
+        if self._command is not None:
+            self.loop.call_soon_threadsafe(self._command.fail, 'Home Assistant is stopping')
+
+        if self._io_mode == IO_MODE_ASYNCIO:
+            # closing the transport ends _async_connection, wait until the transport reports it is closed
+            if self._connection is not None:
+                future = asyncio.run_coroutine_threadsafe(self._connection.async_disconnect(), self.loop)
+                try:
+                    future.result(5)
+                except FutureTimeoutError:
+                    future.cancel()
+                    _LOGGER.warning('Timeout waiting for the connection to JA80 to close')
+            _LOGGER.debug('exiting handle_shutdown()')
+            return
+
+        if self._io_mode == IO_MODE_REACTOR:
+            if self._reactor_panel is not None:
+                self._reactor.remove(self._reactor_panel)
+            _LOGGER.debug('exiting handle_shutdown()')
+            return
 
         self._command_q.put(None)
 
@@ -159,7 +363,8 @@ class JablotronAlarm(alarm.AlarmControlPanelEntity):
 
     @property
     def available(self):
-        return self._available
+        # a restored state is shown until the panel is heard from, marked with the stale attribute
+        return self._available or self._stale
 
     @property
     def code_format(self):
@@ -189,75 +394,305 @@ class JablotronAlarm(alarm.AlarmControlPanelEntity):
             ATTR_CHANGED_BY: self.changed_by,
             ATTR_CODE_ARM_REQUIRED: self.code_arm_required,
             ATTR_TRIGGERD_BY: self.triggered_by,
+            ATTR_LEDS: self.leds,
+            ATTR_STALE: self._stale,
         }
+        if self._config.get(CONF_LAST_EVENTS, 0):
+            # opt-in, the events are written with every state change
+            state_attr[ATTR_LAST_EVENTS] = self.get_events(self._config[CONF_LAST_EVENTS])
+        if self._config.get(CONF_DIAGNOSTICS, False):
+            state_attr[ATTR_METRICS] = self.metrics
         return state_attr
 
-    async def _update(self):
+    @property
+    def metrics(self):
+        """Return a snapshot of the data path counters and latency histograms."""
+        snapshot = self._metrics.snapshot(MSG_DISPATCH, self._connection, self._system)
+        if self._reactor is not None:
+            snapshot['reactor'] = dict(self._reactor.stats)
+        return snapshot
+
+    @property
+    def leds(self):
+        """Return the LEDs of the keypad as last reported by the panel."""
+        status = self._system.current_alarm_status if self._system is not None else None
+        if status is None:
+            return self._restored_leds
+        return {
+            'a': status.led_a,
+            'b': status.led_b,
+            'c': status.led_c,
+            'backlight': status.led_backlight,
+            'warning': status.led_warning,
+        }
+
+    def get_events(self, count=LAST_EVENTS_COUNT, sensor_id=None, event_type=None, seconds=None):
+        """Return the last count events, optionally of one sensor or event type, or all events of the last seconds."""
+        if seconds is not None:
+            records = reversed(self._history.since(seconds))
+        else:
+            records = self._history.last(count, sensor_id, event_type)
+        sensor_names = self._config[CONF_CODE_SENSOR_NAMES]
+        return [{
+            'time': datetime.fromtimestamp(record.received).isoformat(timespec='seconds'),
+            'panel_time': record.timestamp,
+            'event': EVENT_TYPE_NAMES[record.event_type],
+            'event_type': record.event_type,
+            'sensor_id': record.source,
+            'sensor': sensor_names.get(record.source, '?'),
+        } for record in records]
+
+    @callback
+    def _async_refresh_metrics(self, now=None):
+        self.async_schedule_update_ha_state()
+
+    @callback
+    def _async_publish_state(self, state):
+
+        _LOGGER.debug('Publishing state %s', state)
+        if self._decoded_at is not None:
+            self._metrics.publish.observe(time.perf_counter() - self._decoded_at)
+        self._state = state
+        self._stale = False
+        self._async_update()
+        if state in SNAPSHOT_STATES:
+            self._known_state = state
+            self._schedule_snapshot()
+
+    def _restore_snapshot(self, snapshot):
+        self._history.restore(snapshot.get('events', ()))
+        state = snapshot.get('state')
+        if state not in SNAPSHOT_STATES:
+            _LOGGER.info('Not restoring state %s saved at %s', state, snapshot.get('saved'))
+            return
+        _LOGGER.info('Restoring state %s saved at %s', state, snapshot.get('saved'))
+        self._state = self._known_state = state
+        self._changed_by = snapshot.get('changed_by')
+        if state in ARM_ACTIONS:
+            self._armed_state = snapshot.get('armed_state')
+        self._restored_leds = snapshot.get('leds')
+        self._stale = True
+
+    @callback
+    def _snapshot_data(self):
+        records = reversed(self._history.last(LAST_EVENTS_COUNT))
+        return {
+            'saved': time.time(),
+            'state': self._known_state,
+            'changed_by': self._changed_by,
+            'armed_state': self._armed_state,
+            'leds': self.leds,
+            'events': [(record.received, record.timestamp, record.event_type, record.source) for record in records],
+        }
+
+    @callback
+    def _schedule_snapshot(self):
+        # the store writes the changes within SNAPSHOT_DELAY at once, and a pending write when Home Assistant stops
+        if self._store is not None:
+            self._store.async_delay_save(self._snapshot_data, SNAPSHOT_DELAY)
+
+    @callback
+    def _async_update(self):
 
         # _LOGGER.debug('_update called, state: %s', self._state )
-        self._updated.set()
         self.async_schedule_update_ha_state()
         # _LOGGER.debug('_update exited, state: %s', self._state )
-        
+
+    async def _async_connection(self):
+
+        try:
+            self._connection = self._create_connection()
+            self._system = JA80()  # holds the JA80 alarm system's specific logic
+            self._model = 'Jablotron Oasis JA-82K'
+            # connects and keeps reconnecting until we are stopped
+            supervisor = JA80TSupervisor(self._connection, self._stop)
+            await supervisor.async_run(self.loop, self._handle_packet, self._handle_signal)
+
+        except Exception as ex:
+            _LOGGER.error('Unexpected error: %s', format(ex))
+
+        finally:
+            _LOGGER.debug('exiting _async_connection()')
+
+    def _create_connection(self):
+        connection = JA80TConnection(
+            self._serial_port, self._command_q,
+            wire_trace=self._config.get(CONF_WIRE_TRACE, False),
+            capture_file=self._config.get(CONF_CAPTURE_FILE),
+            metrics=self._metrics,
+            key_retries=self._config.get(CONF_KEY_RETRIES, 0))
+        # called from the I/O thread, or from the event loop in asyncio mode
+        connection.transmitter.on_abort = lambda key: self._hass.loop.call_soon_threadsafe(
+            self._fail_command, 'The panel did not accept key %s' % key)
+        return connection
+
+    def _handle_signal(self, signal):
+
+        if not signal:
+            self._available = False
+            self._handle_state(STATE_NO_SIGNAL)
+
     def _connection_loop(self):
 
         try:
-            # try to create serial connection and provide command queue ref
-            self._connection = JA80TConnection(self._serial_port, self._command_q)
-            self._connection.connect()
+            # create serial connection and provide command queue ref, the queue is kept over reconnects
+            self._connection = self._create_connection()
             self._system = JA80()  # holds the JA80 alarm system's specific logic
             self._model = 'Jablotron Oasis JA-82K'
 
-            lastTriggerTime = None
-
-            while not self._stop.is_set():
-
-                # read next packet and send command if we have one queued
-                event_data = self._connection.read_send_packet()
-                if event_data is False:
-                    # error occured during reading, should not happen
-                    self._available = False
-                    new_state = 'No Signal'
-                elif event_data is None:
-                    # no event or unrecognised data; ignore and do a new read
-                    continue
-                else: 
-                    self._available = True
-                    new_state = self._system.read_state(event_data)
-                    if new_state is None:
-                        # no state or irrelevant/ignored event, do a new read
-                        continue
-                    if self._system.sensor_id is not None:
-                        self._triggered_by = "%s: %s" % (self._system.sensor_id, self._config[CONF_CODE_SENSOR_NAMES].get(self._system.sensor_id, '?'))
-
-                if new_state != self._state:
-                    _LOGGER.info("Jablotron state change detected: %s to %s", self._state, new_state)
-                    if new_state == STATE_ALARM_TRIGGERED and self._triggered_by is None:
-                        _LOGGER.debug("Alarm triggered but source not known yet")
-
-                        # wait for _triggered_by to be set before returning triggered state, but not more that 10 seconds
-                        if lastTriggerTime is not None and (datetime.now() - lastTriggerTime).seconds < 10:
-                            continue
-                        elif lastTriggerTime is None:
-                            lastTriggerTime = datetime.now()
-                            continue
-
-                    elif new_state == STATE_ALARM_DISARMED:
-                        lastTriggerTime = None  # clear last trigger time
-                        self._triggered_by = None  # clear triggered_by
-                        self._system.sensor_id = None
-
-                    # Update state & notify home assistant
-                    self._state = new_state
-                    asyncio.run_coroutine_threadsafe(self._update(), self._hass.loop)
+            # read all available packets and send command if we have one queued,
+            # reconnects when the connection fails until we are stopped
+            supervisor = JA80TSupervisor(self._connection, self._stop)
+            supervisor.run(self._handle_packet, self._handle_signal)
 
         except Exception as ex:
             _LOGGER.error('Unexpected error: %s', format(ex))
 
         finally:
-            self._connection.close()
+            if self._connection is not None:
+                self._connection.disconnect()
             _LOGGER.debug('exiting read_loop()')
 
+    def _handle_packet(self, event_data):
+
+        self._available = True
+        start = time.perf_counter()
+        decoded = self._system.read_state(event_data)
+        self._metrics.record_packet(event_data[0], decoded, time.perf_counter() - start)
+        new_state = hass_state(decoded)
+        if new_state is None:
+            # no state or irrelevant/ignored event
+            return
+        if event_data[0] == ALARM_TIMESTAMP_SCHEMA.msg_type and new_state is not False:
+            event = self._system.last_event
+            self._history.append(event)
+            self._update_sensors(self._router.route_event(event))
+            if self._io_mode == IO_MODE_ASYNCIO:
+                self._schedule_snapshot()
+            else:
+                self._hass.loop.call_soon_threadsafe(self._schedule_snapshot)
+            if event.event_type == JA80AlarmTimestamp.EVENT_TAMPER_ALARM:
+                if self._tamper_filter.record(event.event_source):
+                    if not self._tamper_cancelling():
+                        self._cancel_tamper_alarm(event.event_source)
+                    return
+                # above the threshold or another sensor, this alarm is reported also while one is cancelled
+                self._tamper_cancel_at = None
+        elif new_state is not False:
+            self._update_sensors(self._router.route_state(decoded))
+        if self._system.sensor_id is not None:
+            self._triggered_by = "%s: %s" % (self._system.sensor_id, self._config[CONF_CODE_SENSOR_NAMES].get(self._system.sensor_id, '?'))
+        self._handle_state(new_state)
+
+    def _update_sensors(self, changes):
+        # one state write per binary sensor that changed, no hop to the event loop when nothing changed
+        if not changes:
+            return
+        if self._io_mode == IO_MODE_ASYNCIO:
+            self._async_update_sensors(changes)
+        else:
+            self._hass.loop.call_soon_threadsafe(self._async_update_sensors, changes)
+
+    @callback
+    def _async_update_sensors(self, changes):
+        for entity, value in changes:
+            entity.async_set(value)
+
+    def _tamper_cancelling(self):
+        # True while a tamper alarm is cancelled, until the panel is armed again or TAMPER_CANCEL_TIMEOUT expired
+        if self._tamper_cancel_at is None:
+            return False
+        if time.monotonic() - self._tamper_cancel_at < TAMPER_CANCEL_TIMEOUT:
+            return True
+        _LOGGER.warning('Cancelling the tamper alarm did not complete in %ss', TAMPER_CANCEL_TIMEOUT)
+        self._tamper_cancel_at = None
+        return False
+
+    def _cancel_tamper_alarm(self, sensor_id):
+
+        _LOGGER.warning('Tamper alarm of sensor %s within tamper threshold, cancelling the alarm', sensor_id)
+        self._tamper_cancel_at = time.monotonic()
+        if self._io_mode == IO_MODE_ASYNCIO:
+            self.loop.create_task(self._async_cancel_tamper_alarm(sensor_id, self._armed_state))
+        else:
+            asyncio.run_coroutine_threadsafe(self._async_cancel_tamper_alarm(sensor_id, self._armed_state), self.loop)
+
+    async def _async_cancel_tamper_alarm(self, sensor_id, armed_state):
+
+        if self._code is None:
+            _LOGGER.error('Unable to cancel tamper alarm, no code configured')
+            self._tamper_cancel_at = None
+            return
+
+        # disarm with the code, then arm again in the same mode
+        try:
+            await self._sendCommand(self._code, ACTION_DISARM_CODE, STATE_ALARM_DISARMED)
+            if armed_state is not None:
+                arm_code = self._code if self._config[CONF_CODE_PANEL_ARM_REQUIRED] else ""
+                await self._sendCommand(arm_code, ARM_ACTIONS[armed_state], armed_state)
+        except HomeAssistantError as ex:
+            _LOGGER.error('Unable to cancel tamper alarm of sensor %s: %s', sensor_id, ex)
+            self._tamper_cancel_at = None
+            return
+        self._tamper_cancel_at = None
+        self._changed_by = "tamper filter"
+
+        # lower priority alert instead of the alarm
+        self._hass.bus.async_fire(EVENT_TAMPER_SUPPRESSED, {
+            'entity_id': self.entity_id,
+            'sensor_id': sensor_id,
+            'sensor': self._config[CONF_CODE_SENSOR_NAMES].get(sensor_id, '?'),
+            'tamper_count': self._tamper_filter.count(sensor_id),
+        })
+
+    def _handle_state(self, new_state):
+
+        if new_state == self._decoded_state:
+            return
+
+        if new_state == STATE_ALARM_TRIGGERED and self._tamper_cancelling():
+            # the alarm is being cancelled, do not report it, also not after the transient states on the way to
+            # disarmed and armed again
+            return
+
+        if new_state in ARM_ACTIONS and self._armed_state is None:
+            # the panel does not tell the mode, keep the mode requested from Home Assistant if there is one
+            self._armed_state = new_state
+        elif new_state == STATE_ALARM_DISARMED and self._tamper_cancel_at is None:
+            self._armed_state = None
+
+        _LOGGER.info("Jablotron state change detected: %s to %s", self._decoded_state, new_state)
+        if new_state == STATE_ALARM_TRIGGERED and self._triggered_by is None:
+            _LOGGER.debug("Alarm triggered but source not known yet")
+
+            # wait for _triggered_by to be set before returning triggered state, but not more that 10 seconds
+            if self._last_trigger_time is not None and (datetime.now() - self._last_trigger_time).seconds < 10:
+                return
+            elif self._last_trigger_time is None:
+                self._last_trigger_time = datetime.now()
+                return
+
+        elif new_state == STATE_ALARM_DISARMED:
+            self._last_trigger_time = None  # clear last trigger time
+            self._triggered_by = None  # clear triggered_by
+            self._system.sensor_id = None
+
+        # Update state & notify home assistant, transient states are coalesced by the publisher
+        self._decoded_state = new_state
+        self._metrics.state_changes += 1
+        if self._io_mode == IO_MODE_ASYNCIO:
+            self._submit_state(new_state, time.perf_counter())
+        else:
+            self._hass.loop.call_soon_threadsafe(self._submit_state, new_state, time.perf_counter())
+
+    @callback
+    def _submit_state(self, state, decoded_at):
+        self._decoded_at = decoded_at
+        self._metrics.hop.observe(time.perf_counter() - decoded_at)
+        if self._command is not None:
+            self._command.update(state)
+        self._publisher.submit(state)
+
     async def async_alarm_disarm(self, code=None):
         """Send disarm command.
 
@@ -274,10 +709,10 @@ class JablotronAlarm(alarm.AlarmControlPanelEntity):
                 code = self._code
             send_code = code
 
-        action = "*0"
+        action = ACTION_DISARM
         if send_code != "":
             # *0 not required if we disarm using code
-            action = "#"
+            action = ACTION_DISARM_CODE
 
         await self._sendCommand(send_code, action, STATE_ALARM_DISARMED)
 
@@ -293,7 +728,7 @@ class JablotronAlarm(alarm.AlarmControlPanelEntity):
         if self._config[CONF_CODE_PANEL_ARM_REQUIRED]:
             send_code = code
 
-        action = "*2"
+        action = ACTION_ARM_HOME
 
         await self._sendCommand(send_code, action, STATE_ALARM_ARMED_HOME)
 
@@ -309,7 +744,7 @@ class JablotronAlarm(alarm.AlarmControlPanelEntity):
         if self._config[CONF_CODE_PANEL_ARM_REQUIRED]:
             send_code = code
 
-        action = "*1"
+        action = ACTION_ARM_AWAY
 
         await self._sendCommand(send_code, action, STATE_ALARM_ARMED_AWAY)
 
@@ -325,77 +760,55 @@ class JablotronAlarm(alarm.AlarmControlPanelEntity):
         if self._config[CONF_CODE_PANEL_ARM_REQUIRED]:
             send_code = code
 
-        action = "*3"
+        action = ACTION_ARM_NIGHT
 
         await self._sendCommand(send_code, action, STATE_ALARM_ARMED_NIGHT)
 
     async def _sendCommand(self, code, action, desired_state):
+        """Send the keys of a command and wait until the panel reports desired_state.
 
-        payload = action
-
-        if code is not None and code != "":
-            payload += code
-
-        for cmd in payload:
-            # self._command_q.put(bytes([cmd]))
-            self._command_q.put(JABLOTRON_KEY_MAP.get(cmd))
-
-        self._desired_state = desired_state
-        self._changed_by = "hass"
-
-        self._desired_state_updated.set()
-
-        if self._wait_task is not None:
-            self._wait_task.cancel()
-
-    async def state_loop(self):
-
-        _LOGGER.debug('state_loop() enter')
-
-        while not self._stop.is_set():
-
-            retrying = False
-
-            await self._desired_state_updated.wait()
-            self._desired_state_updated.clear()
-
-            # _LOGGER.debug('command received: %s', self._payload)
-            _LOGGER.debug('state change request received: %s', self._desired_state)
-
-            while self.state != self._desired_state:
-
-                self._updated.clear()
-
-                # if not retrying or (self.state != STATE_ALARM_ARMING and self.state != STATE_ALARM_DISARMING and self.state != STATE_ALARM_PENDING) :
-                #     await self._send_keys(self._payload)
-
-                try:
-
-                    if self._desired_state == STATE_ALARM_DISARMED:
-                        timeout = 10
-                    else:
-                        timeout = 40
-
-                    self._wait_task = self.loop.create_task(self._updated.wait())
-                    await asyncio.wait_for(self._wait_task, timeout)
-                    self._updated.clear()
-
-                except asyncio.TimeoutError:
-                    _LOGGER.warn('Timed out waiting for change of state, retry')
-
-                except asyncio.CancelledError:
-                    _LOGGER.debug('New desired state set, wait has been cancelled, wait for next command')
-                    break
+        Raises HomeAssistantError when the panel does not reach the state.
+        """
 
-                except Exception as ex:
-                    _LOGGER.error('Unexpected error: %s', format(ex))
-                    break
+        try:
+            keys = encode_command(action, code)
+        except ValueError:
+            raise HomeAssistantError('Invalid code, only digits can be sent to the panel') from None
 
-                retrying = True
+        # a new command replaces the one still waiting
+        self._fail_command('Superseded by a command for state %s' % desired_state)
+        timeout = COMMAND_TIMEOUT_DISARM if desired_state == STATE_ALARM_DISARMED else COMMAND_TIMEOUT_ARM
+        command = self._command = JablotronCommand(self.loop, desired_state, timeout)
+        command.future.add_done_callback(lambda future: self._command_done(command))
 
-                _LOGGER.debug('state: %s', self.state)
+        for key in keys:
+            self._command_q.put(key)
 
-        _LOGGER.debug('state_loop(): exit')
+        self._changed_by = "hass"
+        if desired_state in ARM_ACTIONS:
+            self._armed_state = desired_state
+
+        _LOGGER.debug('state change request sent: %s', desired_state)
+        if self._decoded_state is not None:
+            # nothing to wait for when the panel is in the state already
+            command.update(self._decoded_state)
+        await command.future
+
+    @callback
+    def _fail_command(self, reason):
+        if self._command is not None:
+            self._command.fail(reason)
+
+    def _command_done(self, command):
+        if self._command is command:
+            self._command = None
+        if command.future.cancelled() or command.future.exception() is not None:
+            self._metrics.commands_failed += 1
+            if not command.future.cancelled():
+                _LOGGER.warning('Command for state %s failed: %s', command.desired_state, command.future.exception())
+            return
+        self._metrics.completion.observe(time.perf_counter() - command.started_at)
+        _LOGGER.debug('state %s reached in %.3fs', command.desired_state, time.perf_counter() - command.started_at)
 
     def _validate_code(self, code, state):
         """Validate given code."""
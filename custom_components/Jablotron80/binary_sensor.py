@@ -0,0 +1,77 @@
+"""Alarm and tamper binary sensors of the sensors named in sensor_names, set up by the alarm_control_panel platform."""
+import logging
+
+from homeassistant.components.binary_sensor import BinarySensorEntity, DEVICE_CLASS_MOTION, DEVICE_CLASS_TAMPER
+from homeassistant.const import CONF_NAME
+from homeassistant.core import callback
+from homeassistant.helpers.typing import ConfigType, HomeAssistantType
+
+from .const import DATA_SENSOR_ROUTERS
+from .router import SENSOR_ALARM, SENSOR_TAMPER
+
+_LOGGER = logging.getLogger(__name__)
+
+CONF_SENSOR_NAMES = 'sensor_names'
+
+SENSOR_TYPES = {
+    # kind: (name suffix, device class)
+    SENSOR_ALARM: ('alarm', DEVICE_CLASS_MOTION),
+    SENSOR_TAMPER: ('tamper', DEVICE_CLASS_TAMPER),
+}
+
+ATTR_SENSOR_ID = 'sensor_id'
+
+
+async def async_setup_platform(hass: HomeAssistantType, config: ConfigType,
+                               async_add_entities, discovery_info=None):
+
+    if discovery_info is None:
+        # only set up through the alarm_control_panel platform
+        return
+
+    router = hass.data[DATA_SENSOR_ROUTERS][discovery_info[CONF_NAME]]
+    entities = []
+    for sensor_id, name in discovery_info[CONF_SENSOR_NAMES].items():
+        for kind in SENSOR_TYPES:
+            entity = JablotronSensor(sensor_id, name, kind)
+            router.add(kind, sensor_id, entity)
+            entities.append(entity)
+    async_add_entities(entities)
+
+
+class JablotronSensor(BinarySensorEntity):
+    """Alarm or tamper state of one Jablotron sensor, updated by the JA80SensorRouter of the panel."""
+
+    def __init__(self, sensor_id, name, kind):
+        suffix, device_class = SENSOR_TYPES[kind]
+        self._sensor_id = sensor_id
+        self._name = '%s %s' % (name, suffix)
+        self._device_class = device_class
+        self._is_on = False
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def is_on(self):
+        return self._is_on
+
+    @property
+    def device_class(self):
+        return self._device_class
+
+    @property
+    def extra_state_attributes(self):
+        return {ATTR_SENSOR_ID: self._sensor_id}
+
+    @callback
+    def async_set(self, value):
+        self._is_on = value
+        # before the entity is added, the value is written when it is added
+        if self.hass is not None:
+            self.async_write_ha_state()
@@ -0,0 +1,306 @@
+"""Stand-alone bridge between the JA-80T and MQTT, to run the serial reader next to the panel without Home Assistant.
+
+Usage:
+    python -m custom_components.Jablotron80.bridge --device /dev/ttyUSB0 --broker <host> [--topic jablotron80]
+
+Topics (below --topic):
+    state         alarm state, one of the states of the Home Assistant MQTT alarm panel, retained
+    triggered_by  sensor that triggered the alarm, retained, cleared when the alarm is over
+    availability  online / offline, retained, offline is also the last will
+    event         alarm events as JSON, not retained
+    command       DISARM, ARM_AWAY, ARM_HOME, ARM_NIGHT or JSON {"action": "DISARM", "code": "1234"}
+
+Needs paho-mqtt (pip3 install paho-mqtt), Home Assistant is not needed.
+"""
+import argparse
+import json
+import logging
+import signal
+import threading
+
+from .adapter import HASS_STATES, hass_state
+from .const import (
+    ACTION_ARM_AWAY, ACTION_ARM_HOME, ACTION_ARM_NIGHT, ACTION_DISARM, ACTION_DISARM_CODE, STATE_ALARM_DISARMED,
+    STATE_ALARM_TRIGGERED)
+from .ja80 import JA80CommandQueue, JA80TConnection, JA80TSupervisor
+from .protocol import ALARM_TIMESTAMP_SCHEMA, JA80, JA80State, encode_command
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TOPIC = 'jablotron80'
+DEFAULT_BATCH_INTERVAL = 0.2  # seconds
+
+TOPIC_STATE = 'state'
+TOPIC_TRIGGERED_BY = 'triggered_by'
+TOPIC_AVAILABILITY = 'availability'
+TOPIC_EVENT = 'event'
+TOPIC_COMMAND = 'command'
+
+PAYLOAD_ONLINE = 'online'
+PAYLOAD_OFFLINE = 'offline'
+
+# command payload: key sequence, same payloads as the Home Assistant MQTT alarm panel
+COMMANDS = {
+    'DISARM': ACTION_DISARM,
+    'ARM_AWAY': ACTION_ARM_AWAY,
+    'ARM_HOME': ACTION_ARM_HOME,
+    'ARM_NIGHT': ACTION_ARM_NIGHT,
+}
+
+# published right away instead of waiting for the next batch
+PRIORITY_STATES = (STATE_ALARM_TRIGGERED, )
+
+# panel states that are not a state of the Home Assistant MQTT alarm panel: the state published instead, None to not
+# publish a state (the next status packet tells the state)
+MQTT_STATES = {
+    HASS_STATES[JA80State.UNKNOWN]: None,
+    HASS_STATES[JA80State.TAMPER_TRIGGERED]: STATE_ALARM_TRIGGERED,
+    HASS_STATES[JA80State.TAMPER_SENSORS_OK]: None,
+    HASS_STATES[JA80State.CANCEL_ALARM]: None,
+}
+
+
+class JA80MQTTPublisher():
+    """Batch MQTT publishes, a retained topic is only published when its value changed."""
+
+    def __init__(self, client, interval=DEFAULT_BATCH_INTERVAL, qos=1):
+        self.client = client
+        self._interval = interval
+        self._qos = qos
+        self._lock = threading.Lock()
+        self._published = {}  # topic: last published retained value
+        self._pending = {}  # topic: retained value to publish with the next batch
+        self._events = []  # (topic, payload) not retained, all are published
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.published = self.deduplicated = 0
+
+    def publish(self, topic, payload, priority=False):
+        with self._lock:
+            if self._published.get(topic) == payload:
+                # also drops a pending change that flapped back within the batch
+                self._pending.pop(topic, None)
+                self.deduplicated += 1
+                return
+            self._pending[topic] = payload
+        if priority:
+            self._wake.set()
+
+    def publish_event(self, topic, payload):
+        with self._lock:
+            self._events.append((topic, payload))
+
+    def forget(self, topic=None):
+        # publish the value again, e.g. after the broker connection was re-established
+        with self._lock:
+            if topic is None:
+                self._pending.update(self._published)
+                self._published.clear()
+            elif topic in self._published:
+                self._pending[topic] = self._published.pop(topic)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            events, self._events = self._events, []
+            self._published.update(pending)
+        for topic, payload in pending.items():
+            self.client.publish(topic, payload, qos=self._qos, retain=True)
+        for topic, payload in events:
+            self.client.publish(topic, payload, qos=self._qos, retain=False)
+        self.published += len(pending) + len(events)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='JA80MQTTPublisher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as ex:
+                _LOGGER.error('Error publishing to MQTT: %s', ex)
+
+
+class JA80Bridge():
+    """Decode the JA-80T stream into MQTT topics and feed commands from MQTT into the key queue."""
+
+    def __init__(self, connection, publisher, topic=DEFAULT_TOPIC, code=None, code_arm_required=False):
+        self.connection = connection
+        self.publisher = publisher
+        self.topic = topic
+        self.code = code  # used for commands without a code
+        self.code_arm_required = code_arm_required  # the panel needs the code to arm, like code_panel_arm_required
+        self.system = JA80()
+        self._available = None
+
+    def topic_for(self, name):
+        return '%s/%s' % (self.topic, name)
+
+    def on_packet(self, packet):
+        self._set_available(True)
+        state = hass_state(self.system.read_state(packet))
+        if state is None or state is False:
+            return
+
+        if packet[0] == ALARM_TIMESTAMP_SCHEMA.msg_type and self.system.last_event is not None:
+            event = self.system.last_event
+            self.publisher.publish_event(self.topic_for(TOPIC_EVENT), json.dumps({
+                'timestamp': event.timestamp,
+                'event_type': event.event_type,
+                'event_name': event.event_name,
+                'source': event.event_source,
+                'state': state,
+            }))
+        state = MQTT_STATES.get(state, state)
+        if state is None:
+            return
+        if state == STATE_ALARM_DISARMED:
+            # the sensor of the alarm that is over is not the sensor of the next one
+            self.system.sensor_id = None
+        if state != STATE_ALARM_TRIGGERED:
+            # an empty retained message removes the sensor of an alarm that is over
+            self.publisher.publish(self.topic_for(TOPIC_TRIGGERED_BY), '')
+        elif self.system.sensor_id is not None:
+            self.publisher.publish(self.topic_for(TOPIC_TRIGGERED_BY), str(self.system.sensor_id))
+        self.publisher.publish(self.topic_for(TOPIC_STATE), state, priority=state in PRIORITY_STATES)
+
+    def on_signal(self, signal):
+        self._set_available(signal)
+
+    def _set_available(self, available):
+        if available == self._available:
+            return
+        self._available = available
+        self.publisher.publish(self.topic_for(TOPIC_AVAILABILITY), PAYLOAD_ONLINE if available else PAYLOAD_OFFLINE,
+                               priority=True)
+
+    def on_command(self, payload):
+        # plain command or JSON with action and code, as sent by a command_template
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8', 'replace')
+        payload = payload.strip()
+        code = None
+        if payload.startswith('{'):
+            try:
+                command = json.loads(payload)
+            except ValueError:
+                _LOGGER.warning('Invalid command %s', payload)
+                return False
+            action = str(command.get('action', '')).upper()
+            code = command.get('code') or None
+        else:
+            action = payload.upper()
+
+        keys = COMMANDS.get(action)
+        if keys is None:
+            _LOGGER.warning('Unknown command %s', action)
+            return False
+        if code is None:
+            code = self.code
+        if action != 'DISARM':
+            if not self.code_arm_required:
+                code = None
+        elif code is not None:
+            # *0 not required if we disarm using code
+            keys = ACTION_DISARM_CODE
+
+        _LOGGER.info('Command %s received', action)
+        try:
+            keys = encode_command(keys, code)
+        except ValueError:
+            _LOGGER.warning('Invalid key in command %s', action)
+            return False
+        for key in keys:
+            self.connection.cmd_q.put(key)
+        return True
+
+
+def create_mqtt_client(args, bridge):
+    # only the bridge needs paho, the Home Assistant platform does not
+    import paho.mqtt.client as mqtt
+
+    try:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=args.client_id)
+    except AttributeError:
+        # paho-mqtt < 2.0
+        client = mqtt.Client(client_id=args.client_id)
+    if args.username:
+        client.username_pw_set(args.username, args.password)
+    client.will_set(bridge.topic_for(TOPIC_AVAILABILITY), PAYLOAD_OFFLINE, qos=1, retain=True)
+
+    def on_connect(client, userdata, flags, rc):
+        if rc != 0:
+            _LOGGER.error('MQTT connection refused: %s', rc)
+            return
+        _LOGGER.info('Connected to MQTT broker %s:%s', args.broker, args.port)
+        client.subscribe(bridge.topic_for(TOPIC_COMMAND), qos=1)
+        # the last will may have replaced the retained values, publish them all again
+        bridge.publisher.forget()
+
+    def on_message(client, userdata, message):
+        bridge.on_command(message.payload)
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    return client
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='JA-80T to MQTT bridge')
+    parser.add_argument('--device', required=True, help='serial port or tcp://, rfc2217://, replay://, mock:// url')
+    parser.add_argument('--broker', required=True, help='MQTT broker host')
+    parser.add_argument('--port', type=int, default=1883, help='MQTT broker port')
+    parser.add_argument('--username', help='MQTT user name')
+    parser.add_argument('--password', help='MQTT password')
+    parser.add_argument('--client-id', default='ja80-bridge', help='MQTT client id')
+    parser.add_argument('--topic', default=DEFAULT_TOPIC, help='topic prefix')
+    parser.add_argument('--batch-interval', type=float, default=DEFAULT_BATCH_INTERVAL,
+                        help='seconds to collect changes before publishing')
+    parser.add_argument('--code', help='code used for commands without a code')
+    parser.add_argument('--code-arm-required', action='store_true', help='also send the code when arming')
+    parser.add_argument('--wire-trace', action='store_true', help='log all data sent and received')
+    parser.add_argument('--key-retries', type=int, default=0, help='times a key that is not echoed is sent again')
+    parser.add_argument('--capture-file', help='record the received data to this capture file')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG, INFO, WARNING or ERROR')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    connection = JA80TConnection(args.device, JA80CommandQueue(), wire_trace=args.wire_trace,
+                                 capture_file=args.capture_file, key_retries=args.key_retries)
+    publisher = JA80MQTTPublisher(None, args.batch_interval)
+    bridge = JA80Bridge(connection, publisher, args.topic, args.code, args.code_arm_required)
+    publisher.client = create_mqtt_client(args, bridge)
+    client = publisher.client
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    client.connect_async(args.broker, args.port)
+    client.loop_start()
+    publisher.start()
+    try:
+        JA80TSupervisor(connection, stop).run(bridge.on_packet, bridge.on_signal)
+    finally:
+        connection.disconnect()
+        bridge.on_signal(False)
+        publisher.stop()
+        client.disconnect()
+        client.loop_stop()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
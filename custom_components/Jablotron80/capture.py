@@ -0,0 +1,186 @@
+"""Record the raw JA-80T byte stream to a capture file and replay it."""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+'''
+capture file format (little endian):
+ header  = magic 'JA80CAP' + version byte, start time (unix time, double)
+ records = delay since previous record in microseconds (uint32), data length (uint16), data
+records are appended as data is read from the serial port, so the file can be replayed with the original timing.
+'''
+CAPTURE_MAGIC = b'JA80CAP\x01'
+CAPTURE_HEADER = struct.Struct('<8sd')
+CAPTURE_RECORD = struct.Struct('<IH')
+
+MAX_DELAY = 0xffffffff  # ~71 minutes, longer gaps are shortened
+
+
+class JA80CaptureWriter():
+    """Append raw data read from the JA-80T to a capture file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._last = None
+
+    def open(self):
+        _LOGGER.info('Recording JA-80T data to %s', self.path)
+        self._file = open(self.path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, time.time()))
+        self._last = None
+
+    def write(self, data):
+        if self._file is None:
+            self.open()
+        now = time.monotonic_ns()
+        # the first record after (re)opening the file is played back without delay
+        delay = 0 if self._last is None else min((now - self._last) // 1000, MAX_DELAY)
+        self._last = now
+        self._file.write(CAPTURE_RECORD.pack(delay, len(data)))
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JA80CaptureReader():
+    """Read the records of a capture file through mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < CAPTURE_HEADER.size:
+                raise ValueError('Capture file too short', path)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.start_time = CAPTURE_HEADER.unpack_from(self._mmap)
+        if magic != CAPTURE_MAGIC:
+            self._mmap.close()
+            raise ValueError('Not a JA80 capture file', path)
+
+    def records(self):
+        # yield (seconds since start of capture, data) for each record
+        buf = self._mmap
+        end = len(buf)
+        pos = CAPTURE_HEADER.size
+        elapsed = 0
+        while pos + CAPTURE_RECORD.size <= end:
+            delay, length = CAPTURE_RECORD.unpack_from(buf, pos)
+            pos += CAPTURE_RECORD.size
+            if pos + length > end:
+                _LOGGER.warning('Capture file %s ends with a partial record', self.path)
+                break
+            elapsed += delay
+            yield elapsed / 1000000, buf[pos:pos + length]
+            pos += length
+
+    def index(self):
+        # (file position of the data, data length, seconds since start of capture) of each record, without copying data
+        buf = self._mmap
+        end = len(buf)
+        pos = CAPTURE_HEADER.size
+        elapsed = 0
+        positions, lengths, times = [], [], []
+        unpack_from = CAPTURE_RECORD.unpack_from
+        while pos + CAPTURE_RECORD.size <= end:
+            delay, length = unpack_from(buf, pos)
+            pos += CAPTURE_RECORD.size
+            if pos + length > end:
+                _LOGGER.warning('Capture file %s ends with a partial record', self.path)
+                break
+            elapsed += delay
+            positions.append(pos)
+            lengths.append(length)
+            times.append(elapsed / 1000000)
+            pos += length
+        return positions, lengths, times
+
+    def close(self):
+        self._mmap.close()
+
+
+class CaptureReplay():
+    """Serial like transport replaying a capture file at real time (speed 1), N times faster or unthrottled (speed 0)."""
+
+    def __init__(self, path, speed=1.0, timeout=None):
+        _LOGGER.info('Replaying JA-80T capture %s at speed %s', path, speed or 'unthrottled')
+        self.path = path
+        self.speed = speed
+        self.timeout = timeout  # 0 for non blocking reads, as used by the asyncio transport
+        self._reader = JA80CaptureReader(path)
+        self._records = self._reader.records()
+        self._next = next(self._records, None)
+        self._buffer = bytearray()
+        self._started = time.monotonic()
+        self._cancel = threading.Event()
+        self.is_open = True
+
+    def _due(self):
+        # move all records that are due to the read buffer
+        now = None
+        while self._next is not None:
+            if self.speed:
+                if now is None:
+                    now = time.monotonic()
+                if self._next[0] / self.speed > now - self._started:
+                    break
+            self._buffer += self._next[1]
+            self._next = next(self._records, None)
+
+    @property
+    def in_waiting(self):
+        self._due()
+        return len(self._buffer)
+
+    def read(self, size=1):
+        self._due()
+        if not self._buffer and self.timeout != 0:
+            if self._next is None:
+                # end of the capture, the line stays quiet: wait for the read timeout like a serial read that gets
+                # no data, instead of returning at once to a caller that reads again right away
+                self._cancel.wait(1 if self.timeout is None else self.timeout)
+            else:
+                # wait for the next record, like a serial read waiting for data with a 1 second timeout
+                self._cancel.wait(min(1, max(0, self._next[0] / self.speed - (time.monotonic() - self._started))))
+            self._cancel.clear()
+            self._due()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def cancel_read(self):
+        self._cancel.set()
+
+    def write(self, data):
+        # the capture already contains the panel's response to the keys sent at the time
+        _LOGGER.debug('CaptureReplay: ignoring write %s', data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self._cancel.set()
+            self._records.close()
+            self._reader.close()
+
+
+def parse_replay_device(device):
+    # replay://<path>[?speed=<speed>], speed 0 replays as fast as possible
+    path = device[len('replay://'):]
+    speed = 1.0
+    if '?speed=' in path:
+        path, speed = path.split('?speed=', 1)
+        speed = float(speed)
+    return path, speed
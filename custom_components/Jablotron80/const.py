@@ -0,0 +1,41 @@
+"""Constants shared by the Home Assistant platform and the stand-alone bridge, without importing Home Assistant."""
+
+# the integration domain is the name of the folder the component is installed in
+DOMAIN = __name__.split('.')[-2]
+
+DATA_SENSOR_ROUTERS = 'jablotron80_sensor_routers'  # hass.data: panel name > JA80SensorRouter
+DATA_HASS_CONFIG = 'jablotron80_hass_config'  # hass.data: full Home Assistant config, set by async_setup
+
+# same values as homeassistant.const, so states decoded outside Home Assistant can be used as is
+STATE_ALARM_DISARMED = 'disarmed'
+STATE_ALARM_ARMED_HOME = 'armed_home'
+STATE_ALARM_ARMED_AWAY = 'armed_away'
+STATE_ALARM_ARMED_NIGHT = 'armed_night'
+STATE_ALARM_PENDING = 'pending'
+STATE_ALARM_ARMING = 'arming'
+STATE_ALARM_DISARMING = 'disarming'
+STATE_ALARM_TRIGGERED = 'triggered'
+
+# keypad character: key code sent to the JA-80T
+JABLOTRON_KEY_MAP = {
+    "0": b'\x80',
+    "1": b'\x81',
+    "2": b'\x82',
+    "3": b'\x83',
+    "4": b'\x84',
+    "5": b'\x85',
+    "6": b'\x86',
+    "7": b'\x87',
+    "8": b'\x88',
+    "9": b'\x89',
+    "#": b'\x8e',
+    "?": b'\x8e',
+    "*": b'\x8f'
+}
+
+# key sequences of the panel actions, the code is appended
+ACTION_DISARM = '*0'  # without code, with a code only the code followed by # is needed
+ACTION_DISARM_CODE = '#'
+ACTION_ARM_AWAY = '*1'
+ACTION_ARM_HOME = '*2'
+ACTION_ARM_NIGHT = '*3'
@@ -0,0 +1,132 @@
+"""Fixed capacity history of the alarm events decoded from the JA-80T."""
+import threading
+import time
+from collections import deque, namedtuple
+
+# received: unix time the event was decoded, for display only, timestamp: panel time 'dd/mm hh:mm' (the panel sends
+# no year or seconds), monotonic: time.monotonic() the event was decoded, orders the events as the wall clock may step
+JA80Event = namedtuple('JA80Event', ('seq', 'received', 'timestamp', 'event_type', 'source', 'monotonic'))
+
+# what append needs of a JA80AlarmTimestamp
+JA80RestoredEvent = namedtuple('JA80RestoredEvent', ('timestamp', 'event_type', 'event_source'))
+
+DEFAULT_CAPACITY = 500
+
+
+class JA80EventHistory():
+    """Ring buffer of events with indexes on sensor id (event source) and event type.
+
+    Appending is O(1), the oldest event is dropped when the ring is full. The indexes hold the sequence numbers of
+    the events in the ring, so together they never hold more entries than the ring itself.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError('Invalid history capacity', capacity)
+        self.capacity = capacity
+        self._ring = [None] * capacity
+        self._seq = 0  # sequence number of the next event
+        self._last_monotonic = None
+        self._by_source = {}
+        self._by_type = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._seq, self.capacity)
+
+    def append(self, event, received=None, monotonic=None):
+        # event: JA80AlarmTimestamp
+        if received is None:
+            received = time.time()
+        if monotonic is None:
+            monotonic = time.monotonic()
+        with self._lock:
+            if self._last_monotonic is not None and monotonic < self._last_monotonic:
+                # since() relies on the ring being in monotonic order
+                monotonic = self._last_monotonic
+            self._last_monotonic = monotonic
+            record = JA80Event(self._seq, received, event.timestamp, event.event_type, event.event_source, monotonic)
+            pos = record.seq % self.capacity
+            old = self._ring[pos]
+            if old is not None:
+                # the dropped event is the oldest event in both its indexes
+                self._unindex(self._by_source, old.source)
+                self._unindex(self._by_type, old.event_type)
+            self._ring[pos] = record
+            self._by_source.setdefault(record.source, deque()).append(record.seq)
+            self._by_type.setdefault(record.event_type, deque()).append(record.seq)
+            self._seq += 1
+        return record
+
+    @staticmethod
+    def _unindex(index, key):
+        seqs = index[key]
+        seqs.popleft()
+        if not seqs:
+            del index[key]
+
+    def restore(self, events):
+        # events as (received, timestamp, event_type, source), oldest first, e.g. from a snapshot; the monotonic
+        # clock starts again after a reboot, the age of an event is taken from the wall clock, never in the future
+        now, monotonic_now = time.time(), time.monotonic()
+        for received, timestamp, event_type, source in events:
+            monotonic = monotonic_now - max(0, now - received)
+            self.append(JA80RestoredEvent(timestamp, event_type, source), received, monotonic)
+
+    def clear(self):
+        with self._lock:
+            self._ring = [None] * self.capacity
+            self._seq = 0
+            self._last_monotonic = None
+            self._by_source.clear()
+            self._by_type.clear()
+
+    def last(self, count=10, source=None, event_type=None):
+        # newest first
+        with self._lock:
+            if source is None and event_type is None:
+                first = max(0, self._seq - self.capacity, self._seq - count)
+                return [self._ring[seq % self.capacity] for seq in range(self._seq - 1, first - 1, -1)]
+            if source is not None and event_type is not None:
+                # walk the shorter index
+                seqs = self._by_source.get(source, ())
+                other = self._by_type.get(event_type, ())
+                key, value = 'event_type', event_type
+                if len(other) < len(seqs):
+                    seqs, key, value = other, 'source', source
+                records = []
+                for seq in reversed(seqs):
+                    if len(records) == count:
+                        break
+                    record = self._ring[seq % self.capacity]
+                    if getattr(record, key) == value:
+                        records.append(record)
+                return records
+            seqs = self._by_source.get(source, ()) if source is not None else self._by_type.get(event_type, ())
+            records = []
+            for seq in reversed(seqs):
+                if len(records) == count:
+                    break
+                records.append(self._ring[seq % self.capacity])
+            return records
+
+    def since(self, seconds, now=None):
+        # events received in the last seconds, oldest first, the ring is in monotonic order so this is a bisect,
+        # now: time.monotonic()
+        start_time = (time.monotonic() if now is None else now) - seconds
+        with self._lock:
+            low = max(0, self._seq - self.capacity)
+            high = self._seq
+            while low < high:
+                middle = (low + high) // 2
+                if self._ring[middle % self.capacity].monotonic < start_time:
+                    low = middle + 1
+                else:
+                    high = middle
+            return [self._ring[seq % self.capacity] for seq in range(low, self._seq)]
+
+    def counts(self):
+        # number of events in the history per source and per event type
+        with self._lock:
+            return ({source: len(seqs) for source, seqs in self._by_source.items()},
+                    {event_type: len(seqs) for event_type, seqs in self._by_type.items()})
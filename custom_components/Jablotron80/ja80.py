@@ -1,16 +1,26 @@
-import serial
+"""Connection to the JA-80T: serial, network, multiplexer, mock and replay transports, key sending and reconnecting.
+
+The packet format itself is in protocol.py, which does not need pyserial or Home Assistant.
+"""
+import asyncio
 import logging
+import os
 import queue
 import time
-from datetime import datetime
+from collections import deque
 
-from homeassistant.const import (
-    CONF_CODE, CONF_DEVICE, CONF_NAME, CONF_VALUE_TEMPLATE,
-    STATE_ALARM_ARMED_AWAY, STATE_ALARM_ARMED_HOME, STATE_ALARM_ARMED_NIGHT,
-    STATE_ALARM_DISARMED, STATE_ALARM_PENDING, STATE_ALARM_ARMING, STATE_ALARM_DISARMING, STATE_ALARM_TRIGGERED,
-    ATTR_CODE_FORMAT)
+from .capture import CaptureReplay, JA80CaptureWriter, parse_replay_device
+from .metrics import JA80Metrics
+from .mock import create_mock_transport
+from .network import (
+    configure_socket, is_network_device, is_unix_device, open_network_device, open_rfc2217, parse_network_device,
+    parse_unix_device)
+from .protocol import HexDump, JA80Framer
 
 _LOGGER = logging.getLogger(__name__)
+# raw hex dump of all data sent and received, only used when wire_trace is enabled on the connection
+_WIRE_LOGGER = logging.getLogger(__name__ + '.wire')
+
 
 class SerialMock():
 
@@ -32,7 +42,11 @@ class SerialMock():
     def is_open(self):
         return True
 
-    def read(self):
+    @property
+    def in_waiting(self):
+        return len(self.data_buffer)
+
+    def read(self, size=1):
 
         if len(self.data_buffer) == 0:
             #_LOGGER.info('SerialMock:read init data buffer')
@@ -46,7 +60,8 @@ class SerialMock():
                 for event_byte in event_bytes:
                     self.data_buffer.append(bytes([int(event_byte, 16)]))
 
-        data = self.data_buffer.pop(0)
+        data = b''.join(self.data_buffer[:size])
+        del self.data_buffer[:size]
         # _LOGGER.info('SerialMock:read %s', data)
         return data
 
@@ -59,127 +74,26 @@ class SerialMock():
         return len(buf)
 
 
-class JA80AlarmStatus:
-    msg_raw = msg_type = alarm_status = message_id = device_id = None
-    unknown_val = None 
-    device_name = device_type = ''
-    alarm_state = None
-    led_a = led_b = led_c = led_backlight = led_warning = False
-
-    ALARM_STATE_DISARMED = 0x00
-    ALARM_STATE_ARMED = 0x02
-    ALARM_STATE_ALARM = 0x04
-    ALARM_STATE_ENTRY_DELAY = 0x08
-    ALARM_STATE_EXIT_DELAY = 0x10
-
-    def __init__(self, msg):
-        self.parse_msg(msg)
-
-    def parse_msg(self, msg):
-
-        if len(msg) != 10:
-            raise ValueError('Invalid msg len', len(msg), '(expect 10)')
-        self.msg_raw = msg
-
-        '''
-        format:
-        byte
-         0 = msg type 0xed
-         1 = alarm_status
-         2 = msg_id
-         3 = device_id
-         4 = leds
-         5-7 = unknown (display content, signal strength, zone)
-         8 = checksum
-         9 = 0xFF end of message
-        '''
-        self.msg_type = msg[0]
-        self.set_alarm_status(msg[1])
-        self.message_id = msg[2]
-        self.set_device(msg[3])  # translate id to device type and name
-        self.set_leds(msg[4])
-        self.unknown_val = msg[7]  # still need to figure out what this is / might be some device message/ motion/tamper
-
-    def set_alarm_status(self, alarm_status):
-
-        self.raw_status = alarm_status
-        if (alarm_status & 0x1f) == self.ALARM_STATE_DISARMED:
-            self.alarm_status = self.ALARM_STATE_DISARMED
-
-        elif (alarm_status & 0x04) == self.ALARM_STATE_ALARM:
-            self.alarm_status = self.ALARM_STATE_ALARM
-
-        elif (alarm_status & 0x08) == self.ALARM_STATE_ENTRY_DELAY:
-            self.alarm_status = self.ALARM_STATE_ENTRY_DELAY
-
-        elif (alarm_status & 0x10) == self.ALARM_STATE_EXIT_DELAY:
-            self.alarm_status = self.ALARM_STATE_EXIT_DELAY
-
-        else:
-            self.alarm_status = self.ALARM_STATE_ARMED
-
-    def get_alarm_status_name(self, alarm_status=None):
-
-        if alarm_status is None:
-            alarm_status = self.alarm_status
-
-        if alarm_status == self.ALARM_STATE_DISARMED:
-            return 'Disarmed'
-
-        elif alarm_status == self.ALARM_STATE_ALARM:
-            return 'Alarm'
+class JA80CommandQueue(queue.Queue):
+    """Queue of keys to send, remembers when each key was queued and wakes up the I/O path when a key is added."""
 
-        elif alarm_status == self.ALARM_STATE_ENTRY_DELAY:
-            return 'Entry delay'
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.waker = None  # set by the connection, called from the thread that queued the key
+        self.enqueued_at = None  # perf_counter time the key returned by the last get was queued
 
-        elif alarm_status == self.ALARM_STATE_EXIT_DELAY:
-            return 'Exit delay'
+    def _put(self, item):
+        self.queue.append((time.perf_counter(), item))
 
-        return 'Armed'
+    def _get(self):
+        self.enqueued_at, item = self.queue.popleft()
+        return item
 
-    def get_hass_status(self, alarm_status=None):
-        # translate JA status to Home Assistant status
-
-        if alarm_status is None:
-            alarm_status = self.alarm_status
-
-        if alarm_status == self.ALARM_STATE_DISARMED:
-            return STATE_ALARM_DISARMED
-        elif alarm_status == self.ALARM_STATE_ALARM:
-            return STATE_ALARM_TRIGGERED
-        elif alarm_status == self.ALARM_STATE_ENTRY_DELAY:
-            return STATE_ALARM_DISARMING
-        elif alarm_status == self.ALARM_STATE_EXIT_DELAY:
-            return STATE_ALARM_ARMING
-        elif alarm_status == self.ALARM_STATE_ARMED:
-            return STATE_ALARM_ARMED_AWAY
-
-        return 'Unknown'
-
-    def set_leds(self, led_status):
-
-        #  led bits:
-        self.led_a = ((led_status & 0x08) == 0x08)
-        self.led_b = ((led_status & 0x04) == 0x04)
-        self.led_c = ((led_status & 0x02) == 0x02)
-        self.led_backlight = ((led_status & 0x01) == 0x01)
-        self.led_warning = ((led_status & 0x10) == 0x10)
-
-    def set_device(self, device_id):
-        #  @TODO: mapping from id to device details
-        self.device_id = device_id
-        self.device_name = 'unknown'
-        self.device_type = 'unknown'
-
-    def __str__(self):
-
-        s = 'AlarmStatus: msg_type = ' + '0x{:02x}'.format(self.msg_type) + '\n'
-        s += f'    alarm_status = {self.get_alarm_status_name(self.alarm_status)} / ' + '0x{:02x}'.format(self.raw_status)
-        s += f'    message_id = {self.message_id}'
-        s += f'    device_id = {self.device_id}'
-        s += f'    unknown_val = ' + '0x{:02x}'.format(self.unknown_val) + '\n'
-        s += f'    leds: a={self.led_a}, b={self.led_b}, c={self.led_c}, backlight={self.led_backlight}, warning={self.led_warning}'
-        return s
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        waker = self.waker
+        if waker is not None:
+            waker()
 
 
 class JA80TConnection():
@@ -191,10 +105,14 @@ class JA80TConnection():
     connection = None
 
     cmd_q = None
-    cmd_confirm_pending = None
+
+    protocol = None
+
+    NO_SIGNAL_TIMEOUT = 3  # seconds without data before we report no signal
 
     # device is mandatory at initiation
-    def __init__(self, device, cmd_q, mock=False, test_data=None):
+    def __init__(self, device, cmd_q, mock=False, test_data=None, wire_trace=False, capture_file=None, metrics=None,
+                 key_retries=0):
         if mock:
             device = '/mock'
             self.mock = True
@@ -202,12 +120,36 @@ class JA80TConnection():
         _LOGGER.info('Init JA80TConnection with device %s', device)
         self.device = device
         self.cmd_q = cmd_q
-
-    def connect(self):
+        self.wire_trace = wire_trace
+        self.recorder = None if capture_file is None else JA80CaptureWriter(capture_file)
+        self.metrics = JA80Metrics() if metrics is None else metrics
+        self.framer = JA80Framer()
+        self.transmitter = JA80KeyTransmitter(cmd_q, self._write, max_retries=key_retries, latency=self.metrics.key,
+                                              queued=self.metrics.command)
+        self._pending_packets = deque()
+        self._last_data = None
+        self._quiet = False  # no data for NO_SIGNAL_TIMEOUT, logged once until data is received again
+
+    def connect(self, timeout=1):
+        # timeout: how long a read waits for data, 0 when the reads are driven by a selector
         _LOGGER.info('Connecting to JA80 via JA-80T using %s...', self.device)
+        self.framer.reset()
+        self.transmitter.resume()
+        self._pending_packets.clear()
+        self._last_data = time.monotonic()
+        self._quiet = False
         if self.mock:
             self.connection = SerialMock(self.device, self.test_data)
+        elif self.device.startswith('replay://'):
+            path, speed = parse_replay_device(self.device)
+            self.connection = CaptureReplay(path, speed, timeout=timeout)
+        elif self.device.startswith('mock://'):
+            self.connection = create_mock_transport(self.device, timeout=timeout)
+        elif is_network_device(self.device) or is_unix_device(self.device):
+            self.connection = open_network_device(self.device, timeout=timeout)
         else:
+            # pyserial is only needed for a local serial port
+            import serial
             self.connection = serial.Serial(
                 port=self.device,
                 baudrate=9600,
@@ -215,9 +157,32 @@ class JA80TConnection():
                 bytesize=serial.EIGHTBITS,
                 dsrdtr=True,
                 # stopbits=serial.STOPBITS_ONE
-                timeout=1)
+                timeout=timeout)
+        self.set_waker(self._cancel_read)
+
+    def set_waker(self, waker):
+        # called when a key is queued, so it is sent without waiting for the next read to complete
+        if isinstance(self.cmd_q, JA80CommandQueue):
+            self.cmd_q.waker = waker
+
+    def _cancel_read(self):
+        # thread mode: end the blocking read, read_send_packets then sends the key
+        cancel_read = getattr(self.connection, 'cancel_read', None)
+        if cancel_read is not None:
+            try:
+                cancel_read()
+            except Exception as ex:
+                _LOGGER.debug('Unable to cancel read: %s', ex)
+
+    def _poll_keys(self):
+        # asyncio mode: send a queued key right away, unless a packet is being received
+        if self.is_connected() and not self.framer.partial:
+            self.transmitter.poll()
 
     def disconnect(self):
+        self.set_waker(None)
+        if self.recorder is not None:
+            self.recorder.close()
         if self.is_connected():
             _LOGGER.info('Disconnecting from JA80...')
             self.connection.flush()
@@ -225,312 +190,491 @@ class JA80TConnection():
         else:
             _LOGGER.info('No need to disconnect; not connected')
 
+    def close(self):
+        # close the port without flushing, e.g. after the device has disappeared
+        if self.connection is not None and self.protocol is None:
+            try:
+                self.connection.close()
+            except Exception as ex:
+                _LOGGER.debug('Error closing connection: %s', ex)
+
+    def is_local_device(self):
+        return not self.mock and '://' not in self.device
+
+    def device_present(self):
+        # the USB serial device disappears while the interface re-enumerates
+        return not self.is_local_device() or os.path.exists(self.device)
+
     def is_connected(self):
-        return self.connection is not None and self.connection.is_open
+        if self.connection is None:
+            return False
+        if self.protocol is not None:
+            # asyncio transport
+            return not self.connection.is_closing()
+        return self.connection.is_open
+
+    async def async_connect(self, loop, packet_callback, signal_callback=None):
+        # asyncio mode: the serial port is read from the event loop instead of a dedicated thread
+        _LOGGER.info('Connecting to JA80 via JA-80T using %s (asyncio)...', self.device)
+        self.framer.reset()
+        self.transmitter.resume()
+        self._pending_packets.clear()
+        self.protocol = JA80TProtocol(loop, self, packet_callback, signal_callback)
+        try:
+            transport = await self._async_open(loop)
+        except Exception as ex:
+            # nothing is connected, async_disconnect must not wait for the protocol to be closed
+            self.protocol.closed.set_result(ex)
+            raise
+        self.connection = transport
+        self.set_waker(lambda: loop.call_soon_threadsafe(self._poll_keys))
+
+    async def _async_open(self, loop):
+        if self.mock:
+            transport = SerialMockTransport(loop, self.protocol, SerialMock(self.device, self.test_data))
+        elif self.device.startswith('replay://'):
+            path, speed = parse_replay_device(self.device)
+            transport = SerialMockTransport(loop, self.protocol, CaptureReplay(path, speed, timeout=0))
+        elif self.device.startswith('mock://'):
+            transport = SerialMockTransport(loop, self.protocol, create_mock_transport(self.device, timeout=0))
+        elif is_unix_device(self.device):
+            transport, _ = await loop.create_unix_connection(lambda: self.protocol, parse_unix_device(self.device))
+        elif is_network_device(self.device):
+            scheme, host, port = parse_network_device(self.device)
+            if scheme == 'rfc2217':
+                # pyserial's RFC2217 client has no file descriptor to watch, it is polled like the mocks
+                transport = SerialMockTransport(loop, self.protocol, open_rfc2217(self.device, timeout=0))
+            else:
+                transport, _ = await loop.create_connection(lambda: self.protocol, host, port)
+                configure_socket(transport.get_extra_info('socket'))
+        else:
+            import serial
+            import serial_asyncio
+            transport, _ = await serial_asyncio.create_serial_connection(
+                loop, lambda: self.protocol,
+                self.device,
+                baudrate=9600,
+                parity=serial.PARITY_NONE,
+                bytesize=serial.EIGHTBITS,
+                dsrdtr=True)
+        return transport
+
+    async def async_disconnect(self):
+        self.set_waker(None)
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.protocol is None:
+            return
+        if self.is_connected():
+            _LOGGER.info('Disconnecting from JA80...')
+            self.connection.close()
+        await self.protocol.closed
+
+    @property
+    def cmd_confirm_pending(self):
+        return self.transmitter.pending
 
     def get_command(self):
+        return self.transmitter.get_command()
 
-        # assume we have a command queue and return command if requested
-        if self.cmd_q.empty():
-            return None
-        try:
-            # get one command
-            cmd = self.cmd_q.get_nowait()
-            if cmd is not None:
-                # we could postpone this until command has been confirmed
-                self.cmd_q.task_done()
-        except queue.Empty:
-            _LOGGER.info('All command queue items processed')
-            pass
-        return cmd
+    def _write(self, data):
+        if self.wire_trace and _WIRE_LOGGER.isEnabledFor(logging.DEBUG):
+            _WIRE_LOGGER.debug('tx %s', HexDump(data))
+        self.connection.write(data)
 
-    def read_send_packet(self):
-        # keep reading bytes untill 0xff which indicates end of packet
-        _LOGGER.info('Read until we have captured one packet and return data')
+    def read_send_packets(self):
+        # drain everything the interface has buffered in one read and return all complete packets
         if not self.is_connected():
             _LOGGER.warning('Not connected to JA80, abort')
             return False
 
-        retry_limit = 5
-        retries = 0
-        max_package_length = 15  # longest packet seen is 10 bytes: ed 53 0c 00 3e 04 00 28 0b ff
-        read_buffer = []
-        for i in range(max_package_length):
-
-            data = self.connection.read()
-            if len(data) == 0:
-                retries += 1
-                if retries < retry_limit:
-                    _LOGGER.info('No data received, retry in 1 second')
-                    time.sleep(1)
-                    continue
+        # read waits up to the port timeout (1 second in thread mode) for data
+        start = time.perf_counter()
+        data = self.connection.read(self.connection.in_waiting or 1)
+        self.metrics.read.observe(time.perf_counter() - start)
+        if len(data) == 0:
+            # still check for keys that were not confirmed in time, the read may also have been cancelled to send a
+            # queued key; never in the middle of a packet
+            if not self.framer.partial:
+                self.transmitter.poll()
+            quiet_time = time.monotonic() - self._last_data
+            if quiet_time > self.NO_SIGNAL_TIMEOUT:
+                # checked on every read, only the start of a quiet line is a warning
+                if not self._quiet:
+                    self._quiet = True
+                    _LOGGER.warning('No data received for %s seconds', self.NO_SIGNAL_TIMEOUT)
                 else:
-                    _LOGGER.warning('No data received after %s retries, abort', retry_limit)
-                    return False
-
-            retries = 0
-
-            data_dec = ord(data)
-            read_buffer.append(data_dec)
-
-            if data_dec == 0xff:
-                # end of this packet, check for command confirmation and then handle data
-                if self.cmd_confirm_pending is not None:
-                    # print('Pending last command confirmation, buf len', len(read_buffer), 'buf 0', read_buffer[0], 'cmd p', ord(self.cmd_confirm_pending))
-                    # see if current buffer matches command
-                    if len(read_buffer) == 2 and read_buffer[0] == ord(self.cmd_confirm_pending):
-                        _LOGGER.info('Last command confirmed')
-                        self.cmd_confirm_pending = None
-                
-                # see if there is a new command we need to send
-                # only continue if we are not waiting for a confirmation of last command
-                if self.cmd_confirm_pending is None:
-
-                    send_cmd = self.get_command()
-                    if send_cmd is not None:
-                        # can only send one command at a time, wait for the command to be reflected back and then send next one
-                        _LOGGER.info('New command, send to JA80... %s', send_cmd)
-
-                        self.cmd_confirm_pending = send_cmd
-                        data_written = self.connection.write(send_cmd)
-                        # _LOGGER.info('Command sent, return %s', data_written)
-
-                # return data we read earlire
-                return read_buffer
-
-        # finished reading data for max package length without package end marker 0xff
-        return False
-
-
-class JA80AlarmTimestamp:
-    msg_raw = timestamp = event_type = event_source = None
-
-    EVENT_MOTION_ALARM = 0x01  # ?? seen when alarm is triggered via motion (but might be same for door)
-    EVENT_OTHER_ALARM2 = 0x02
-    EVENT_OTHER_ALARM3 = 0x03
-    EVENT_OTHER_ALARM4 = 0x04
-    EVENT_TAMPER_ALARM = 0x05
-    EVENT_ARMING = 0x08  # arming request
-    EVENT_DISARMING = 0x09 # disarming request
-    EVENT_ARMING_KEYPAD = 0x0c  ## ?? seen when armed via keypad (maybe in tamper state?)
-    EVENT_TAMPER_SENSORS_OK = 0x50
-    EVENT_CANCEL_ALARM = 0x4e  # ?? seen when system is disarmed when alarm is active
-
-    # these will triger prio 1 alerts (intrusion)
-    alarm_status = [EVENT_MOTION_ALARM, EVENT_OTHER_ALARM2, EVENT_OTHER_ALARM3, EVENT_OTHER_ALARM4]
-
-    '''
-    e3 02 01 23 36 08 09 3f ff
-    alarm time stamp event, here 02-01 23:36 (d-m h:i) event type 08 source 09                  
-                event type 08 = Setting 
-    53 S    arming          source 09 = keyfob (in my case)
-    '''
-    def __init__(self, msg):
-        self.parse_msg(msg)
-
-    def is_alarm(self):
-        return self.event_type in self.alarm_status
-
-    def parse_msg(self, msg):
-        if len(msg) != 9:
-            raise ValueError('Invalid msg len', len(msg), '(expect 10)')
-        self.msg_raw = msg
-        # these are binary coded (16 hex = 16 dec) so print hex values
-        self.timestamp = '{:02x}'.format(msg[1]) + '/' + '{:02x}'.format(msg[2]) + ' ' + '{:02x}'.format(msg[3]) + ':' + '{:02x}'.format(msg[4])
-        self.event_type = msg[5]
-        self.event_name = self.get_event_type_name(msg[5])
-        # self.event_source = int(msg[6], 16)
-        self.event_source = msg[6]  # eg 49 for keypad, 9 = keyfob
-
-    def get_event_type_name(self, event_type=None):
-
-        if event_type is None:
-            event_type = self.event_type
-
-        if event_type == self.EVENT_MOTION_ALARM:
-            return 'Motion alarm'
-        elif (event_type == self.EVENT_OTHER_ALARM2
-            or event_type == self.EVENT_OTHER_ALARM3 
-            or event_type == self.EVENT_OTHER_ALARM4):
-            return 'Other alarm'
-        elif event_type == self.EVENT_TAMPER_ALARM:
-            return 'Tamper alarm'
-        elif event_type == self.EVENT_ARMING:
-            return 'Arming via keyfob'
-        elif event_type == self.EVENT_ARMING_KEYPAD:
-            return 'Arming via keypad'
-        elif event_type == self.EVENT_DISARMING:
-            return 'Disarming'
-        elif event_type == self.EVENT_TAMPER_SENSORS_OK:
-            return 'All tamper sensors ok'
-        elif event_type == self.EVENT_CANCEL_ALARM:
-            return 'Cancel alarm'
-        return 'Unknown alarm event'
-
-    def get_hass_status(self, event_type=None):
-
-        if event_type is None:
-            event_type = self.event_type
-
-        if event_type == self.EVENT_MOTION_ALARM:
-            return STATE_ALARM_TRIGGERED
-        elif (event_type == self.EVENT_OTHER_ALARM2
-            or event_type == self.EVENT_OTHER_ALARM3 
-            or event_type == self.EVENT_OTHER_ALARM4):
-            return STATE_ALARM_TRIGGERED
-        elif event_type == self.EVENT_TAMPER_ALARM:
-            return 'STATE_TAMPER_ALARM_TRIGGERED'
-        elif event_type == self.EVENT_ARMING:
-            return STATE_ALARM_ARMING
-        elif event_type == self.EVENT_ARMING_KEYPAD:
-            return STATE_ALARM_ARMING
-        elif event_type == self.EVENT_DISARMING:
-            return STATE_ALARM_DISARMING
-        elif event_type == self.EVENT_TAMPER_SENSORS_OK:
-            return 'STATE_TAMPER_SENSORS_OK'
-        elif event_type == self.EVENT_CANCEL_ALARM:
-            return 'CANCEL_ALARM'
-        return 'STATE_UNKNOWN'
-
-    def __str__(self):
-
-        s = 'AlarmTimestamp:\n'
-        s += f'    timestamp = {self.timestamp}\n'
-        s += f'    event_type = {self.event_name} ({self.event_type})\n'
-        s += f'    event_source = {self.event_source}'
-        return s
-
-
-class JA80(object):
-
-    current_alarm_status = None
-    sensor_id = None
-    # last_tamper_event = 
-    # tamper_event_count_since_last
-
-    MSG_TYPE_KEYPRESS = 'KeyPress'
-    MSG_TYPE_BEEP = 'Beep'
-    MSG_TYPE_ALARM_STATUS = 'AlarmStatus'
-    MSG_TYPE_ALARM_TIMESTAMP = 'AlarmTimestamp'
-    MSG_TYPE_STATE_STATUS = 'StateStatus'
-
-    CMD_DISARM_SYSTEM = 1
-    CMD_LONG_BEEP = 2
-    CMD_SHORT_BEEP = 3
-    CMD_ARM_SYSTEM = 4
-    #CMD_CANCEL_ALARM = 5
-
-    msg_types = {
-         0x80: MSG_TYPE_KEYPRESS
-        ,0xa0: MSG_TYPE_BEEP
-        ,0xed: MSG_TYPE_ALARM_STATUS
-        ,0xe3: MSG_TYPE_ALARM_TIMESTAMP
-        ,0xe8: MSG_TYPE_STATE_STATUS
-    }
-
-    keypress_options = {
-         0x0: {'val': '0', 'desc': 'Key 0 pressed on keypad'}
-        ,0x1: {'val': '1', 'desc': 'Key 1 (^) pressed on keypad'}
-        ,0x2: {'val': '2', 'desc': 'Key 2 pressed on keypad'}
-        ,0x3: {'val': '3', 'desc': 'Key 3 pressed on keypad'}
-        ,0x4: {'val': '4', 'desc': 'Key 4 (<) pressed on keypad'}
-        ,0x5: {'val': '5', 'desc': 'Key 5 pressed on keypad'}
-        ,0x6: {'val': '6', 'desc': 'Key 6 (>) pressed on keypad'}
-        ,0x7: {'val': '7', 'desc': 'Key 7 (v) pressed on keypad'}
-        ,0x8: {'val': '8', 'desc': 'Key 8 pressed on keypad'}
-        ,0x9: {'val': '9', 'desc': 'Key 9 pressed on keypad'}
-        #,0xa: {'val': 'A', 'desc': 'Key A pressed on keypad'} A, B, ABC keys appear to be shortcuts for *1, *2, *3
-        #,0xb: {'val': 'B', 'desc': 'Key B pressed on keypad'}
-        #,0xc: {'val': 'C', 'desc': 'Key ABC pressed on keypad'}
-        #,0xd: {'val': '?', 'desc': 'Key ? pressed on keypad'} ? will just send # (8E)
-        ,0xe: {'val': '#', 'desc': 'Key # (ESC/OFF) pressed on keypad'}
-        ,0xf: {'val': '*', 'desc': 'Key * (ON) pressed on keypad'}
-    }
-
-    beep_options = {
-         0x0: {'val': '1s', 'desc': '1 subtle (short) beep triggered'}
-        ,0x1: {'val': '1l', 'desc': '1 loud (long) beep triggered'}
-        ,0x2: {'val': '2l', 'desc': '2 loud (long) beeps triggered'}
-        ,0x3: {'val': '3l', 'desc': '3 loud (long) beeps triggered'}
-        ,0x4: {'val': '4s', 'desc': '4 subtle (short) beeps triggered'}  # happens when warning appears on keypad (e.g. after alarm)
-        ,0x8: {'val': 'in', 'desc': 'Infinite beeping triggered'}
-        #  ,0x4: {'val': 'o4', 'desc': 'Other beep triggered (4)'}
-        #  ,0x5: {'val': 'o5', 'desc': 'Other beep triggered (5)'}
-        #  ,0x6: {'val': 'o6', 'desc': 'Other beep triggered (6)'}
-        #  ,0x7: {'val': 'o7', 'desc': 'Other beep triggered (7)'}
-        #  ,0x9: {'val': 'o9', 'desc': 'Other beep triggered (9)'}
-        #  ,0xa: {'val': 'oa', 'desc': 'Other beep triggered (10)'}
-    }
-
-    def __init__(self):
-        pass
-
-    def read_state(self, buf):
-
-        packet_data = " ".join(["%02x" % c for c in buf])
-
-        # parse data, based on message type (first byte)
-        msg_type = None
-        try:
-            msg_type = self.msg_types.get(buf[0])
-            if msg_type is None:
-                # try again with only highest 4 bits (e.g. 0x85 > 0x80)
-                msg_type = self.msg_types.get(buf[0] & 0xf0)
-        except Exception as ex:
-            _LOGGER.error('Error determining msg type from buffer: %s', ex)
-            #  msg type is still none so next call will work
-            pass
-        # print(msg_type)
-        try:
-            if msg_type is None:
-                # unknown type
-                _LOGGER.info("%s Unimplemented message type | %s", datetime.now(), packet_data)
-                return None
+                    _LOGGER.debug('No data received for %.0f seconds', quiet_time)
+                return False
+            return []
+
+        now = time.monotonic()
+        if self._quiet:
+            self._quiet = False
+            _LOGGER.info('Data received again after %.0f seconds', now - self._last_data)
+        self._last_data = now
+        return self.handle_data(data)
+
+    def handle_data(self, data):
+        # frame received data, check command confirmation and send next command if we have one queued
+        start = time.perf_counter()
+        if self.wire_trace and _WIRE_LOGGER.isEnabledFor(logging.DEBUG):
+            _WIRE_LOGGER.debug('rx %s', HexDump(data))
+        if self.recorder is not None:
+            self.recorder.write(data)
+        packets = self.framer.feed(data)
+        transmitter = self.transmitter
+        if transmitter.pending is not None:
+            for packet in packets:
+                # the panel reflects each key back as a 2 byte packet, the next key is sent right away
+                if len(packet) == 2:
+                    transmitter.confirm(packet)
+
+        # send a new key if we have one queued, or retry a key that was not confirmed in time,
+        # in between packets so a key is not written while the panel is sending
+        if not self.framer.partial:
+            transmitter.poll()
+        self.metrics.frame.observe(time.perf_counter() - start)
+        return packets
+
+    def read_send_packet(self):
+        # return a single packet, packets that arrived in the same read are kept for the next call
+        while not self._pending_packets:
+            packets = self.read_send_packets()
+            if packets is False:
+                return False
+            self._pending_packets.extend(packets)
+        return self._pending_packets.popleft()
+
+
+class JA80KeyTransmitter():
+    """Send queued keys to the JA80, one at a time as each key is echoed back by the panel."""
+
+    CONFIRM_TIMEOUT = 1.0  # seconds to wait for the echo of a key
+    # resend an unconfirmed key this many times before giving up, off by default: when only the echo was lost the
+    # panel would get the key twice, e.g. a digit of the code
+    MAX_RETRIES = 0
+
+    def __init__(self, cmd_q, write, confirm_timeout=CONFIRM_TIMEOUT, max_retries=MAX_RETRIES, latency=None,
+                 queued=None):
+        self.cmd_q = cmd_q
+        self._write = write
+        self._latency = latency  # optional histogram of key round trips
+        self._queued = queued  # optional histogram of the time from queueing a key until it is written
+        self.confirm_timeout = confirm_timeout
+        self.max_retries = max_retries
+
+        self.pending = None  # key waiting for confirmation
+        self._sent_at = None
+        self._retries = 0
+        self._resume = None  # unconfirmed key to send first after a reconnect
+        self.on_abort = None  # optional callback, called with the key when a command is aborted
+
+        self.confirmed = self.retried = self.aborted = 0
+        self.last_latency = self.max_latency = None
+        self._total_latency = 0.0
+
+    def reset(self):
+        # keys still in the queue are kept, only forget the key we were waiting for
+        self.pending = None
+        self._sent_at = None
+        self._retries = 0
+
+    def resume(self):
+        # after a reconnect, the key that was not confirmed may have reached the panel: it is only sent again when
+        # retries are enabled, otherwise the command is aborted; queued keys of later commands are kept
+        key = self.pending
+        self.reset()
+        if key is None:
+            return
+        if self.max_retries > 0:
+            self._resume = key
+        else:
+            self._abort(key, 'not confirmed before the connection was lost')
 
-            elif msg_type == self.MSG_TYPE_KEYPRESS:
-                # 0x0: {'val': '0', 'desc': 'Key 0 pressed on keypad'}
-                # unly use lower 4 bits
-                key = self.keypress_options.get(buf[0] & 0x0f)
-                _LOGGER.info('%s %s', datetime.now(), f"KeyPress: {key} | {packet_data}")
-                return None  # ignore this event
-
-            elif msg_type == self.MSG_TYPE_BEEP:
-                # 0x1: {'val': '1l', 'desc': '1 loud (long) beep triggered'}
-                # unly use lower 4 bits
-                beep = self.beep_options.get(buf[0] & 0x0f)
-                beep_desc = 'unknown'
-                if beep:
-                    beep_desc = beep['desc']
-                _LOGGER.info('%s %s', datetime.now(), f"Beep: {beep_desc} | {packet_data}")
-                return None  # ignore this event
-
-            elif msg_type == self.MSG_TYPE_ALARM_STATUS:
-                status = JA80AlarmStatus(buf)
-                _LOGGER.info('%s %s', datetime.now(), f"AlarmStatus: {status} | {packet_data}")
-                return status.get_hass_status()
-
-            elif msg_type == self.MSG_TYPE_ALARM_TIMESTAMP:
-                status = JA80AlarmTimestamp(buf)
-                _LOGGER.info('%s %s', datetime.now(), f"AlarmEvent: {status} | {packet_data}")
-                self.sensor_id = status.event_source
-                return status.get_hass_status()
-
-                # if status.event_type == JA80AlarmTimestamp.EVENT_TAMPER_ALARM:
-                #     # cancel alarm if this is a tamper alarm
-                #     # TODO: log last_tamper and increment tamper count (in all states)
-                    
-                #     if self.current_alarm_status == JA80AlarmStatus.ALARM_STATE_ALARM:
-                #         print('TODO: CANCEL this tamper alarm if below threshold')
-                #     else:
-                #         print('Tamper warning (disarmed)', status.event_source)
-
-            elif msg_type == self.MSG_TYPE_STATE_STATUS:
-                
-                _LOGGER.info('%s %s', datetime.now(), "State status " + '{:02x}'.format(buf[1]) + ' ' + '{:02x}'.format(buf[2]) + f' | {packet_data}')
+    def get_command(self):
+        # return the next queued key, skipping the None used to wake up a blocked reader
+        if self._resume is not None:
+            cmd = self._resume
+            self._resume = None
+            return cmd
+        while True:
+            try:
+                cmd = self.cmd_q.get_nowait()
+            except queue.Empty:
                 return None
+            self.cmd_q.task_done()
+            if cmd is not None:
+                return cmd
 
-        except Exception as ex:
-            _LOGGER.error('Exception in handling msg_type %s %s %s', msg_type, ex, packet_data)
+    def confirm(self, packet):
+        if self.pending is None or packet[0] != self.pending[0]:
             return False
 
-        return None
+        latency = time.monotonic() - self._sent_at
+        self.confirmed += 1
+        self.last_latency = latency
+        self._total_latency += latency
+        if self.max_latency is None or latency > self.max_latency:
+            self.max_latency = latency
+        if self._latency is not None:
+            self._latency.observe(latency)
+        _LOGGER.debug('Key %s confirmed in %.3fs', self.pending, latency)
+
+        self.reset()
+        self.poll()
+        return True
+
+    def poll(self):
+        if self.pending is None:
+            cmd = self.get_command()
+            if cmd is not None:
+                # can only send one key at a time, wait for the key to be reflected back and then send next one
+                _LOGGER.info('New command, send to JA80... %s', cmd)
+                self._send(cmd)
+                enqueued_at = getattr(self.cmd_q, 'enqueued_at', None)
+                if self._queued is not None and enqueued_at is not None:
+                    self._queued.observe(time.perf_counter() - enqueued_at)
+            return
+
+        if time.monotonic() - self._sent_at < self.confirm_timeout:
+            return
+
+        if self._retries < self.max_retries:
+            self._retries += 1
+            self.retried += 1
+            _LOGGER.warning('Key %s not confirmed in %ss, retry %s', self.pending, self.confirm_timeout, self._retries)
+            self._send(self.pending)
+            return
+
+        key = self.pending
+        self.reset()
+        self._abort(key, 'not confirmed after %s retries' % self.max_retries)
+
+    def _abort(self, key, reason):
+        # the remaining keys belong to the same command, sending them without this key is pointless
+        dropped = 0
+        self._resume = None
+        while self.get_command() is not None:
+            dropped += 1
+        self.aborted += 1
+        _LOGGER.error('Key %s %s, command aborted (%s keys dropped)', key, reason, dropped)
+        if self.on_abort is not None:
+            self.on_abort(key)
+
+    def _send(self, cmd):
+        self.pending = cmd
+        self._sent_at = time.monotonic()
+        self._write(cmd)
+
+    def get_stats(self):
+        return {
+            'confirmed': self.confirmed,
+            'retried': self.retried,
+            'aborted': self.aborted,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            'avg_latency': self._total_latency / self.confirmed if self.confirmed else None,
+        }
+
+
+class JA80TSupervisor():
+    """Keep a JA80TConnection connected, reconnecting with capped exponential backoff when it fails."""
+
+    MIN_BACKOFF = 0.5  # seconds
+    MAX_BACKOFF = 30
+    DEVICE_POLL_INTERVAL = 0.5  # check for the device to come back
+
+    def __init__(self, connection, stop_event, min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF):
+        self.connection = connection
+        self._stop = stop_event
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._backoff = min_backoff
+        self._lost_at = None
+
+    def _connected(self):
+        if self._lost_at is not None:
+            recovery_time = time.monotonic() - self._lost_at
+            self.connection.metrics.recover.observe(recovery_time)
+            self.connection.metrics.reconnects += 1
+            _LOGGER.info('Connection to JA80 recovered in %.1fs', recovery_time)
+            self._lost_at = None
+
+    def _lost(self, ex):
+        self.connection.metrics.connection_losses += 1
+        if self._lost_at is None:
+            self._lost_at = time.monotonic()
+        return self._next_backoff()
+
+    def _failed(self, ex):
+        _LOGGER.warning('Unable to connect to JA80 via %s: %s, retry in %ss', self.connection.device, ex, self._backoff)
+        return self._next_backoff()
+
+    def _next_backoff(self):
+        # the backoff is only reset once data is received, so a port that fails right after opening is not hammered
+        backoff = self._backoff
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+        return backoff
+
+    def run(self, packet_callback, signal_callback):
+        # blocking loop for thread mode, returns when the stop event is set
+        connection = self.connection
+        while not self._stop.is_set():
+            if not connection.is_connected():
+                if not connection.device_present():
+                    self._stop.wait(self.DEVICE_POLL_INTERVAL)
+                    continue
+                try:
+                    connection.connect()
+                except Exception as ex:
+                    self._stop.wait(self._failed(ex))
+                    continue
+                self._connected()
+
+            try:
+                packets = connection.read_send_packets()
+            except Exception as ex:
+                # e.g. serial.SerialException when the USB interface disappears
+                _LOGGER.error('Connection to JA80 lost: %s', ex)
+                connection.close()
+                signal_callback(False)
+                self._stop.wait(self._lost(ex))
+                continue
+
+            if packets is False:
+                signal_callback(False)
+                continue
+
+            if packets:
+                self._backoff = self.min_backoff
+            for packet in packets:
+                packet_callback(packet)
+
+    async def async_run(self, loop, packet_callback, signal_callback):
+        # asyncio mode, returns when the stop event is set and the transport is closed
+        connection = self.connection
+
+        def on_signal(signal):
+            if signal:
+                self._backoff = self.min_backoff
+            signal_callback(signal)
+
+        while not self._stop.is_set():
+            if not connection.device_present():
+                await asyncio.sleep(self.DEVICE_POLL_INTERVAL)
+                continue
+            try:
+                await connection.async_connect(loop, packet_callback, on_signal)
+            except Exception as ex:
+                await asyncio.sleep(self._failed(ex))
+                continue
+            self._connected()
+
+            exc = await connection.protocol.closed
+            if self._stop.is_set():
+                break
+            await asyncio.sleep(self._lost(exc))
+
+
+class JA80TProtocol(asyncio.Protocol):
+    """Asyncio protocol feeding data from the JA-80T through the JA80TConnection framer."""
+
+    NO_SIGNAL_TIMEOUT = JA80TConnection.NO_SIGNAL_TIMEOUT
+
+    def __init__(self, loop, connection, packet_callback, signal_callback=None):
+        self._loop = loop
+        self._connection = connection
+        self._packet_callback = packet_callback
+        self._signal_callback = signal_callback
+        self._last_data = None
+        self._signal = False
+        self._quiet = False  # the line went quiet after data was received
+        self._signal_check = None
+        self.closed = self._loop.create_future()
+
+    def connection_made(self, transport):
+        _LOGGER.info('Connected to JA80 (asyncio)')
+        self._last_data = self._loop.time()
+        self._signal_check = self._loop.call_later(1, self._check_signal)
+
+    def data_received(self, data):
+        now = self._loop.time()
+        if self._quiet:
+            self._quiet = False
+            _LOGGER.info('Data received again after %.0f seconds', now - self._last_data)
+        self._last_data = now
+        if not self._signal:
+            self._set_signal(True)
+        for packet in self._connection.handle_data(data):
+            self._packet_callback(packet)
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            _LOGGER.error('Connection to JA80 lost: %s', exc)
+        else:
+            _LOGGER.info('Connection to JA80 closed')
+        if self._signal_check is not None:
+            self._signal_check.cancel()
+        self._set_signal(False)
+        if not self.closed.done():
+            self.closed.set_result(exc)
+
+    def _check_signal(self):
+        if self._signal and self._loop.time() - self._last_data > self.NO_SIGNAL_TIMEOUT:
+            _LOGGER.warning('No data received for %s seconds', self.NO_SIGNAL_TIMEOUT)
+            self._quiet = True
+            self._set_signal(False)
+        # keys are normally checked on each read, also time out keys when the line is quiet
+        if not self._connection.framer.partial:
+            self._connection.transmitter.poll()
+        self._signal_check = self._loop.call_later(1, self._check_signal)
+
+    def _set_signal(self, signal):
+        self._signal = signal
+        if self._signal_callback is not None:
+            self._signal_callback(signal)
+
+
+class SerialMockTransport(asyncio.Transport):
+    """Asyncio transport polling a serial like object (SerialMock, JA80MockTransport, CaptureReplay or RFC2217)."""
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, loop, protocol, serial_mock):
+        super().__init__()
+        self._loop = loop
+        self._protocol = protocol
+        self._serial = serial_mock
+        self._closing = False
+        self._loop.call_soon(self._protocol.connection_made, self)
+        self._poll = self._loop.call_later(self.POLL_INTERVAL, self._read)
+
+    def _read(self):
+        try:
+            data = self._serial.read(self._serial.in_waiting or 1)
+        except Exception as ex:
+            self._close(ex)
+            return
+        if data:
+            self._protocol.data_received(data)
+        if not self._closing:
+            self._poll = self._loop.call_later(self.POLL_INTERVAL, self._read)
+
+    def write(self, data):
+        self._serial.write(data)
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        self._close(None)
+
+    def _close(self, exc):
+        if self._closing:
+            return
+        self._closing = True
+        self._poll.cancel()
+        self._serial.close()
+        self._loop.call_soon(self._protocol.connection_lost, exc)
+
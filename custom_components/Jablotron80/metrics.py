@@ -0,0 +1,132 @@
+"""Low overhead counters and latency histograms for the JA80 data path."""
+from bisect import bisect_left
+
+# upper bounds of the histogram buckets in seconds, the last bucket holds everything above
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class Histogram():
+    """Fixed bucket histogram, observing a value is a bisect and a few additions."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile):
+        # upper bound of the bucket holding the percentile, None if it is in the overflow bucket
+        if not self.count:
+            return None
+        rank = self.count * percentile / 100
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self):
+        # latencies in ms
+        labels = ['<=%gms' % (bound * 1000) for bound in self.buckets] + ['>%gms' % (self.buckets[-1] * 1000)]
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else None,
+            'max_ms': round(self.max * 1000, 3),
+            'p50_ms': None if p50 is None else p50 * 1000,
+            'p95_ms': None if p95 is None else p95 * 1000,
+            'buckets': {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+
+class JA80Metrics():
+    """Counters and per stage latency histograms of one panel connection."""
+
+    STAGES = (
+        'read',  # blocking read on the serial port (thread mode)
+        'frame',  # framing and command confirmation of received data
+        'decode',  # decoding one packet
+        'hop',  # hand over of a state change from the I/O thread to the event loop
+        'publish',  # from state change to Home Assistant state write, includes the publish window
+        'command',  # from queueing a key until it is written to the panel
+        'key',  # round trip of a key sent to the panel until it is echoed back
+        'completion',  # from sending an arm or disarm command until the panel reports the requested state
+        'recover',  # from losing the connection until it is connected again
+    )
+
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in self.STAGES}
+        self.read = self.stages['read']
+        self.frame = self.stages['frame']
+        self.decode = self.stages['decode']
+        self.hop = self.stages['hop']
+        self.publish = self.stages['publish']
+        self.command = self.stages['command']
+        self.key = self.stages['key']
+        self.completion = self.stages['completion']
+        self.recover = self.stages['recover']
+        self.reset()
+
+    def reset(self):
+        for histogram in self.stages.values():
+            histogram.reset()
+        self.packet_counts = [0] * 256  # per first byte, grouped by message type in the snapshot
+        self.malformed = 0
+        self.state_changes = 0
+        self.connection_losses = 0
+        self.reconnects = 0
+        self.commands_failed = 0
+
+    def record_packet(self, first_byte, state, duration):
+        self.packet_counts[first_byte] += 1
+        if state is False:
+            self.malformed += 1
+        self.decode.observe(duration)
+
+    def snapshot(self, dispatch=None, connection=None, system=None):
+        # dispatch: first byte > schema table used to group packet counts by message type
+        packets = {}
+        unknown = 0
+        for first_byte, count in enumerate(self.packet_counts):
+            if not count:
+                continue
+            schema = None if dispatch is None else dispatch[first_byte]
+            if schema is None:
+                unknown += count
+            else:
+                packets[schema.name] = packets.get(schema.name, 0) + count
+
+        snapshot = {
+            'packets': packets,
+            'unknown': unknown,
+            'malformed': self.malformed,
+            'state_changes': self.state_changes,
+            'connection_losses': self.connection_losses,
+            'reconnects': self.reconnects,
+            'commands_failed': self.commands_failed,
+            'latency': {stage: histogram.snapshot() for stage, histogram in self.stages.items() if histogram.count},
+        }
+        if connection is not None:
+            snapshot['overruns'] = connection.framer.overruns
+            snapshot['framing'] = connection.framer.get_stats()
+            snapshot['commands'] = {
+                'confirmed': connection.transmitter.confirmed,
+                'retried': connection.transmitter.retried,
+                'aborted': connection.transmitter.aborted,
+            }
+        if system is not None:
+            snapshot['cache'] = system.get_cache_stats()
+        return snapshot
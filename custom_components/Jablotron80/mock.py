@@ -0,0 +1,186 @@
+"""Serial like mock of the JA-80T generating panel traffic with injected faults, for load testing."""
+import logging
+import random
+import threading
+import time
+from urllib.parse import parse_qsl
+
+_LOGGER = logging.getLogger(__name__)
+
+# traffic profiles, the packets of a profile are sent in a loop
+PROFILES = {
+    'idle': [
+        'ed 40 00 00 30 00 00 00 60 ff',
+    ],
+    'arming': [
+        'e3 02 01 23 36 08 09 3f ff',
+        'ed 53 0c 00 3e 04 00 28 0b ff',
+        'a0 ff',
+        'ed 53 0c 00 3e 04 00 28 0b ff',
+        'ed 42 00 00 30 00 00 00 60 ff',
+    ],
+    'alarm': [
+        'ed 42 00 00 30 00 00 00 60 ff',
+        'e3 02 01 23 40 01 03 3f ff',
+        'ed 44 0c 00 3e 04 00 28 0b ff',
+        'a8 ff',
+        'e3 02 01 23 41 4e 49 3f ff',
+        'ed 40 00 00 30 00 00 00 60 ff',
+    ],
+    'mixed': [
+        'ed 40 00 00 30 00 00 00 60 ff',
+        'e8 01 02 ff',
+        'ed 40 00 00 30 00 00 00 60 ff',
+        'e3 02 01 23 36 05 07 3f ff',
+        'a0 ff',
+        'ed 40 00 00 30 00 00 00 60 ff',
+        'e3 02 01 23 37 50 07 3f ff',
+    ],
+}
+
+# the checksum is the byte before the 0xff end of packet marker of these packet types
+CHECKSUM_PACKET_TYPES = (0xed, 0xe3)
+
+FAULTS = ('drop_byte', 'corrupt_checksum', 'drop_terminator', 'stall', 'lose_echo')
+
+
+class JA80MockTransport():
+    """Generate JA-80T traffic at a given rate (packets per second, 0 = as fast as it is read) with random faults."""
+
+    CHUNK_SIZE = 4096  # bytes generated at a time when unthrottled
+
+    def __init__(self, profile='idle', rate=20.0, timeout=1.0, seed=None, stall_time=2.0, **faults):
+        _LOGGER.info('JA80MockTransport: profile %s, rate %s, faults %s', profile, rate, faults)
+        if isinstance(profile, str):
+            profile = PROFILES[profile]
+        self.packets = [bytes.fromhex(packet) for packet in profile]
+        self.rate = rate
+        self.timeout = timeout
+        self.stall_time = stall_time
+        # probability of each fault, per packet (stall: per read, lose_echo: per write)
+        self.faults = dict.fromkeys(FAULTS, 0.0)
+        for fault, probability in faults.items():
+            if fault not in self.faults:
+                raise ValueError('Unknown fault', fault)
+            self.faults[fault] = float(probability)
+
+        self.stats = dict.fromkeys(FAULTS, 0)
+        self.stats.update({'packets': 0, 'bytes': 0, 'writes': 0, 'echoes': 0})
+
+        self.is_open = True
+        self._random = random.Random(seed)
+        self._buffer = bytearray()
+        self._echoes = bytearray()
+        self._next_packet = 0
+        self._started = time.monotonic()
+        self._stalled_until = 0
+        self._cancel = threading.Event()
+
+    def _generate(self, count):
+        buf = self._buffer
+        faults = self.faults
+        rnd = self._random.random
+        for _ in range(count):
+            if self._echoes:
+                # echoed keys are sent in between packets
+                buf += self._echoes
+                self._echoes.clear()
+            packet = self.packets[self._next_packet % len(self.packets)]
+            self._next_packet += 1
+            self.stats['packets'] += 1
+
+            if faults['corrupt_checksum'] and packet[0] in CHECKSUM_PACKET_TYPES and rnd() < faults['corrupt_checksum']:
+                packet = bytearray(packet)
+                packet[-2] ^= 1 << int(rnd() * 7)
+                self.stats['corrupt_checksum'] += 1
+            if faults['drop_terminator'] and rnd() < faults['drop_terminator']:
+                packet = packet[:-1]
+                self.stats['drop_terminator'] += 1
+            if faults['drop_byte'] and len(packet) > 1 and rnd() < faults['drop_byte']:
+                pos = int(rnd() * len(packet))
+                packet = packet[:pos] + packet[pos + 1:]
+                self.stats['drop_byte'] += 1
+            buf += packet
+
+    def _fill(self):
+        if self.rate:
+            due = int((time.monotonic() - self._started) * self.rate) - self._next_packet
+            if due > 0:
+                self._generate(due)
+        elif len(self._buffer) < self.CHUNK_SIZE:
+            self._generate(self.CHUNK_SIZE // len(self.packets[0]))
+        if self._echoes:
+            self._buffer += self._echoes
+            self._echoes.clear()
+
+    @property
+    def in_waiting(self):
+        if time.monotonic() < self._stalled_until:
+            return 0
+        self._fill()
+        return len(self._buffer)
+
+    def read(self, size=1):
+        now = time.monotonic()
+        if now >= self._stalled_until and self.faults['stall'] and self._random.random() < self.faults['stall']:
+            self._stalled_until = now + self.stall_time
+            self.stats['stall'] += 1
+
+        deadline = None if self.timeout is None else now + self.timeout
+        while True:
+            if now >= self._stalled_until:
+                self._fill()
+                if self._buffer:
+                    break
+            if self.timeout == 0 or (deadline is not None and now >= deadline) or self._cancel.is_set():
+                self._cancel.clear()
+                return b''
+            # wait for the next packet or the end of the stall, but no longer than the read timeout
+            wait = 1.0 / self.rate if self.rate else 0.001
+            if now < self._stalled_until:
+                wait = self._stalled_until - now
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            self._cancel.wait(max(0, wait))
+            now = time.monotonic()
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.stats['bytes'] += len(data)
+        return data
+
+    def write(self, data):
+        self.stats['writes'] += 1
+        if self.faults['lose_echo'] and self._random.random() < self.faults['lose_echo']:
+            self.stats['lose_echo'] += 1
+        else:
+            # the panel reflects each key back followed by the end of packet marker
+            self._echoes += data
+            self._echoes.append(0xff)
+            self.stats['echoes'] += 1
+        return len(data)
+
+    def cancel_read(self):
+        self._cancel.set()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def create_mock_transport(device, timeout=1.0):
+    # mock://<profile>[?rate=<packets per second>&seed=<seed>&<fault>=<probability>...]
+    profile, _, query = device[len('mock://'):].partition('?')
+    options = dict(parse_qsl(query))
+    kwargs = {fault: float(options.pop(fault)) for fault in FAULTS if fault in options}
+    if 'rate' in options:
+        kwargs['rate'] = float(options.pop('rate'))
+    if 'seed' in options:
+        kwargs['seed'] = int(options.pop('seed'))
+    if 'stall_time' in options:
+        kwargs['stall_time'] = float(options.pop('stall_time'))
+    if options:
+        raise ValueError('Unknown mock options', options)
+    return JA80MockTransport(profile or 'idle', timeout=timeout, **kwargs)
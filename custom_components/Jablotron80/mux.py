@@ -0,0 +1,316 @@
+"""Stand-alone multiplexer that shares one JA-80T port with several local clients, e.g. Home Assistant, a capture
+logger and a diagnostics tool.
+
+Usage:
+    python -m custom_components.Jablotron80.mux --device /dev/ttyUSB0 --socket /run/ja80.sock
+
+The multiplexer owns the port and sends every complete packet it receives to all clients of the Unix socket, so a
+client sees the same byte stream as on the port. Keys written by the clients go through one command queue: the keys
+of one client are sent before the keys of the next, so each key is confirmed by its own echo. Point serial_port (or
+--device of the bridge) at unix:///run/ja80.sock to connect as a client.
+
+Needs pyserial for a local serial port, Home Assistant is not needed.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import stat
+import threading
+import time
+
+from .ja80 import JA80CommandQueue, JA80TConnection, JA80TSupervisor
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '/run/ja80.sock'
+DEFAULT_SOCKET_MODE = '660'
+
+MAX_CLIENT_BUFFER = 64 * 1024  # bytes a client may fall behind before it is disconnected
+
+
+class JA80KeyArbiter():
+    """Pass the keys of one client at a time to the command queue, the keys of other clients wait until it is done.
+
+    A client sends a key, waits for its echo and then sends the next key. The client whose keys are in the queue owns
+    it until it has not sent a key for HOLD seconds after the last echo, then the client that waited longest is next.
+    A waiting key is dropped when the queue was not busy with the owner's keys for key_wait seconds, the time the
+    transmitter takes to send a key and give up on its echo.
+    """
+
+    HOLD = 0.5  # seconds the owner keeps the queue after the echo of its last key, for the next key of its command
+
+    def __init__(self, cmd_q, transmitter, clock=time.monotonic):
+        self._cmd_q = cmd_q
+        self._transmitter = transmitter
+        self._clock = clock
+        self.key_wait = transmitter.confirm_timeout * (transmitter.max_retries + 1)
+        self.owner = None
+        self._owner_until = 0
+        self._last_echo = 0  # time of the last echo of a key of the owner
+        self._unconfirmed = None  # last key of the owner that was not echoed yet
+        self._waiting = {}  # client: (key, time it arrived), in the order the clients have to wait
+        self.forwarded = self.deferred = self.dropped = self.duplicates = 0
+
+    def submit(self, client, key):
+        if self.owner is None:
+            self.owner = client
+        if client is self.owner:
+            if key == self._unconfirmed:
+                # the client resends a key that was not echoed in time, resending is up to --key-retries of the
+                # multiplexer, the panel must not get the key twice
+                self.duplicates += 1
+                return
+            self._unconfirmed = key
+            self._owner_until = self._clock() + self.HOLD
+            self._cmd_q.put(key)
+            self.forwarded += 1
+        elif client not in self._waiting:
+            self._waiting[client] = (key, self._clock())
+            self.deferred += 1
+
+    def waiting_key(self, client):
+        waiting = self._waiting.get(client)
+        return None if waiting is None else waiting[0]
+
+    def echo(self, key):
+        # a 2 byte packet was received
+        if key == self._unconfirmed:
+            self._unconfirmed = None
+            self._last_echo = self._clock()
+            self._owner_until = self._last_echo + self.HOLD
+
+    def abort(self):
+        # the transmitter gave up on a key and dropped the rest of the command
+        self._unconfirmed = None
+        self._owner_until = 0
+
+    def remove(self, client):
+        self._waiting.pop(client, None)
+        if client is self.owner:
+            # keys already queued are still sent, the next client waits for them
+            self._owner_until = 0
+
+    def check(self):
+        # release the queue when the owner is done, returns True as long as it has to be checked again
+        if self.owner is not None:
+            if (self._clock() < self._owner_until or self._transmitter.pending is not None
+                    or not self._cmd_q.empty()):
+                return True
+            self.owner = None
+            self._unconfirmed = None
+        now = self._clock()
+        while self._waiting:
+            client = next(iter(self._waiting))
+            key, since = self._waiting.pop(client)
+            # the time a key waits for the keys of the owner does not count
+            if now - max(since, self._last_echo) > self.key_wait:
+                self.dropped += 1
+                _LOGGER.warning('Key %s of client %s waited too long for another client, dropped', key, client)
+                continue
+            self.submit(client, key)
+            return True
+        return False
+
+    def get_stats(self):
+        return {
+            'forwarded': self.forwarded,
+            'deferred': self.deferred,
+            'dropped': self.dropped,
+            'duplicates': self.duplicates,
+        }
+
+
+class JA80MuxClient(asyncio.Protocol):
+    """One client of the Unix socket, the bytes it writes are keys for the panel."""
+
+    def __init__(self, mux, client_id):
+        self._mux = mux
+        self.client_id = client_id
+        self.transport = None
+
+    def __repr__(self):
+        return '#%s' % self.client_id
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._mux.add_client(self)
+
+    def data_received(self, data):
+        for key in data:
+            self._mux.submit(self, bytes((key, )))
+
+    def connection_lost(self, exc):
+        self._mux.remove_client(self)
+
+
+class JA80Multiplexer():
+    """Read the JA-80T once and pass each complete packet to all clients, keys of the clients go through the arbiter.
+
+    The packets of one read are joined into one buffer that is written to every client, the data is framed once
+    here and not per client.
+    """
+
+    CHECK_INTERVAL = 0.1  # seconds between checks of the arbiter while keys are pending
+
+    def __init__(self, loop, connection, path, socket_mode=int(DEFAULT_SOCKET_MODE, 8)):
+        self.loop = loop
+        self.connection = connection
+        self.path = path
+        self.socket_mode = socket_mode
+        self.arbiter = JA80KeyArbiter(connection.cmd_q, connection.transmitter)
+        connection.transmitter.on_abort = lambda key: self.arbiter.abort()
+        self.clients = set()
+        self._server = None
+        self._batch = []
+        self._check_handle = None
+        self._next_id = 0
+        self.broadcasts = self.slow_clients = 0
+
+    async def start(self):
+        remove_stale_socket(self.path)
+        self._server = await self.loop.create_unix_server(self._create_client, self.path)
+        os.chmod(self.path, self.socket_mode)
+        _LOGGER.info('Sharing JA-80T %s at %s', self.connection.device, self.path)
+
+    async def stop(self):
+        if self._check_handle is not None:
+            self._check_handle.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for client in list(self.clients):
+            client.transport.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _create_client(self):
+        self._next_id += 1
+        return JA80MuxClient(self, self._next_id)
+
+    def add_client(self, client):
+        self.clients.add(client)
+        _LOGGER.info('Client %s connected, %s clients', client, len(self.clients))
+
+    def remove_client(self, client):
+        self.clients.discard(client)
+        self.arbiter.remove(client)
+        _LOGGER.info('Client %s disconnected, %s clients', client, len(self.clients))
+
+    def submit(self, client, key):
+        self.arbiter.submit(client, key)
+        self._schedule_check()
+
+    def _schedule_check(self):
+        if self._check_handle is None:
+            self._check_handle = self.loop.call_later(self.CHECK_INTERVAL, self._check)
+
+    def _check(self):
+        self._check_handle = None
+        if self.arbiter.check():
+            self._schedule_check()
+
+    def on_packet(self, packet):
+        # called for each packet of a read, they are sent together once the read is done
+        if len(packet) == 2:
+            self.arbiter.echo(packet[:1])
+        if not self._batch:
+            self.loop.call_soon(self._flush)
+        self._batch.append(packet)
+
+    def on_signal(self, signal):
+        # the clients notice the missing data themselves
+        if not signal:
+            _LOGGER.warning('No data from JA-80T %s', self.connection.device)
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        data = b''.join(batch)
+        echoes = {packet[0] for packet in batch if len(packet) == 2}
+        self.broadcasts += 1
+        for client in list(self.clients):
+            transport = client.transport
+            if transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                _LOGGER.warning('Client %s does not keep up, disconnected', client)
+                self.slow_clients += 1
+                transport.abort()
+                continue
+            key = self.arbiter.waiting_key(client) if echoes else None
+            if key is not None and key[0] in echoes:
+                # the echo of another client's key would confirm the key this client is waiting to send
+                transport.write(b''.join(
+                    packet for packet in batch if len(packet) != 2 or packet[0] != key[0]))
+            else:
+                transport.write(data)
+
+    def get_stats(self):
+        return dict(self.arbiter.get_stats(), clients=len(self.clients), broadcasts=self.broadcasts,
+                    slow_clients=self.slow_clients)
+
+
+def remove_stale_socket(path):
+    # the socket of a multiplexer that did not stop cleanly is left behind, refuse to take over a running one
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise ValueError('Not a socket', path)
+    except FileNotFoundError:
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    finally:
+        sock.close()
+    raise ValueError('Another multiplexer is running at', path)
+
+
+async def run(args, stop):
+    loop = asyncio.get_running_loop()
+    connection = JA80TConnection(args.device, JA80CommandQueue(), wire_trace=args.wire_trace,
+                                 key_retries=args.key_retries)
+    mux = JA80Multiplexer(loop, connection, args.socket, int(args.socket_mode, 8))
+    await mux.start()
+    supervisor = JA80TSupervisor(connection, stop)
+    task = loop.create_task(supervisor.async_run(loop, mux.on_packet, mux.on_signal))
+
+    stopped = asyncio.Event()
+
+    def on_stop():
+        stop.set()
+        stopped.set()
+
+    loop.add_signal_handler(signal.SIGTERM, on_stop)
+    loop.add_signal_handler(signal.SIGINT, on_stop)
+    try:
+        await stopped.wait()
+    finally:
+        await connection.async_disconnect()
+        task.cancel()
+        await mux.stop()
+        _LOGGER.info('Stopped %s', mux.get_stats())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Share a JA-80T with several local clients')
+    parser.add_argument('--device', required=True, help='serial port or tcp://, rfc2217://, replay://, mock:// url')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='path of the Unix socket for the clients')
+    parser.add_argument('--socket-mode', default=DEFAULT_SOCKET_MODE, help='permissions of the socket, octal')
+    parser.add_argument('--wire-trace', action='store_true', help='log all data sent and received')
+    parser.add_argument('--key-retries', type=int, default=0, help='times a key that is not echoed is sent again')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG, INFO, WARNING or ERROR')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    asyncio.run(run(args, threading.Event()))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,182 @@
+"""Reach a JA-80T that is shared over the network (ser2net raw TCP or RFC2217) or by the local multiplexer (mux.py)
+instead of a local serial port."""
+import logging
+import select
+import socket
+from urllib.parse import urlsplit
+
+_LOGGER = logging.getLogger(__name__)
+
+NETWORK_SCHEMES = ('tcp', 'rfc2217')
+UNIX_SCHEME = 'unix'
+
+# a dead link is noticed after KEEPALIVE_IDLE + KEEPALIVE_INTERVAL * KEEPALIVE_COUNT seconds without any reply
+KEEPALIVE_IDLE = 10
+KEEPALIVE_INTERVAL = 5
+KEEPALIVE_COUNT = 3
+
+
+def is_network_device(device):
+    return urlsplit(device).scheme in NETWORK_SCHEMES
+
+
+def is_unix_device(device):
+    return urlsplit(device).scheme == UNIX_SCHEME
+
+
+def parse_unix_device(device):
+    # unix://<path of the socket>, e.g. unix:///run/ja80.sock
+    url = urlsplit(device)
+    if url.scheme != UNIX_SCHEME or not url.path:
+        raise ValueError('Invalid unix device, expected unix://<path>', device)
+    return url.path
+
+
+def parse_network_device(device):
+    # tcp://<host>:<port> or rfc2217://<host>:<port>
+    url = urlsplit(device)
+    if url.scheme not in NETWORK_SCHEMES or not url.hostname or url.port is None:
+        raise ValueError('Invalid network device, expected tcp://<host>:<port> or rfc2217://<host>:<port>', device)
+    return url.scheme, url.hostname, url.port
+
+
+def configure_socket(sock):
+    # keys are single bytes, send them right away instead of waiting for Nagle to coalesce them
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # the keepalive timing options are not available on all platforms
+    for option, value in (('TCP_KEEPIDLE', KEEPALIVE_IDLE), ('TCP_KEEPINTVL', KEEPALIVE_INTERVAL),
+                          ('TCP_KEEPCNT', KEEPALIVE_COUNT)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+class JA80SocketTransport():
+    """Serial like transport over a raw TCP connection, e.g. a ser2net port in raw mode."""
+
+    RECV_SIZE = 4096
+
+    def __init__(self, host, port, timeout=1.0, connect_timeout=5.0):
+        _LOGGER.info('Connecting to JA-80T at %s:%s', host, port)
+        self.address = '%s:%s' % (host, port)
+        sock = socket.create_connection((host, port), timeout=connect_timeout)
+        configure_socket(sock)
+        self._open(sock, timeout)
+
+    def _open(self, sock, timeout):
+        self.timeout = timeout  # 0 for non blocking reads
+        self._sock = sock
+        self._sock.setblocking(False)
+        # cancel_read wakes up a read waiting for data
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._buffer = bytearray()
+        self.is_open = True
+
+    def _recv(self):
+        # move everything the socket has received to the read buffer
+        while True:
+            try:
+                data = self._sock.recv(self.RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            if not data:
+                raise ConnectionError('Connection closed by %s' % self.address)
+            self._buffer += data
+            if len(data) < self.RECV_SIZE:
+                return
+
+    @property
+    def in_waiting(self):
+        self._recv()
+        return len(self._buffer)
+
+    def read(self, size=1):
+        if not self._buffer:
+            self._recv()
+        if not self._buffer and self.timeout != 0:
+            # wait for data like a serial read, up to the timeout
+            readable, _, _ = select.select([self._sock, self._wake_r], [], [], self.timeout)
+            if self._wake_r in readable:
+                try:
+                    self._wake_r.recv(64)
+                except BlockingIOError:
+                    pass
+            if self._sock in readable:
+                self._recv()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def write(self, data):
+        # the socket is non blocking, wait for room in the send buffer (keys are tiny, this hardly ever waits)
+        view = memoryview(data)
+        while view:
+            try:
+                sent = self._sock.send(view)
+            except (BlockingIOError, InterruptedError):
+                select.select([], [self._sock], [], self.timeout or None)
+                continue
+            view = view[sent:]
+        return len(data)
+
+    def cancel_read(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self._sock.close()
+            self._wake_r.close()
+            self._wake_w.close()
+
+
+class JA80UnixSocketTransport(JA80SocketTransport):
+    """Serial like transport over the Unix socket of a JA80Multiplexer, the port is shared with its other clients."""
+
+    def __init__(self, path, timeout=1.0, connect_timeout=5.0):
+        _LOGGER.info('Connecting to JA-80T multiplexer at %s', path)
+        self.address = path
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(connect_timeout)
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            raise
+        self._open(sock, timeout)
+
+
+def open_rfc2217(device, timeout=1.0):
+    # RFC2217 (ser2net telnet mode) also passes the serial port settings to the remote end
+    import serial
+    connection = serial.serial_for_url(
+        device,
+        baudrate=9600,
+        parity=serial.PARITY_NONE,
+        bytesize=serial.EIGHTBITS,
+        timeout=timeout)
+    # pyserial already disables Nagle on its socket, keepalive has to be enabled here
+    sock = getattr(connection, '_socket', None)
+    if sock is not None:
+        configure_socket(sock)
+    return connection
+
+
+def open_network_device(device, timeout=1.0):
+    if is_unix_device(device):
+        return JA80UnixSocketTransport(parse_unix_device(device), timeout)
+    scheme, host, port = parse_network_device(device)
+    if scheme == 'rfc2217':
+        return open_rfc2217(device, timeout)
+    return JA80SocketTransport(host, port, timeout)
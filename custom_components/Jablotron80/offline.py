@@ -0,0 +1,279 @@
+"""Batch decoder for capture files, frames and decodes a whole capture at once with NumPy.
+
+Usage:
+    python -m custom_components.Jablotron80.offline <capture file> [--processes N] [--output summary.json]
+
+Needs NumPy (pip3 install numpy), which is not needed by the Home Assistant platform.
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from .adapter import hass_state
+from .capture import JA80CaptureReader
+from .protocol import (
+    ALARM_STATUS_NAMES, ALARM_STATUS_SCHEMA, ALARM_STATUS_STATES, ALARM_STATUS_TABLE, ALARM_TIMESTAMP_SCHEMA,
+    EVENT_TYPE_NAMES, LED_TABLE, MSG_DISPATCH, MSG_SCHEMAS, JA80Framer, JA80State)
+
+_LOGGER = logging.getLogger(__name__)
+
+END_OF_PACKET = JA80Framer.END_OF_PACKET
+MAX_PACKAGE_LENGTH = 15  # as JA80Framer, longer frames are dropped as overruns
+
+# records decoded per process, a chunk also reads this many records beyond its end to complete its last frame
+CHUNK_RECORDS = 1000000
+LOOKAHEAD_RECORDS = MAX_PACKAGE_LENGTH
+
+LED_NAMES = ('led_a', 'led_b', 'led_c', 'led_backlight', 'led_warning')
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('The offline decoder needs NumPy, install it with: pip3 install numpy') from None
+    return numpy
+
+
+def _tables(np):
+    # the decoder tables of ja80 as arrays, so they can be indexed with an array of bytes
+    schema_index = {id(schema): index for index, schema in enumerate(MSG_SCHEMAS)}
+    dispatch = np.array([-1 if schema is None else schema_index[id(schema)] for schema in MSG_DISPATCH], dtype=np.int16)
+    return {
+        'dispatch': dispatch,
+        'lengths': np.array([0 if schema is None else schema.length or 0 for schema in MSG_DISPATCH], dtype=np.int64),
+        'checksums': np.array([schema is not None and schema.checksum is not None for schema in MSG_DISPATCH]),
+        'alarm_status': np.array(ALARM_STATUS_TABLE, dtype=np.uint8),
+        'leds': np.array(LED_TABLE, dtype=bool),
+    }
+
+
+def _bcd(np, values):
+    # the panel sends the timestamp binary coded decimal, 0x23 = 23
+    return (values >> 4) * 10 + (values & 0x0f)
+
+
+def frame(np, buf, clean_start=True, stop=None, max_package_length=MAX_PACKAGE_LENGTH, tables=None):
+    """Start offset and length of the packets in buf as JA80Framer keeps them, and the framing counters.
+
+    clean_start: buf starts at the start of a frame, otherwise everything up to the first 0xff is skipped.
+    stop: only frames starting before this offset.
+    Frames that are not a packet of the expected length are checked by JA80Framer.check, so corrupt packets are
+    dropped and recovered the same way. The packets and frames are the same as the streaming framer's. The counters of
+    dropped and recovered packets can differ slightly, as the streaming framer also trims its buffer when a read leaves
+    max_package_length bytes without 0xff, so its counters depend on how the data was read.
+    """
+    if tables is None:
+        tables = _tables(np)
+    ends = np.flatnonzero(buf == END_OF_PACKET)
+    starts = np.empty_like(ends)
+    if len(ends):
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+    if not clean_start:
+        starts, ends = starts[1:], ends[1:]
+    if stop is not None:
+        keep = starts < stop
+        starts, ends = starts[keep], ends[keep]
+    lengths = ends - starts + 1
+
+    # the fast path of JA80Framer.feed for all frames at once, the other frames are checked one by one
+    first = buf[starts]
+    expected = tables['lengths'][first]
+    fast = ((lengths <= max_package_length) & ((expected == 0) | (lengths == expected))
+            & ~tables['checksums'][first])
+    framer = JA80Framer(max_package_length)
+    keep = fast.copy()
+    for i in np.flatnonzero(~fast):
+        start, length = int(starts[i]), int(lengths[i])
+        packet = framer.check(buf[start:start + length].tobytes())
+        if packet is not None:
+            keep[i] = True
+            starts[i] += length - len(packet)
+            lengths[i] = len(packet)
+    stats = framer.get_stats()
+    stats['frames'] = len(starts)
+    del stats['corruption_rate']
+    return starts[keep], lengths[keep], stats
+
+
+def _status_dtype(np):
+    fields = [('time', 'f8'), ('offset', 'i8')]
+    fields += [(name, 'u1') for name in ALARM_STATUS_SCHEMA.field_names if name != 'msg_type']
+    fields += [('state', 'u1')] + [(name, '?') for name in LED_NAMES]
+    return np.dtype(fields)
+
+
+def _event_dtype(np):
+    fields = [('time', 'f8'), ('offset', 'i8')]
+    fields += [(name, 'u1') for name in ALARM_TIMESTAMP_SCHEMA.field_names]
+    return np.dtype(fields)
+
+
+def _decode_schema(np, buf, starts, times, schema, dtype):
+    records = np.zeros(len(starts), dtype=dtype)
+    records['time'] = times
+    records['offset'] = starts
+    for name in schema.field_names:
+        if name in dtype.names:
+            records[name] = buf[starts + schema.fields[name]]
+    return records
+
+
+def decode_buffer(np, buf, byte_times=None, clean_start=True, stop=None, tables=None):
+    """Frame and decode a byte stream.
+
+    byte_times: function returning the capture time of byte offsets, stop: only frames starting before this offset.
+    Returns a dict with the framing counters of JA80Framer, packet counts per message type and structured arrays of
+    status packets and events.
+    """
+    if tables is None:
+        tables = _tables(np)
+    starts, lengths, framing = frame(np, buf, clean_start, stop, tables=tables)
+
+    first = buf[starts]
+    types = tables['dispatch'][first]
+    counts = np.bincount(types + 1, minlength=len(MSG_SCHEMAS) + 1)
+
+    ends = starts + lengths - 1
+    times = byte_times(ends) if byte_times is not None else np.zeros(len(starts))
+
+    # packets of the wrong length are counted but not decoded, as JA80.read_state reports them as malformed
+    mask = (first == ALARM_STATUS_SCHEMA.msg_type) & (lengths == ALARM_STATUS_SCHEMA.length)
+    status = _decode_schema(np, buf, starts[mask], times[mask], ALARM_STATUS_SCHEMA, _status_dtype(np))
+    status['state'] = tables['alarm_status'][status['alarm_status']]
+    leds = tables['leds'][status['leds']]
+    for column, name in enumerate(LED_NAMES):
+        status[name] = leds[:, column]
+
+    mask = (first == ALARM_TIMESTAMP_SCHEMA.msg_type) & (lengths == ALARM_TIMESTAMP_SCHEMA.length)
+    events = _decode_schema(np, buf, starts[mask], times[mask], ALARM_TIMESTAMP_SCHEMA, _event_dtype(np))
+    for name in ('day', 'month', 'hour', 'minute'):
+        events[name] = _bcd(np, events[name])
+
+    return {
+        'framing': framing,
+        'counts': counts,  # index 0: unknown, then per MSG_SCHEMAS entry
+        'status': status,
+        'events': events,
+    }
+
+
+def _decode_records(path, positions, lengths, times, previous_byte, stop_record):
+    # decode the records of a capture, records from stop_record on are only read to complete the last frame
+    # previous_byte: file position of the byte before the first record, None at the start of the capture
+    np = _numpy()
+    positions = np.asarray(positions, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    times = np.asarray(times, dtype=np.float64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            # the chunk starts at the start of a frame when the data before it ends with a 0xff
+            clean_start = previous_byte is None or data[previous_byte] == END_OF_PACKET
+            # gather the data of all records into one stream, without a Python loop over the records
+            index = np.arange(offsets[-1], dtype=np.int64) + np.repeat(positions - offsets[:-1], lengths)
+            buf = data[index]
+            del data
+
+    def byte_times(byte_offsets):
+        return times[np.searchsorted(offsets, byte_offsets, side='right') - 1]
+
+    return decode_buffer(np, buf, byte_times, clean_start, stop=offsets[stop_record])
+
+
+def _merge(np, results):
+    return {
+        'framing': {name: sum(result['framing'][name] for result in results) for name in results[0]['framing']},
+        'counts': sum(result['counts'] for result in results),
+        'status': np.concatenate([result['status'] for result in results]),
+        'events': np.concatenate([result['events'] for result in results]),
+    }
+
+
+def decode_capture(path, processes=1, chunk_records=CHUNK_RECORDS):
+    """Decode a capture file, in chunks of chunk_records records over processes processes (None: one per CPU)."""
+    np = _numpy()
+    reader = JA80CaptureReader(path)
+    try:
+        positions, lengths, times = reader.index()
+    finally:
+        reader.close()
+
+    chunks = []
+    for start in range(0, len(positions), chunk_records):
+        end = min(start + chunk_records + LOOKAHEAD_RECORDS, len(positions))
+        previous_byte = None if start == 0 else positions[start - 1] + lengths[start - 1] - 1
+        stop_record = min(chunk_records, end - start)
+        chunks.append((path, positions[start:end], lengths[start:end], times[start:end], previous_byte, stop_record))
+    if not chunks:
+        chunks.append((path, [], [], [], None, 0))
+
+    if processes == 1 or len(chunks) == 1:
+        results = [_decode_records(*chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_decode_records, *zip(*chunks)))
+    return _merge(np, results)
+
+
+def summarize(result):
+    """Summary report of a decoded capture, with plain Python types so it can be written as JSON."""
+    np = _numpy()
+    status = result['status']
+    events = result['events']
+
+    packets = {'unknown': int(result['counts'][0])}
+    for schema, count in zip(MSG_SCHEMAS, result['counts'][1:]):
+        packets[schema.name] = int(count)
+
+    # state changes in the status packets, as seen by Home Assistant
+    changes = np.flatnonzero(status['state'][1:] != status['state'][:-1]) + 1
+    if len(status):
+        changes = np.concatenate(([0], changes))
+    transitions = [{
+        'time': round(float(status['time'][i]), 3),
+        'state': ALARM_STATUS_NAMES.get(int(status['state'][i]), 'Armed'),
+        'hass_state': hass_state(ALARM_STATUS_STATES.get(int(status['state'][i]), JA80State.UNKNOWN)),
+    } for i in changes]
+
+    event_types = np.bincount(events['event_type'], minlength=256)
+    sources = np.bincount(events['event_source'], minlength=256)
+    return {
+        'framing': {name: int(value) for name, value in result['framing'].items()},
+        'packets': packets,
+        'duration': round(float(status['time'][-1] - status['time'][0]), 3) if len(status) else 0,
+        'state_changes': transitions,
+        'events': {EVENT_TYPE_NAMES[event_type] + ' (%d)' % event_type: int(event_types[event_type])
+                   for event_type in np.flatnonzero(event_types)},
+        'events_by_source': {int(source): int(sources[source]) for source in np.flatnonzero(sources)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Decode a JA-80T capture file')
+    parser.add_argument('capture', help='capture file, as recorded with capture_file')
+    parser.add_argument('--processes', type=int, default=1, help='decode in this many processes, 0 for one per CPU')
+    parser.add_argument('--chunk-records', type=int, default=CHUNK_RECORDS, help='capture records per process')
+    parser.add_argument('--output', help='write the summary to this file')
+    args = parser.parse_args(argv)
+
+    result = decode_capture(args.capture, args.processes or os.cpu_count(), args.chunk_records)
+    output = json.dumps(summarize(result), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
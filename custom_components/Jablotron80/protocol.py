@@ -0,0 +1,633 @@
+"""The JA-80T packet format: framing, decoding and encoding of keys.
+
+Only needs the standard library, so it can be used without Home Assistant or pyserial, e.g. by tools and daemons.
+Decoded states are JA80State values, adapter.py maps them to Home Assistant states.
+"""
+import logging
+import struct
+from enum import IntEnum
+
+from .const import JABLOTRON_KEY_MAP
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HexDump():
+    """Bytes formatted as hex, only when the log message is actually emitted."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return " ".join(["%02x" % c for c in self.data])
+
+
+class JA80State(IntEnum):
+    """State decoded from a packet, adapter.py maps it to a Home Assistant state."""
+
+    UNKNOWN = 0
+    DISARMED = 1
+    ARMED = 2  # the panel does not tell the armed mode
+    EXIT_DELAY = 3
+    ENTRY_DELAY = 4
+    TRIGGERED = 5
+    ARMING = 6  # arming requested with a keyfob or the keypad
+    DISARMING = 7
+    TAMPER_TRIGGERED = 8
+    TAMPER_SENSORS_OK = 9
+    CANCEL_ALARM = 10
+
+
+class JA80AlarmStatus:
+    msg_raw = msg_type = alarm_status = message_id = device_id = None
+    unknown_val = None 
+    device_name = device_type = ''
+    alarm_state = None
+    led_a = led_b = led_c = led_backlight = led_warning = False
+
+    ALARM_STATE_DISARMED = 0x00
+    ALARM_STATE_ARMED = 0x02
+    ALARM_STATE_ALARM = 0x04
+    ALARM_STATE_ENTRY_DELAY = 0x08
+    ALARM_STATE_EXIT_DELAY = 0x10
+
+    def __init__(self, msg):
+        self.parse_msg(msg)
+
+    def parse_msg(self, msg):
+
+        if len(msg) != ALARM_STATUS_SCHEMA.length:
+            raise ValueError('Invalid msg len', len(msg), '(expect %s)' % ALARM_STATUS_SCHEMA.length)
+        self.msg_raw = msg
+
+        '''
+        format:
+        byte
+         0 = msg type 0xed
+         1 = alarm_status
+         2 = msg_id
+         3 = device_id
+         4 = leds
+         5-7 = unknown (display content, signal strength, zone)
+         8 = checksum
+         9 = 0xFF end of message
+        '''
+        (self.msg_type, alarm_status, self.message_id, device_id, leds,
+         self.unknown_val,  # still need to figure out what this is / might be some device message/ motion/tamper
+         self.checksum) = ALARM_STATUS_SCHEMA.unpack(msg)
+        self.set_alarm_status(alarm_status)
+        self.set_device(device_id)  # translate id to device type and name
+        self.set_leds(leds)
+
+    def set_alarm_status(self, alarm_status):
+
+        self.raw_status = alarm_status
+        self.alarm_status = ALARM_STATUS_TABLE[alarm_status]
+
+    def get_alarm_status_name(self, alarm_status=None):
+
+        if alarm_status is None:
+            alarm_status = self.alarm_status
+
+        return ALARM_STATUS_NAMES.get(alarm_status, 'Armed')
+
+    def get_state(self, alarm_status=None):
+
+        if alarm_status is None:
+            alarm_status = self.alarm_status
+
+        return ALARM_STATUS_STATES.get(alarm_status, JA80State.UNKNOWN)
+
+    def set_leds(self, led_status):
+
+        #  led bits, see LED_TABLE
+        (self.led_a, self.led_b, self.led_c, self.led_backlight, self.led_warning) = LED_TABLE[led_status]
+
+    def set_device(self, device_id):
+        #  @TODO: mapping from id to device details
+        self.device_id = device_id
+        self.device_name = 'unknown'
+        self.device_type = 'unknown'
+
+    def __str__(self):
+
+        s = 'AlarmStatus: msg_type = ' + '0x{:02x}'.format(self.msg_type) + '\n'
+        s += f'    alarm_status = {self.get_alarm_status_name(self.alarm_status)} / ' + '0x{:02x}'.format(self.raw_status)
+        s += f'    message_id = {self.message_id}'
+        s += f'    device_id = {self.device_id}'
+        s += f'    unknown_val = ' + '0x{:02x}'.format(self.unknown_val) + '\n'
+        s += f'    leds: a={self.led_a}, b={self.led_b}, c={self.led_c}, backlight={self.led_backlight}, warning={self.led_warning}'
+        return s
+
+
+class JA80Framer():
+    """Split the raw byte stream from the JA-80T into packets ending with 0xff.
+
+    Packets of a type with a known length or checksum (see JA80MsgSchema) are checked here, a corrupt packet is
+    dropped before it is decoded. When a corrupt run ends with a valid status or event packet, e.g. after a lost 0xff
+    or garbage, that packet is kept. Packets of an unknown type are passed on as they are.
+    """
+
+    END_OF_PACKET = 0xff
+
+    def __init__(self, max_package_length=15, dispatch=None):
+        # longest packet seen is 10 bytes: ed 53 0c 00 3e 04 00 28 0b ff
+        self.max_package_length = max_package_length
+        if dispatch is None:
+            dispatch = MSG_DISPATCH
+        self._dispatch = dispatch
+        # expected length (0: not checked) and checksum function per first byte
+        self._lengths = tuple(0 if schema is None else schema.length or 0 for schema in dispatch)
+        self._checksums = tuple(None if schema is None else schema.checksum for schema in dispatch)
+        # length of the packets that may be recovered from the end of a corrupt run, 0 for the other types
+        self._resync_lengths = tuple(schema.length if schema is not None and schema.resync else 0 for schema in dispatch)
+        self.frames = 0  # packets ending with 0xff, including the dropped ones
+        self.overruns = 0
+        self.bad_length = 0
+        self.bad_checksum = 0
+        self.resynced = 0  # valid packets kept from the end of a corrupt run
+        self._trimmed = 0  # overruns dropped from the buffer without an end of packet marker
+        self._overrun = False  # the buffer starts in the middle of an overrun that was trimmed
+        self._buffer = bytearray()
+
+    def reset(self):
+        self._buffer.clear()
+        self._overrun = False
+
+    @property
+    def partial(self):
+        # True while in the middle of a packet, keys are only sent in between packets
+        return bool(self._buffer)
+
+    @property
+    def corrupt(self):
+        return self.overruns + self.bad_length + self.bad_checksum
+
+    def feed(self, data):
+        # append received data and return all complete packets, a partial packet is kept for the next call
+        buf = self._buffer
+        buf += data
+        packets = []
+        lengths = self._lengths
+        checksums = self._checksums
+        max_package_length = self.max_package_length
+        overrun = self._overrun
+        frames = 0
+        start = 0
+        end = buf.find(self.END_OF_PACKET)
+        while end >= 0:
+            frames += 1
+            size = end + 1 - start
+            first = buf[start]
+            length = lengths[first]
+            if (size <= max_package_length and checksums[first] is None and (size == length or not length)
+                    and not overrun):
+                packets.append(bytes(buf[start:end + 1]))
+            else:
+                packet = self.check(bytes(buf[start:end + 1]), overrun)
+                if packet is not None:
+                    packets.append(packet)
+                overrun = False
+            start = end + 1
+            end = buf.find(self.END_OF_PACKET, start)
+
+        self.frames += frames
+        self._overrun = overrun
+        if start:
+            del buf[:start]
+        if len(buf) >= max_package_length:
+            # no end of packet marker within max package length, keep the packet that may be in progress at the end
+            self.overruns += 1
+            self._trimmed += 1
+            start = self._partial_start(buf)
+            # when no packet start is kept, the next frame is the end of this overrun
+            self._overrun = start == len(buf)
+            del buf[:start]
+        return packets
+
+    def _valid(self, packet):
+        # returns None for a valid packet, else the name of the counter to increase
+        if len(packet) > self.max_package_length:
+            return 'overruns'
+        first = packet[0]
+        if self._lengths[first] and len(packet) != self._lengths[first]:
+            return 'bad_length'
+        checksum = self._checksums[first]
+        if checksum is not None and len(packet) > 2 and checksum(packet[:-2]) != packet[-2]:
+            return 'bad_checksum'
+        return None
+
+    def check(self, packet, overrun=False):
+        # slow path for packets that need to be checked, returns the packet to keep or None, also used by offline.py
+        # overrun: packet is the end of an overrun trimmed from the buffer, it was counted then
+        error = self._valid(packet)
+        if overrun:
+            error = None
+        elif error is None:
+            # a valid packet, or a packet of an unknown type that is passed on to the decoder
+            return packet
+        # the longest valid status or event packet at the end, e.g. after a lost 0xff or garbage, key and beep packets
+        # are too short to tell them from the end of the garbage
+        lengths = self._resync_lengths
+        size = len(packet)
+        for start in range(max(0 if overrun else 1, size - self.max_package_length), size - 1):
+            if lengths[packet[start]] == size - start and self._valid(packet[start:]) is None:
+                if error is not None:
+                    setattr(self, error, getattr(self, error) + 1)
+                self.resynced += 1
+                return packet[start:]
+        if error is None:
+            _LOGGER.debug('Dropped the end of an overrun: %s', packet.hex(' '))
+            return None
+        setattr(self, error, getattr(self, error) + 1)
+        _LOGGER.debug('Dropped corrupt packet (%s): %s', error, packet.hex(' '))
+        return None
+
+    def _partial_start(self, buf):
+        # offset of the first status or event packet in the last max_package_length - 1 bytes that may still be
+        # completed, len(buf) when there is none, as in check a key or beep is not recovered from garbage
+        lengths = self._resync_lengths
+        size = len(buf)
+        for start in range(size - self.max_package_length + 1, size):
+            if size - start < lengths[buf[start]]:
+                return start
+        return size
+
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'overruns': self.overruns,
+            'bad_length': self.bad_length,
+            'bad_checksum': self.bad_checksum,
+            'resynced': self.resynced,
+            # an overrun trimmed from the buffer has no frame of its own
+            'corruption_rate': (round(self.corrupt / (self.frames + self._trimmed), 6)
+                                if self.frames + self._trimmed else None),
+        }
+
+
+class JA80AlarmTimestamp:
+    msg_raw = timestamp = event_type = event_source = None
+
+    EVENT_MOTION_ALARM = 0x01  # ?? seen when alarm is triggered via motion (but might be same for door)
+    EVENT_OTHER_ALARM2 = 0x02
+    EVENT_OTHER_ALARM3 = 0x03
+    EVENT_OTHER_ALARM4 = 0x04
+    EVENT_TAMPER_ALARM = 0x05
+    EVENT_ARMING = 0x08  # arming request
+    EVENT_DISARMING = 0x09 # disarming request
+    EVENT_ARMING_KEYPAD = 0x0c  ## ?? seen when armed via keypad (maybe in tamper state?)
+    EVENT_TAMPER_SENSORS_OK = 0x50
+    EVENT_CANCEL_ALARM = 0x4e  # ?? seen when system is disarmed when alarm is active
+
+    # these will triger prio 1 alerts (intrusion)
+    alarm_status = [EVENT_MOTION_ALARM, EVENT_OTHER_ALARM2, EVENT_OTHER_ALARM3, EVENT_OTHER_ALARM4]
+
+    '''
+    e3 02 01 23 36 08 09 3f ff
+    alarm time stamp event, here 02-01 23:36 (d-m h:i) event type 08 source 09                  
+                event type 08 = Setting 
+    53 S    arming          source 09 = keyfob (in my case)
+    '''
+    def __init__(self, msg):
+        self.parse_msg(msg)
+
+    def is_alarm(self):
+        return self.event_type in self.alarm_status
+
+    def parse_msg(self, msg):
+        if len(msg) != ALARM_TIMESTAMP_SCHEMA.length:
+            raise ValueError('Invalid msg len', len(msg), '(expect %s)' % ALARM_TIMESTAMP_SCHEMA.length)
+        self.msg_raw = msg
+        (day, month, hour, minute, self.event_type,
+         self.event_source,  # eg 49 for keypad, 9 = keyfob
+         self.checksum) = ALARM_TIMESTAMP_SCHEMA.unpack(msg)
+        # these are binary coded (16 hex = 16 dec) so print hex values
+        self.timestamp = '%02x/%02x %02x:%02x' % (day, month, hour, minute)
+        self.event_name = EVENT_TYPE_NAMES[self.event_type]
+
+    def get_event_type_name(self, event_type=None):
+
+        if event_type is None:
+            event_type = self.event_type
+
+        return EVENT_TYPE_NAMES[event_type]
+
+    def get_state(self, event_type=None):
+
+        if event_type is None:
+            event_type = self.event_type
+
+        return EVENT_TYPE_STATES[event_type]
+
+    def __str__(self):
+
+        s = 'AlarmTimestamp:\n'
+        s += f'    timestamp = {self.timestamp}\n'
+        s += f'    event_type = {self.event_name} ({self.event_type})\n'
+        s += f'    event_source = {self.event_source}'
+        return s
+
+
+class JA80MsgSchema():
+    """Declarative description of one packet type sent by the JA-80T."""
+
+    def __init__(self, msg_type, name, handler=None, length=None, mask=None, fields=None, cacheable=False,
+                 checksum=None, resync=False):
+        self.msg_type = msg_type  # first byte of the packet
+        self.name = name
+        self.handler = handler  # name of the JA80 method decoding this packet, None to only log its fields
+        self.length = length  # expected packet length including 0xff, None if not checked
+        self.mask = mask  # applied to the first byte when there is no exact match (e.g. 0x85 > 0x80)
+        self.fields = fields or {}  # field name: byte offset
+        self.cacheable = cacheable  # decoder has no side effects, result of an identical packet can be reused
+        # function returning the checksum byte (the byte before 0xff) of the packet bytes before it,
+        # None if the checksum is not known and not checked
+        self.checksum = checksum
+        # a valid packet of this type at the end of a corrupt run is kept, only for types long enough to not be
+        # mistaken for the end of garbage, needs length
+        self.resync = resync
+
+        # compile the fields into one struct, so all fields are read in a single call (in offset order)
+        self.field_names = tuple(sorted(self.fields, key=self.fields.get))
+        fmt = '>'
+        pos = 0
+        for field in self.field_names:
+            offset = self.fields[field]
+            if offset > pos:
+                fmt += '%dx' % (offset - pos)
+            fmt += 'B'
+            pos = offset + 1
+        self.struct = struct.Struct(fmt)
+
+    def unpack(self, msg):
+        return self.struct.unpack_from(msg)
+
+
+MSG_TYPE_KEYPRESS = 'KeyPress'
+MSG_TYPE_BEEP = 'Beep'
+MSG_TYPE_ALARM_STATUS = 'AlarmStatus'
+MSG_TYPE_ALARM_TIMESTAMP = 'AlarmTimestamp'
+MSG_TYPE_STATE_STATUS = 'StateStatus'
+
+ALARM_STATUS_SCHEMA = JA80MsgSchema(
+    0xed, MSG_TYPE_ALARM_STATUS, '_read_alarm_status', length=10,
+    fields={'msg_type': 0, 'alarm_status': 1, 'message_id': 2, 'device_id': 3, 'leds': 4, 'unknown_val': 7, 'checksum': 8},
+    cacheable=True, checksum=None, resync=True)  # checksum algorithm not known yet
+
+ALARM_TIMESTAMP_SCHEMA = JA80MsgSchema(
+    0xe3, MSG_TYPE_ALARM_TIMESTAMP, '_read_alarm_timestamp', length=9,
+    fields={'day': 1, 'month': 2, 'hour': 3, 'minute': 4, 'event_type': 5, 'event_source': 6, 'checksum': 7},
+    checksum=None, resync=True)  # checksum algorithm not known yet
+
+# all known packet types, add new packet types here
+MSG_SCHEMAS = [
+    JA80MsgSchema(0x80, MSG_TYPE_KEYPRESS, '_read_keypress', mask=0xf0, length=2, fields={'key': 0}),
+    JA80MsgSchema(0xa0, MSG_TYPE_BEEP, '_read_beep', mask=0xf0, length=2, fields={'beep': 0}),
+    ALARM_STATUS_SCHEMA,
+    ALARM_TIMESTAMP_SCHEMA,
+    JA80MsgSchema(0xe8, MSG_TYPE_STATE_STATUS, '_read_state_status', length=4, fields={'state_1': 1, 'state_2': 2}),
+]
+
+
+def compile_msg_schemas(schemas):
+    # build a 256 entry table indexed on the first byte of a packet, exact matches take precedence over masked ones
+    exact = {schema.msg_type: schema for schema in schemas}
+    table = []
+    for first_byte in range(256):
+        schema = exact.get(first_byte)
+        if schema is None:
+            for masked in schemas:
+                if masked.mask is not None and (first_byte & masked.mask) == masked.msg_type:
+                    schema = masked
+                    break
+        table.append(schema)
+    return tuple(table)
+
+
+MSG_DISPATCH = compile_msg_schemas(MSG_SCHEMAS)
+
+
+def _alarm_status(raw_status):
+    if (raw_status & 0x1f) == JA80AlarmStatus.ALARM_STATE_DISARMED:
+        return JA80AlarmStatus.ALARM_STATE_DISARMED
+    elif (raw_status & 0x04) == JA80AlarmStatus.ALARM_STATE_ALARM:
+        return JA80AlarmStatus.ALARM_STATE_ALARM
+    elif (raw_status & 0x08) == JA80AlarmStatus.ALARM_STATE_ENTRY_DELAY:
+        return JA80AlarmStatus.ALARM_STATE_ENTRY_DELAY
+    elif (raw_status & 0x10) == JA80AlarmStatus.ALARM_STATE_EXIT_DELAY:
+        return JA80AlarmStatus.ALARM_STATE_EXIT_DELAY
+    return JA80AlarmStatus.ALARM_STATE_ARMED
+
+
+# raw status byte > alarm status
+ALARM_STATUS_TABLE = tuple(_alarm_status(raw_status) for raw_status in range(256))
+
+ALARM_STATUS_NAMES = {
+    JA80AlarmStatus.ALARM_STATE_DISARMED: 'Disarmed',
+    JA80AlarmStatus.ALARM_STATE_ALARM: 'Alarm',
+    JA80AlarmStatus.ALARM_STATE_ENTRY_DELAY: 'Entry delay',
+    JA80AlarmStatus.ALARM_STATE_EXIT_DELAY: 'Exit delay',
+    JA80AlarmStatus.ALARM_STATE_ARMED: 'Armed',
+}
+
+ALARM_STATUS_STATES = {
+    JA80AlarmStatus.ALARM_STATE_DISARMED: JA80State.DISARMED,
+    JA80AlarmStatus.ALARM_STATE_ALARM: JA80State.TRIGGERED,
+    JA80AlarmStatus.ALARM_STATE_ENTRY_DELAY: JA80State.ENTRY_DELAY,
+    JA80AlarmStatus.ALARM_STATE_EXIT_DELAY: JA80State.EXIT_DELAY,
+    JA80AlarmStatus.ALARM_STATE_ARMED: JA80State.ARMED,
+}
+
+# led byte > (a, b, c, backlight, warning)
+LED_TABLE = tuple(
+    ((leds & 0x08) == 0x08, (leds & 0x04) == 0x04, (leds & 0x02) == 0x02, (leds & 0x01) == 0x01, (leds & 0x10) == 0x10)
+    for leds in range(256))
+
+# event type: (name, state)
+EVENT_TYPES = {
+    JA80AlarmTimestamp.EVENT_MOTION_ALARM: ('Motion alarm', JA80State.TRIGGERED),
+    JA80AlarmTimestamp.EVENT_OTHER_ALARM2: ('Other alarm', JA80State.TRIGGERED),
+    JA80AlarmTimestamp.EVENT_OTHER_ALARM3: ('Other alarm', JA80State.TRIGGERED),
+    JA80AlarmTimestamp.EVENT_OTHER_ALARM4: ('Other alarm', JA80State.TRIGGERED),
+    JA80AlarmTimestamp.EVENT_TAMPER_ALARM: ('Tamper alarm', JA80State.TAMPER_TRIGGERED),
+    JA80AlarmTimestamp.EVENT_ARMING: ('Arming via keyfob', JA80State.ARMING),
+    JA80AlarmTimestamp.EVENT_ARMING_KEYPAD: ('Arming via keypad', JA80State.ARMING),
+    JA80AlarmTimestamp.EVENT_DISARMING: ('Disarming', JA80State.DISARMING),
+    JA80AlarmTimestamp.EVENT_TAMPER_SENSORS_OK: ('All tamper sensors ok', JA80State.TAMPER_SENSORS_OK),
+    JA80AlarmTimestamp.EVENT_CANCEL_ALARM: ('Cancel alarm', JA80State.CANCEL_ALARM),
+}
+
+EVENT_TYPE_NAMES = tuple(EVENT_TYPES.get(event_type, ('Unknown alarm event', None))[0] for event_type in range(256))
+EVENT_TYPE_STATES = tuple(EVENT_TYPES.get(event_type, (None, JA80State.UNKNOWN))[1] for event_type in range(256))
+
+
+class JA80(object):
+
+    current_alarm_status = None
+    sensor_id = None
+    last_event = None  # last JA80AlarmTimestamp decoded
+    cache_hits = cache_misses = 0
+    # last_tamper_event = 
+    # tamper_event_count_since_last
+
+    MSG_TYPE_KEYPRESS = MSG_TYPE_KEYPRESS
+    MSG_TYPE_BEEP = MSG_TYPE_BEEP
+    MSG_TYPE_ALARM_STATUS = MSG_TYPE_ALARM_STATUS
+    MSG_TYPE_ALARM_TIMESTAMP = MSG_TYPE_ALARM_TIMESTAMP
+    MSG_TYPE_STATE_STATUS = MSG_TYPE_STATE_STATUS
+
+    CMD_DISARM_SYSTEM = 1
+    CMD_LONG_BEEP = 2
+    CMD_SHORT_BEEP = 3
+    CMD_ARM_SYSTEM = 4
+    #CMD_CANCEL_ALARM = 5
+
+    msg_types = {schema.msg_type: schema.name for schema in MSG_SCHEMAS}
+
+    keypress_options = {
+         0x0: {'val': '0', 'desc': 'Key 0 pressed on keypad'}
+        ,0x1: {'val': '1', 'desc': 'Key 1 (^) pressed on keypad'}
+        ,0x2: {'val': '2', 'desc': 'Key 2 pressed on keypad'}
+        ,0x3: {'val': '3', 'desc': 'Key 3 pressed on keypad'}
+        ,0x4: {'val': '4', 'desc': 'Key 4 (<) pressed on keypad'}
+        ,0x5: {'val': '5', 'desc': 'Key 5 pressed on keypad'}
+        ,0x6: {'val': '6', 'desc': 'Key 6 (>) pressed on keypad'}
+        ,0x7: {'val': '7', 'desc': 'Key 7 (v) pressed on keypad'}
+        ,0x8: {'val': '8', 'desc': 'Key 8 pressed on keypad'}
+        ,0x9: {'val': '9', 'desc': 'Key 9 pressed on keypad'}
+        #,0xa: {'val': 'A', 'desc': 'Key A pressed on keypad'} A, B, ABC keys appear to be shortcuts for *1, *2, *3
+        #,0xb: {'val': 'B', 'desc': 'Key B pressed on keypad'}
+        #,0xc: {'val': 'C', 'desc': 'Key ABC pressed on keypad'}
+        #,0xd: {'val': '?', 'desc': 'Key ? pressed on keypad'} ? will just send # (8E)
+        ,0xe: {'val': '#', 'desc': 'Key # (ESC/OFF) pressed on keypad'}
+        ,0xf: {'val': '*', 'desc': 'Key * (ON) pressed on keypad'}
+    }
+
+    beep_options = {
+         0x0: {'val': '1s', 'desc': '1 subtle (short) beep triggered'}
+        ,0x1: {'val': '1l', 'desc': '1 loud (long) beep triggered'}
+        ,0x2: {'val': '2l', 'desc': '2 loud (long) beeps triggered'}
+        ,0x3: {'val': '3l', 'desc': '3 loud (long) beeps triggered'}
+        ,0x4: {'val': '4s', 'desc': '4 subtle (short) beeps triggered'}  # happens when warning appears on keypad (e.g. after alarm)
+        ,0x8: {'val': 'in', 'desc': 'Infinite beeping triggered'}
+        #  ,0x4: {'val': 'o4', 'desc': 'Other beep triggered (4)'}
+        #  ,0x5: {'val': 'o5', 'desc': 'Other beep triggered (5)'}
+        #  ,0x6: {'val': 'o6', 'desc': 'Other beep triggered (6)'}
+        #  ,0x7: {'val': 'o7', 'desc': 'Other beep triggered (7)'}
+        #  ,0x9: {'val': 'o9', 'desc': 'Other beep triggered (9)'}
+        #  ,0xa: {'val': 'oa', 'desc': 'Other beep triggered (10)'}
+    }
+
+    def __init__(self):
+        # bind the decoder of each packet type into a table indexed on the first byte of the packet
+        self._handlers = tuple(
+            None if schema is None else getattr(self, schema.handler or '_read_fields')
+            for schema in MSG_DISPATCH)
+        # last packet and decoded result per first byte, the panel keeps repeating the same status packet
+        self._cacheable = tuple(schema is not None and schema.cacheable for schema in MSG_DISPATCH)
+        self._cache = [None] * 256
+
+    def read_state(self, buf):
+
+        # parse data, based on message type (first byte)
+        try:
+            first_byte = buf[0]
+            handler = self._handlers[first_byte]
+        except Exception as ex:
+            _LOGGER.error('Error determining msg type from buffer: %s', ex)
+            return None
+
+        if self._cacheable[first_byte]:
+            cached = self._cache[first_byte]
+            if cached is not None and cached[0] == buf:
+                # byte identical repeat of the last packet of this type
+                self.cache_hits += 1
+                return cached[1]
+            self.cache_misses += 1
+
+        if handler is None:
+            # unknown type
+            if _LOGGER.isEnabledFor(logging.INFO):
+                _LOGGER.info('Unimplemented message type | %s', HexDump(buf))
+            return None
+
+        try:
+            state = handler(buf)
+        except Exception as ex:
+            _LOGGER.error('Exception in handling msg_type %s %s %s', MSG_DISPATCH[first_byte].name, ex, HexDump(buf))
+            return False
+
+        if self._cacheable[first_byte]:
+            self._cache[first_byte] = (bytes(buf), state)
+        return state
+
+    def get_cache_stats(self):
+        return {'hits': self.cache_hits, 'misses': self.cache_misses}
+
+    def clear_cache(self):
+        self._cache = [None] * 256
+
+    def _read_fields(self, buf):
+        # packet types without a dedicated decoder, only log their fields
+        if _LOGGER.isEnabledFor(logging.INFO):
+            schema = MSG_DISPATCH[buf[0]]
+            _LOGGER.info('%s: %s | %s', schema.name, dict(zip(schema.field_names, schema.unpack(buf))), HexDump(buf))
+        return None
+
+    def _read_keypress(self, buf):
+        # 0x0: {'val': '0', 'desc': 'Key 0 pressed on keypad'}
+        # unly use lower 4 bits
+        if _LOGGER.isEnabledFor(logging.INFO):
+            _LOGGER.info('KeyPress: %s | %s', self.keypress_options.get(buf[0] & 0x0f), HexDump(buf))
+        return None  # ignore this event
+
+    def _read_beep(self, buf):
+        # 0x1: {'val': '1l', 'desc': '1 loud (long) beep triggered'}
+        # unly use lower 4 bits
+        if _LOGGER.isEnabledFor(logging.INFO):
+            beep = self.beep_options.get(buf[0] & 0x0f)
+            beep_desc = 'unknown'
+            if beep:
+                beep_desc = beep['desc']
+            _LOGGER.info('Beep: %s | %s', beep_desc, HexDump(buf))
+        return None  # ignore this event
+
+    def _read_alarm_status(self, buf):
+        status = JA80AlarmStatus(buf)
+        self.current_alarm_status = status
+        if _LOGGER.isEnabledFor(logging.INFO):
+            _LOGGER.info('AlarmStatus: %s | %s', status, HexDump(buf))
+        return status.get_state()
+
+    def _read_alarm_timestamp(self, buf):
+        status = JA80AlarmTimestamp(buf)
+        if _LOGGER.isEnabledFor(logging.INFO):
+            _LOGGER.info('AlarmEvent: %s | %s', status, HexDump(buf))
+        self.sensor_id = status.event_source
+        self.last_event = status
+        # tamper alarms within the tamper threshold are cancelled by JablotronAlarm, see tamper.py
+        return status.get_state()
+
+    def _read_state_status(self, buf):
+        (state_1, state_2) = MSG_DISPATCH[buf[0]].unpack(buf)
+        if _LOGGER.isEnabledFor(logging.INFO):
+            _LOGGER.info('State status %02x %02x | %s', state_1, state_2, HexDump(buf))
+        return None
+
+
+def encode_keys(keys):
+    # keypad characters > key codes to send, one key per write
+    try:
+        return [JABLOTRON_KEY_MAP[key] for key in keys]
+    except KeyError as ex:
+        raise ValueError('Invalid key', ex.args[0]) from None
+
+
+def encode_command(action, code=None):
+    # key codes of an action (see ACTION_* in const.py), followed by the code if there is one
+    if code:
+        action += str(code)
+    return encode_keys(action)
@@ -0,0 +1,206 @@
+"""One I/O thread serving the connections of all configured JA-80 panels."""
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from .ja80 import JA80TSupervisor
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class JA80ReactorPanel():
+    """Per panel state of the reactor, each panel keeps its own connection, decoder callbacks and command queue."""
+
+    def __init__(self, connection, packet_callback, signal_callback):
+        self.connection = connection
+        self.packet_callback = packet_callback
+        self.signal_callback = signal_callback
+        # only the reconnect bookkeeping of the supervisor is used, the reactor drives the I/O
+        self.supervisor = JA80TSupervisor(connection, None)
+        self.retry_at = 0
+        self.fileno = None  # None when the transport can not be selected and is polled every tick
+        self.signal = True
+        self.removed = threading.Event()
+
+
+class JA80Reactor():
+    """Multiplex the transports of several panels with a selector in a single thread.
+
+    Serial ports and tcp:// sockets are watched by the selector, transports without a file descriptor (mocks,
+    replays and RFC2217) are polled every tick. Connecting is done on the reactor thread too, so a slow tcp://
+    connect delays the other panels for up to the connect timeout.
+    """
+
+    TICK = 0.1  # seconds between polls of transports without a file descriptor, key timeouts and reconnects
+
+    def __init__(self, tick=TICK):
+        self.tick = tick
+        self.stats = {'panels': 0, 'selects': 0, 'events': 0, 'polls': 0}
+        self._selector = None
+        self._panels = {}
+        self._ops = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake_r = self._wake_w = None
+
+    def add(self, connection, packet_callback, signal_callback):
+        # callbacks are called from the reactor thread
+        panel = JA80ReactorPanel(connection, packet_callback, signal_callback)
+        self._ops.put((self._add, panel))
+        self._start()
+        return panel
+
+    def remove(self, panel, timeout=5):
+        # disconnect the panel, the reactor thread ends when the last panel is removed
+        self._ops.put((self._remove, panel))
+        self.wake()
+        return panel.removed.wait(timeout)
+
+    def wake(self):
+        # interrupt the select, e.g. to handle an operation right away
+        with self._lock:
+            if self._wake_w is not None:
+                try:
+                    self._wake_w.send(b'\0')
+                except (BlockingIOError, OSError):
+                    pass
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._selector = selectors.DefaultSelector()
+                self._wake_r, self._wake_w = socket.socketpair()
+                self._wake_r.setblocking(False)
+                self._wake_w.setblocking(False)
+                self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+                self._thread = threading.Thread(target=self._run, name='JA80Reactor', daemon=True)
+                self._thread.start()
+            elif self._wake_w is not None:
+                self._wake_w.send(b'\0')
+
+    def _stop(self):
+        # called on the reactor thread, returns False when an operation came in and the reactor has to continue
+        with self._lock:
+            if not self._ops.empty():
+                return False
+            self._selector.close()
+            self._wake_r.close()
+            self._wake_w.close()
+            self._selector = self._wake_r = self._wake_w = None
+            self._thread = None
+            return True
+
+    def _run(self):
+        _LOGGER.info('JA80 reactor started')
+        while True:
+            while True:
+                try:
+                    op, panel = self._ops.get_nowait()
+                except queue.Empty:
+                    break
+                op(panel)
+            self.stats['panels'] = len(self._panels)
+            if not self._panels and self._stop():
+                break
+
+            self.stats['selects'] += 1
+            for key, _ in self._selector.select(self.tick):
+                if key.data is None:
+                    try:
+                        self._wake_r.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                self.stats['events'] += 1
+                self._read(key.data)
+
+            now = time.monotonic()
+            for panel in list(self._panels.values()):
+                if not panel.connection.is_connected():
+                    if now >= panel.retry_at:
+                        self._connect(panel, now)
+                elif panel.fileno is None:
+                    self.stats['polls'] += 1
+                    self._read(panel)
+                else:
+                    # no data since the last tick, check for keys to send or time out and for loss of signal
+                    self._read(panel)
+        _LOGGER.info('JA80 reactor stopped')
+
+    def _add(self, panel):
+        self._panels[id(panel)] = panel
+
+    def _remove(self, panel):
+        self._panels.pop(id(panel), None)
+        self._unregister(panel)
+        try:
+            panel.connection.disconnect()
+        except Exception as ex:
+            _LOGGER.debug('Error disconnecting from JA80: %s', ex)
+        panel.removed.set()
+
+    def _unregister(self, panel):
+        if panel.fileno is not None:
+            try:
+                self._selector.unregister(panel.fileno)
+            except (KeyError, ValueError):
+                pass
+            panel.fileno = None
+
+    def _connect(self, panel, now):
+        connection = panel.connection
+        if not connection.device_present():
+            panel.retry_at = now + JA80TSupervisor.DEVICE_POLL_INTERVAL
+            return
+        try:
+            connection.connect(timeout=0)
+        except Exception as ex:
+            panel.retry_at = now + panel.supervisor._failed(ex)
+            return
+        panel.supervisor._connected()
+        # a queued key interrupts the select, so it is sent right away
+        connection.set_waker(self.wake)
+        try:
+            panel.fileno = connection.connection.fileno()
+            self._selector.register(panel.fileno, selectors.EVENT_READ, panel)
+        except Exception:
+            panel.fileno = None
+
+    def _read(self, panel):
+        connection = panel.connection
+        try:
+            packets = connection.read_send_packets()
+        except Exception as ex:
+            _LOGGER.error('Connection to JA80 lost: %s', ex)
+            self._unregister(panel)
+            connection.close()
+            panel.retry_at = time.monotonic() + panel.supervisor._lost(ex)
+            self._signal(panel, False)
+            return
+
+        if packets is False:
+            self._signal(panel, False)
+            return
+        if not packets:
+            return
+
+        panel.signal = True
+        panel.supervisor._backoff = panel.supervisor.min_backoff
+        for packet in packets:
+            try:
+                panel.packet_callback(packet)
+            except Exception:
+                # a failing panel must not stop the other panels
+                _LOGGER.exception('Error handling JA80 packet')
+
+    def _signal(self, panel, signal):
+        if panel.signal == signal:
+            return
+        panel.signal = signal
+        try:
+            panel.signal_callback(signal)
+        except Exception:
+            _LOGGER.exception('Error handling JA80 signal')
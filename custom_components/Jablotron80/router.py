@@ -0,0 +1,74 @@
+"""Route decoded alarm events to per sensor entities, only the entities whose value changes are updated."""
+from .protocol import EVENT_TYPE_STATES, JA80State
+
+SENSOR_ALARM = 'alarm'  # the sensor triggered an alarm, until the alarm is cancelled or the panel is disarmed
+SENSOR_TAMPER = 'tamper'  # the tamper switch of the sensor was triggered, until the panel reports the sensors are ok
+SENSOR_KINDS = (SENSOR_ALARM, SENSOR_TAMPER)
+
+# event state > (kind, value) of the sensor that is the source of the event
+EVENT_ROUTES = {
+    JA80State.TRIGGERED: (SENSOR_ALARM, True),
+    JA80State.TAMPER_TRIGGERED: (SENSOR_TAMPER, True),
+    JA80State.TAMPER_SENSORS_OK: (SENSOR_TAMPER, False),
+}
+
+# states that reset all alarm sensors
+ALARM_RESET_STATES = (JA80State.DISARMED, JA80State.CANCEL_ALARM)
+
+
+class JA80SensorRouter():
+    """Sensor id to entity maps per kind, an event is routed to the one entity of its source.
+
+    route_event and route_state return the (entity, value) changes to apply, an entity is only in there when its
+    value changed. Both are called from the I/O thread, entities are added before or from the event loop.
+    """
+
+    def __init__(self):
+        self._entities = {kind: {} for kind in SENSOR_KINDS}  # kind: {sensor id: entity}
+        self._values = {}  # entity: value
+        self._on = {kind: set() for kind in SENSOR_KINDS}  # sensor ids with value True, to reset without a scan
+        # event type > (kind, value), None for events that do not change a sensor
+        self._routes = tuple(EVENT_ROUTES.get(state) for state in EVENT_TYPE_STATES)
+        self.routed = self.changed = 0
+
+    def add(self, kind, sensor_id, entity):
+        self._entities[kind][sensor_id] = entity
+        self._values[entity] = False
+
+    def entities(self):
+        return list(self._values)
+
+    def route_event(self, event):
+        # event: JA80AlarmTimestamp
+        self.routed += 1
+        changes = []
+        route = self._routes[event.event_type]
+        if route is not None:
+            self._set(route[0], event.event_source, route[1], changes)
+        if event.get_state() in ALARM_RESET_STATES:
+            self._reset(SENSOR_ALARM, changes)
+        return changes
+
+    def route_state(self, state):
+        # state decoded from a status packet
+        if state in ALARM_RESET_STATES and self._on[SENSOR_ALARM]:
+            changes = []
+            self._reset(SENSOR_ALARM, changes)
+            return changes
+        return None
+
+    def _set(self, kind, sensor_id, value, changes):
+        entity = self._entities[kind].get(sensor_id)
+        if entity is None or self._values[entity] == value:
+            return
+        self._values[entity] = value
+        if value:
+            self._on[kind].add(sensor_id)
+        else:
+            self._on[kind].discard(sensor_id)
+        changes.append((entity, value))
+        self.changed += 1
+
+    def _reset(self, kind, changes):
+        for sensor_id in list(self._on[kind]):
+            self._set(kind, sensor_id, False, changes)
@@ -0,0 +1,87 @@
+"""Decide whether a tamper alarm is a false alarm, based on the number of tamper events in a sliding time window."""
+import time
+
+DEFAULT_BUCKETS = 60  # resolution of the window, a window of 10 minutes expires events in steps of 10 seconds
+
+
+class JA80WindowCounter():
+    """Number of events in a sliding window, kept in fixed time buckets so expiring is O(buckets) at most."""
+
+    __slots__ = ('counts', 'total', 'current')
+
+    def __init__(self, buckets):
+        self.counts = [0] * buckets
+        self.total = 0
+        self.current = None  # number of the newest bucket
+
+    def _advance(self, bucket):
+        if self.current is None:
+            self.current = bucket
+            return
+        if bucket <= self.current:
+            return
+        size = len(self.counts)
+        if bucket - self.current >= size:
+            # the whole window expired
+            self.counts = [0] * size
+            self.total = 0
+        else:
+            for expired in range(self.current + 1, bucket + 1):
+                pos = expired % size
+                self.total -= self.counts[pos]
+                self.counts[pos] = 0
+        self.current = bucket
+
+    def add(self, bucket):
+        self._advance(bucket)
+        self.counts[bucket % len(self.counts)] += 1
+        self.total += 1
+
+    def count(self, bucket):
+        self._advance(bucket)
+        return self.total
+
+
+class JA80TamperFilter():
+    """Count tamper events per sensor over a window, a tamper alarm is cancelled while a single sensor stays within
+    the threshold. Another sensor reporting tamper in the same window means the alarm is not cancelled."""
+
+    def __init__(self, threshold, window, buckets=DEFAULT_BUCKETS):
+        self.threshold = threshold  # tamper events per sensor in the window that are ignored, 0 disables the filter
+        self.window = window  # seconds
+        self._buckets = buckets
+        self._width = window / buckets
+        self._total = JA80WindowCounter(buckets)
+        self._sensors = {}
+        self.suppressed = self.passed = 0
+
+    @property
+    def enabled(self):
+        return self.threshold > 0 and self.window > 0
+
+    def _bucket(self, now):
+        return int((time.monotonic() if now is None else now) / self._width)
+
+    def record(self, sensor_id, now=None):
+        # count a tamper event, returns True when the alarm it caused should be cancelled
+        if not self.enabled:
+            return False
+        bucket = self._bucket(now)
+        counter = self._sensors.get(sensor_id)
+        if counter is None:
+            counter = self._sensors[sensor_id] = JA80WindowCounter(self._buckets)
+        counter.add(bucket)
+        self._total.add(bucket)
+
+        sensor_count = counter.total
+        suppress = sensor_count <= self.threshold and self._total.total == sensor_count
+        if suppress:
+            self.suppressed += 1
+        else:
+            self.passed += 1
+        return suppress
+
+    def count(self, sensor_id=None, now=None):
+        # tamper events in the window, of one sensor or of all sensors
+        counter = self._total if sensor_id is None else self._sensors.get(sensor_id)
+        return 0 if counter is None else counter.count(self._bucket(now))
@@ -0,0 +1,142 @@
+"""MQTT publish batching and command parsing of the stand-alone bridge, with a recording client instead of a broker."""
+import json
+from types import SimpleNamespace
+
+from custom_components.Jablotron80.bridge import JA80Bridge, JA80MQTTPublisher
+from custom_components.Jablotron80.ja80 import JA80CommandQueue
+from custom_components.Jablotron80.protocol import encode_keys
+
+
+class RecordingClient():
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.messages.append((topic, payload, retain))
+
+
+def make_bridge(code=None, code_arm_required=False):
+    client = RecordingClient()
+    connection = SimpleNamespace(cmd_q=JA80CommandQueue())
+    bridge = JA80Bridge(connection, JA80MQTTPublisher(client), code=code, code_arm_required=code_arm_required)
+    return bridge, client
+
+
+def queued_keys(bridge):
+    keys = []
+    while not bridge.connection.cmd_q.empty():
+        keys.append(bridge.connection.cmd_q.get_nowait())
+    return keys
+
+
+def test_publisher_batches_and_deduplicates():
+    client = RecordingClient()
+    publisher = JA80MQTTPublisher(client)
+    publisher.publish('t/state', 'disarmed')
+    publisher.publish('t/state', 'arming')
+    publisher.publish_event('t/event', '1')
+    publisher.publish_event('t/event', '2')
+    assert client.messages == []
+
+    publisher.flush()
+    assert client.messages == [('t/state', 'arming', True), ('t/event', '1', False), ('t/event', '2', False)]
+
+    # unchanged, and flapped back within one batch
+    client.messages.clear()
+    publisher.publish('t/state', 'arming')
+    publisher.publish('t/state', 'armed_away')
+    publisher.publish('t/state', 'arming')
+    publisher.flush()
+    assert client.messages == []
+    assert publisher.deduplicated == 2
+
+
+def test_publisher_forget_publishes_again():
+    client = RecordingClient()
+    publisher = JA80MQTTPublisher(client)
+    publisher.publish('t/state', 'disarmed')
+    publisher.flush()
+    publisher.forget()
+    publisher.flush()
+    assert client.messages == [('t/state', 'disarmed', True)] * 2
+
+
+def test_command_disarm_uses_code():
+    bridge, _ = make_bridge(code='1234')
+    assert bridge.on_command(b'DISARM')
+    assert queued_keys(bridge) == encode_keys('#1234')
+
+    assert bridge.on_command(json.dumps({'action': 'disarm', 'code': '5678'}))
+    assert queued_keys(bridge) == encode_keys('#5678')
+
+
+def test_command_disarm_without_code():
+    bridge, _ = make_bridge()
+    assert bridge.on_command('DISARM')
+    assert queued_keys(bridge) == encode_keys('*0')
+
+
+def test_command_arm_without_code():
+    bridge, _ = make_bridge(code='1234')
+    assert bridge.on_command('ARM_AWAY')
+    assert queued_keys(bridge) == encode_keys('*1')
+
+    # the code of the MQTT panel is not sent unless the panel needs it to arm
+    assert bridge.on_command('{"action": "ARM_HOME", "code": "1234"}')
+    assert queued_keys(bridge) == encode_keys('*2')
+
+
+def test_command_arm_with_code():
+    bridge, _ = make_bridge(code='1234', code_arm_required=True)
+    assert bridge.on_command('ARM_AWAY')
+    assert queued_keys(bridge) == encode_keys('*11234')
+
+
+def test_invalid_commands():
+    bridge, _ = make_bridge()
+    assert not bridge.on_command('OPEN')
+    assert not bridge.on_command('{"action": ')
+    assert not bridge.on_command('{"action": "DISARM", "code": "12a4"}')
+    assert queued_keys(bridge) == []
+
+
+def test_triggered_by_is_cleared():
+    bridge, client = make_bridge()
+    for packet in ('ed 42 00 00 30 00 00 00 60 ff', 'e3 02 01 23 40 01 03 3f ff'):
+        bridge.on_packet(bytes.fromhex(packet))
+    bridge.publisher.flush()
+    assert ('jablotron80/triggered_by', '3', True) in client.messages
+
+    client.messages.clear()
+    bridge.on_packet(bytes.fromhex('ed 40 00 00 30 00 00 00 60 ff'))
+    bridge.publisher.flush()
+    assert ('jablotron80/triggered_by', '', True) in client.messages
+    assert ('jablotron80/state', 'disarmed', True) in client.messages
+
+
+def test_only_alarm_panel_states_are_published():
+    bridge, client = make_bridge()
+    for packet in ('ed 42 00 00 30 00 00 00 60 ff', 'e3 02 01 23 40 05 03 3f ff'):
+        bridge.on_packet(bytes.fromhex(packet))
+    bridge.publisher.flush()
+    # a tamper alarm is triggered, the cancel of the alarm is only an event
+    assert ('jablotron80/state', 'triggered', True) in client.messages
+    client.messages.clear()
+    bridge.on_packet(bytes.fromhex('e3 02 01 23 41 4e 49 3f ff'))
+    bridge.publisher.flush()
+    assert [topic for topic, _, _ in client.messages] == ['jablotron80/event']
+
+
+def test_sensor_is_reset_on_disarm():
+    bridge, client = make_bridge()
+    for packet in ('e3 02 01 23 40 01 03 3f ff', 'ed 40 00 00 30 00 00 00 60 ff'):
+        bridge.on_packet(bytes.fromhex(packet))
+        bridge.publisher.flush()
+    assert client.messages[-2:] == [('jablotron80/triggered_by', '', True), ('jablotron80/state', 'disarmed', True)]
+
+    # triggered again before the event of the new alarm, the sensor of the last alarm is not published
+    client.messages.clear()
+    bridge.on_packet(bytes.fromhex('ed 44 0c 00 3e 04 00 28 0b ff'))
+    bridge.publisher.flush()
+    assert client.messages == [('jablotron80/state', 'triggered', True)]
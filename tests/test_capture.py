@@ -0,0 +1,63 @@
+"""Replay of a capture file, at its end the replay waits like a serial port that gets no data and the quiet line is
+reported once."""
+import logging
+import threading
+import time
+
+from custom_components.Jablotron80.capture import CaptureReplay, JA80CaptureWriter
+from custom_components.Jablotron80.ja80 import JA80CommandQueue, JA80TConnection
+
+STATUS = bytes.fromhex('ed 40 00 00 30 00 00 00 60 ff')
+
+
+def write_capture(path, records):
+    writer = JA80CaptureWriter(str(path))
+    for data in records:
+        writer.write(data)
+    writer.close()
+    return str(path)
+
+
+def test_replay_waits_at_the_end(tmp_path):
+    replay = CaptureReplay(write_capture(tmp_path / 'ja80.cap', [STATUS, STATUS]), speed=0, timeout=0.2)
+    assert replay.read(100) == STATUS * 2
+
+    start = time.monotonic()
+    assert replay.read(100) == b''
+    assert time.monotonic() - start >= 0.15
+    replay.close()
+
+
+def test_replay_end_wait_is_cancelled(tmp_path):
+    replay = CaptureReplay(write_capture(tmp_path / 'ja80.cap', [STATUS]), speed=0, timeout=5)
+    assert replay.read(100) == STATUS
+
+    threading.Timer(0.05, replay.cancel_read).start()
+    start = time.monotonic()
+    assert replay.read(100) == b''
+    assert time.monotonic() - start < 2
+    replay.close()
+
+
+def test_replay_non_blocking(tmp_path):
+    replay = CaptureReplay(write_capture(tmp_path / 'ja80.cap', [STATUS]), speed=0, timeout=0)
+    assert replay.read(100) == STATUS
+    start = time.monotonic()
+    assert replay.read(100) == b''
+    assert time.monotonic() - start < 0.1
+    replay.close()
+
+
+def test_quiet_line_is_logged_once(tmp_path, caplog):
+    connection = JA80TConnection('replay://%s?speed=0' % write_capture(tmp_path / 'ja80.cap', [STATUS]),
+                                 JA80CommandQueue())
+    connection.NO_SIGNAL_TIMEOUT = 0.05
+    connection.connect(timeout=0.02)
+    try:
+        assert connection.read_send_packets() == [STATUS]
+        results = [connection.read_send_packets() for _ in range(10)]
+        assert results.count(False) >= 5
+        warnings = [record for record in caplog.records if record.levelno == logging.WARNING]
+        assert [record.getMessage() for record in warnings] == ['No data received for 0.05 seconds']
+    finally:
+        connection.disconnect()
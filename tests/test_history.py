@@ -0,0 +1,30 @@
+"""Ring buffer and indexes of the event history."""
+from custom_components.Jablotron80.history import JA80EventHistory, JA80RestoredEvent
+
+
+def make_history(capacity, count):
+    history = JA80EventHistory(capacity)
+    for seq in range(count):
+        history.append(JA80RestoredEvent('01/02 03:04', 0x01 if seq % 2 else 0x08, seq % 3), received=seq,
+                       monotonic=seq)
+    return history
+
+
+def test_last_newest_first():
+    history = make_history(10, 5)
+    assert [event.seq for event in history.last(3)] == [4, 3, 2]
+    assert [event.seq for event in history.last(source=1)] == [4, 1]
+    assert [event.seq for event in history.last(source=0, event_type=0x08)] == [0]
+
+
+def test_last_more_than_capacity():
+    history = make_history(3, 5)
+    assert len(history) == 3
+    assert [event.seq for event in history.last(10)] == [4, 3, 2]
+    assert [event.seq for event in history.last(10, event_type=0x01)] == [3]
+
+
+def test_since():
+    history = make_history(4, 10)
+    assert [event.seq for event in history.since(2.5, now=9)] == [7, 8, 9]
+    assert [event.seq for event in history.since(100, now=9)] == [6, 7, 8, 9]
@@ -0,0 +1,102 @@
+"""Keys of several multiplexer clients through JA80KeyArbiter, on a fake clock."""
+from types import SimpleNamespace
+
+from custom_components.Jablotron80.ja80 import JA80CommandQueue
+from custom_components.Jablotron80.mux import JA80KeyArbiter
+
+
+class Clock():
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_arbiter(max_retries=0):
+    clock = Clock()
+    transmitter = SimpleNamespace(pending=None, confirm_timeout=1.0, max_retries=max_retries)
+    cmd_q = JA80CommandQueue()
+    return JA80KeyArbiter(cmd_q, transmitter, clock), cmd_q, clock
+
+
+def send(arbiter, cmd_q, clock, client, keys, round_trip=0.1):
+    # the owner sends each key after the echo of the previous one
+    for key in keys:
+        arbiter.submit(client, key)
+        assert cmd_q.get_nowait() == key
+        clock.now += round_trip
+        arbiter.echo(key)
+        assert arbiter.check()
+
+
+def run_checks(arbiter, clock, seconds, interval=0.1):
+    for _ in range(round(seconds / interval)):
+        clock.now += interval
+        arbiter.check()
+
+
+def test_deferred_key_is_sent_after_the_command():
+    arbiter, cmd_q, clock = make_arbiter()
+    arbiter.submit('a', b'\x8f')
+    assert cmd_q.get_nowait() == b'\x8f'
+    arbiter.submit('b', b'\x81')
+    assert arbiter.deferred == 1
+    arbiter.echo(b'\x8f')
+    send(arbiter, cmd_q, clock, 'a', [b'\x81', b'\x82', b'\x83', b'\x84'])
+    assert cmd_q.empty()
+
+    run_checks(arbiter, clock, arbiter.HOLD + 0.1)
+    assert arbiter.owner == 'b'
+    assert cmd_q.get_nowait() == b'\x81'
+    assert arbiter.dropped == 0
+
+
+def test_deferred_key_expires():
+    arbiter, cmd_q, clock = make_arbiter()
+    arbiter.submit('a', b'\x8f')
+    cmd_q.get_nowait()
+    arbiter.submit('b', b'\x81')
+    # the echo of the owner's key never comes, the queue is released once the transmitter gives up
+    arbiter.abort()
+    arbiter._transmitter.pending = b'\x8f'
+    run_checks(arbiter, clock, 1.0)
+    arbiter._transmitter.pending = None
+    run_checks(arbiter, clock, 0.5)
+    assert arbiter.dropped == 1
+    assert arbiter.owner is None
+    assert cmd_q.empty()
+
+
+def test_key_wait_follows_the_retries():
+    assert make_arbiter()[0].key_wait == 1.0
+    assert make_arbiter(max_retries=2)[0].key_wait == 3.0
+
+
+def test_hold_handover():
+    arbiter, cmd_q, clock = make_arbiter()
+    send(arbiter, cmd_q, clock, 'a', [b'\x8f'])
+    arbiter.submit('b', b'\x82')
+    # within the hold the owner may send the next key of its command
+    clock.now += arbiter.HOLD / 2
+    assert arbiter.check()
+    send(arbiter, cmd_q, clock, 'a', [b'\x81'])
+    assert arbiter.owner == 'a'
+
+    clock.now += arbiter.HOLD + 0.01
+    assert arbiter.check()
+    assert arbiter.owner == 'b'
+    assert cmd_q.get_nowait() == b'\x82'
+    # a new key of the previous owner waits now
+    arbiter.submit('a', b'\x83')
+    assert arbiter.waiting_key('a') == b'\x83'
+    assert cmd_q.empty()
+
+
+def test_duplicate_key_of_the_owner_is_ignored():
+    arbiter, cmd_q, clock = make_arbiter()
+    arbiter.submit('a', b'\x81')
+    arbiter.submit('a', b'\x81')
+    assert arbiter.duplicates == 1
+    assert cmd_q.qsize() == 1
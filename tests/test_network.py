@@ -0,0 +1,212 @@
+"""Keys and reconnects over the tcp://, unix:// and rfc2217:// transports, against a panel on a local socket."""
+import asyncio
+import select
+import socket
+import threading
+import time
+
+import pytest
+
+from custom_components.Jablotron80.ja80 import JA80CommandQueue, JA80TConnection, JA80TSupervisor
+from custom_components.Jablotron80.protocol import encode_keys
+
+STATUS = bytes.fromhex('ed 40 00 00 30 00 00 00 60 ff')
+KEYS = encode_keys('*1234')
+
+
+class FakePanel():
+    """JA-80T at the other end of a socket: sends a status packet every 50 ms and echoes each key it receives."""
+
+    def __init__(self, family, address):
+        self._server = socket.socket(family, socket.SOCK_STREAM)
+        self._server.bind(address)
+        self._server.listen(1)
+        self._server.settimeout(0.1)
+        self.address = self._server.getsockname()
+        self.keys = bytearray()
+        self.connections = 0
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            self.connections += 1
+            self._conn = conn
+            try:
+                self.serve(conn)
+            except OSError:
+                pass
+            finally:
+                conn.close()
+
+    def serve(self, conn):
+        conn.settimeout(0.05)
+        while not self._stop.is_set() and self._conn is conn:
+            try:
+                data = conn.recv(64)
+            except socket.timeout:
+                conn.sendall(STATUS)
+                continue
+            if not data:
+                return
+            self.keys += data
+            conn.sendall(b''.join(bytes((key, 0xff)) for key in data))
+
+    def drop(self):
+        # close the connection to the client, the next one is accepted
+        self._conn = None
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._server.close()
+
+
+def wait_for(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture(params=['tcp', 'unix'])
+def panel(request, tmp_path):
+    if request.param == 'tcp':
+        panel = FakePanel(socket.AF_INET, ('127.0.0.1', 0))
+        panel.device = 'tcp://%s:%s' % panel.address
+    else:
+        path = str(tmp_path / 'ja80.sock')
+        panel = FakePanel(socket.AF_UNIX, path)
+        panel.device = 'unix://' + path
+    yield panel
+    panel.close()
+
+
+def test_keys_and_reconnect(panel):
+    connection = JA80TConnection(panel.device, JA80CommandQueue())
+    stop = threading.Event()
+    packets = []
+    supervisor = JA80TSupervisor(connection, stop, min_backoff=0.05)
+    thread = threading.Thread(target=supervisor.run, args=(packets.append, lambda signal: None))
+    thread.start()
+    try:
+        assert wait_for(lambda: packets)
+        for key in KEYS:
+            connection.cmd_q.put(key)
+        assert wait_for(lambda: connection.transmitter.confirmed == len(KEYS))
+        assert bytes(panel.keys) == b''.join(KEYS)
+
+        panel.drop()
+        assert wait_for(lambda: connection.metrics.reconnects == 1)
+        received = len(packets)
+        assert wait_for(lambda: len(packets) > received)
+        assert panel.connections == 2
+    finally:
+        stop.set()
+        thread.join()
+        connection.disconnect()
+    assert connection.transmitter.aborted == 0
+
+
+def test_keys_and_reconnect_asyncio(panel):
+    connection = JA80TConnection(panel.device, JA80CommandQueue())
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        packets = []
+        supervisor = JA80TSupervisor(connection, stop, min_backoff=0.05)
+        task = loop.create_task(supervisor.async_run(loop, packets.append, lambda signal: None))
+
+        async def wait_for_loop(condition, timeout=5):
+            end = loop.time() + timeout
+            while not condition():
+                assert loop.time() < end
+                await asyncio.sleep(0.01)
+
+        await wait_for_loop(lambda: packets)
+        for key in KEYS:
+            connection.cmd_q.put(key)
+        await wait_for_loop(lambda: connection.transmitter.confirmed == len(KEYS))
+        assert bytes(panel.keys) == b''.join(KEYS)
+
+        panel.drop()
+        await wait_for_loop(lambda: connection.metrics.reconnects == 1)
+        received = len(packets)
+        await wait_for_loop(lambda: len(packets) > received)
+
+        stop.set()
+        await connection.async_disconnect()
+        await task
+
+    asyncio.run(run())
+    assert connection.transmitter.aborted == 0
+
+
+def echo_port(serial):
+    # serial port of a panel behind an RFC2217 server, keys written to it are echoed with the end of packet marker
+    loop_class = serial.serial_for_url('loop://', do_not_open=True).__class__
+
+    class EchoPort(loop_class):
+        def write(self, data):
+            super().write(bytes(data) + b'\xff')
+            return len(data)
+    return EchoPort('loop://', timeout=0)
+
+
+def test_rfc2217_keys():
+    serial = pytest.importorskip('serial')
+    rfc2217 = pytest.importorskip('serial.rfc2217')
+    port = echo_port(serial)
+    server = socket.create_server(('127.0.0.1', 0))
+    stop = threading.Event()
+
+    class Writer():
+        # PortManager writes its telnet replies with write()
+        def __init__(self, sock):
+            self.write = sock.sendall
+
+    def serve():
+        conn, _ = server.accept()
+        manager = rfc2217.PortManager(port, Writer(conn))
+        try:
+            while not stop.is_set():
+                readable, _, _ = select.select([conn], [], [], 0.01)
+                if readable:
+                    data = conn.recv(1024)
+                    if not data:
+                        return
+                    keys = b''.join(manager.filter(data))
+                    if keys:
+                        port.write(keys)
+                waiting = port.in_waiting
+                if waiting:
+                    conn.sendall(b''.join(manager.escape(port.read(waiting))))
+        finally:
+            conn.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    connection = JA80TConnection('rfc2217://127.0.0.1:%s' % server.getsockname()[1], JA80CommandQueue())
+    try:
+        connection.connect(timeout=0.05)
+        for key in KEYS:
+            connection.cmd_q.put(key)
+        end = time.monotonic() + 5
+        while connection.transmitter.confirmed < len(KEYS) and time.monotonic() < end:
+            connection.read_send_packets()
+        assert connection.transmitter.confirmed == len(KEYS)
+        assert connection.transmitter.aborted == 0
+    finally:
+        stop.set()
+        connection.disconnect()
+        thread.join()
+        server.close()
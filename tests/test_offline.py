@@ -0,0 +1,53 @@
+"""The offline decoder keeps the same packets as the streaming framer, on a mock stream with lost bytes."""
+import pytest
+
+from custom_components.Jablotron80.capture import JA80CaptureWriter
+from custom_components.Jablotron80.mock import JA80MockTransport
+from custom_components.Jablotron80.protocol import JA80Framer
+
+np = pytest.importorskip('numpy')
+offline = pytest.importorskip('custom_components.Jablotron80.offline')
+
+
+def mock_stream(size):
+    transport = JA80MockTransport('mixed', timeout=0, rate=0, seed=3, drop_byte=0.02, drop_terminator=0.02)
+    data = b''
+    while len(data) < size:
+        data += transport.read(4096)
+    return data
+
+
+@pytest.mark.parametrize('read_size', [1, 7, 4096])
+def test_frame_matches_streaming_framer(read_size):
+    data = mock_stream(100000)
+    framer = JA80Framer()
+    packets = []
+    for start in range(0, len(data), read_size):
+        packets += framer.feed(data[start:start + read_size])
+
+    starts, lengths, framing = offline.frame(np, np.frombuffer(data, dtype=np.uint8))
+    assert [data[start:start + length] for start, length in zip(starts, lengths)] == packets
+    assert framing['frames'] == framer.frames
+    assert framing['resynced'] > 0
+
+
+def test_lost_end_of_key_echo():
+    data = bytes.fromhex('81 ed 40 00 00 30 00 00 00 60 ff 85 86 e3 02 01 23 36 08 09 3f ff')
+    starts, lengths, framing = offline.frame(np, np.frombuffer(data, dtype=np.uint8))
+    assert [data[start:start + length].hex(' ') for start, length in zip(starts, lengths)] == [
+        'ed 40 00 00 30 00 00 00 60 ff', 'e3 02 01 23 36 08 09 3f ff']
+    assert framing['resynced'] == 2
+
+
+def test_decode_capture_in_chunks(tmp_path):
+    data = mock_stream(20000)
+    path = str(tmp_path / 'ja80.cap')
+    writer = JA80CaptureWriter(path)
+    for start in range(0, len(data), 64):
+        writer.write(data[start:start + 64])
+    writer.close()
+
+    whole = offline.summarize(offline.decode_capture(path))
+    chunked = offline.summarize(offline.decode_capture(path, chunk_records=50))
+    assert whole['packets'] == chunked['packets']
+    assert whole['framing']['frames'] == chunked['framing']['frames'] == data.count(b'\xff')
@@ -0,0 +1,57 @@
+"""JA80Framer on truncated, corrupt and unknown frames."""
+from custom_components.Jablotron80.protocol import JA80Framer
+
+STATUS = bytes.fromhex('ed 40 00 00 30 00 00 00 60 ff')
+EVENT = bytes.fromhex('e3 02 01 23 36 08 09 3f ff')
+
+
+def feed(data, read_size=None):
+    framer = JA80Framer()
+    packets = []
+    read_size = read_size or len(data)
+    for start in range(0, len(data), read_size):
+        packets += framer.feed(data[start:start + read_size])
+    return framer, packets
+
+
+def test_valid_packets():
+    framer, packets = feed(STATUS + b'\x85\xff' + EVENT + b'\xa1\xff' + bytes.fromhex('e8 01 02 ff'), 3)
+    assert packets == [STATUS, b'\x85\xff', EVENT, b'\xa1\xff', bytes.fromhex('e8 01 02 ff')]
+    assert framer.corrupt == 0
+    assert framer.frames == 5
+
+
+def test_truncated_packet_is_dropped():
+    framer, packets = feed(STATUS[:4] + STATUS[5:] + EVENT)
+    assert packets == [EVENT]
+    assert framer.bad_length == 1
+    assert framer.resynced == 0
+
+
+def test_lost_end_of_packet_keeps_the_status_packet():
+    framer, packets = feed(b'\x81' + STATUS + EVENT[:-1] + STATUS)
+    assert packets == [STATUS, STATUS]
+    assert framer.corrupt == 2
+    assert framer.resynced == 2
+
+
+def test_no_resync_onto_key_or_beep():
+    # corrupt packets whose second to last byte looks like a key or beep, must not confirm a key that was not echoed
+    framer, packets = feed(bytes.fromhex('ed 40 00 30 00 00 00 85 ff') + bytes.fromhex('e3 02 a3 ff'))
+    assert packets == []
+    assert framer.bad_length == 2
+    assert framer.resynced == 0
+
+
+def test_unknown_type_is_passed_on():
+    unknown = bytes.fromhex('c1 02 83 ff')
+    framer, packets = feed(unknown + bytes.fromhex('40 00 00 30 00 00 00 60 ff'))
+    assert packets == [unknown, bytes.fromhex('40 00 00 30 00 00 00 60 ff')]
+    assert framer.corrupt == 0
+
+
+def test_overrun_keeps_corruption_rate_below_one():
+    framer, packets = feed(bytes(40) + STATUS, 16)
+    assert packets == [STATUS]
+    assert framer.overruns >= 2
+    assert 0 < framer.get_stats()['corruption_rate'] <= 1
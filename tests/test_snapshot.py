@@ -0,0 +1,56 @@
+"""Restore of the last known state saved by the JablotronAlarm entity, only states the panel stays in are restored, and
+the attributes written with the state."""
+import asyncio
+import os
+
+import pytest
+
+from .test_tamper import FakeHass
+
+EVENTS = [(1700000000.0, '02/01 23:36', 0x08, 9)]
+
+
+def restore(snapshot, **config):
+    pytest.importorskip('homeassistant')
+    from custom_components.Jablotron80 import alarm_control_panel as acp
+
+    async def run():
+        alarm = acp.JablotronAlarm(FakeHass(asyncio.get_running_loop()), {
+            acp.CONF_NAME: 'test',
+            acp.CONF_SERIAL_PORT: os.path.join(os.path.dirname(os.path.abspath(__file__)), 'no-such-port'),
+            acp.CONF_CODE_SENSOR_NAMES: {},
+            acp.CONF_CODE_ARM_REQUIRED: False,
+            acp.CONF_CODE_DISARM_REQUIRED: True,
+            **config,
+        }, None, snapshot)
+        alarm.shutdown_threads(None)
+        return alarm
+
+    alarm = asyncio.run(run())
+    alarm._io_pool_exc.shutdown()
+    return alarm
+
+
+def test_restore_armed_state():
+    alarm = restore({'state': 'armed_away', 'armed_state': 'armed_night', 'leds': {'a': True}, 'events': EVENTS})
+    assert alarm.state == 'armed_away'
+    assert alarm._armed_state == 'armed_night'
+    assert alarm._stale
+    assert alarm.available
+    assert [event['sensor_id'] for event in alarm.get_events()] == [9]
+
+
+@pytest.mark.parametrize('state', ['triggered', 'arming', 'CANCEL_ALARM', 'STATE_TAMPER_SENSORS_OK'])
+def test_transient_state_is_not_restored(state):
+    alarm = restore({'state': state, 'armed_state': 'armed_away', 'leds': {'a': True}, 'events': EVENTS})
+    assert alarm.state is None
+    assert alarm._armed_state is None
+    assert not alarm._stale
+    # the events are history, they are restored with any state
+    assert len(alarm.get_events()) == 1
+
+
+def test_last_events_attribute_is_opt_in():
+    snapshot = {'state': 'disarmed', 'events': EVENTS * 3}
+    assert 'last_events' not in restore(snapshot).state_attributes
+    assert len(restore(snapshot, last_events=2).state_attributes['last_events']) == 2
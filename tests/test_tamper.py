@@ -0,0 +1,143 @@
+"""Tamper alarm filter, and the cancel of a tamper alarm by the JablotronAlarm entity with the panel driven by the mock
+transport."""
+import asyncio
+import os
+
+import pytest
+
+from custom_components.Jablotron80.const import ACTION_ARM_AWAY, ACTION_DISARM_CODE
+from custom_components.Jablotron80.mock import JA80MockTransport
+from custom_components.Jablotron80.protocol import JA80Framer, encode_command
+from custom_components.Jablotron80.tamper import JA80TamperFilter
+
+ARMED = 'ed 42 00 00 30 00 00 00 60 ff'
+ARMING = 'ed 53 0c 00 3e 04 00 28 0b ff'
+DISARMED = 'ed 40 00 00 30 00 00 00 60 ff'
+TRIGGERED = 'ed 44 0c 00 3e 04 00 28 0b ff'
+TAMPER_ALARM = 'e3 02 01 23 40 05 03 3f ff'  # tamper of sensor 3
+MOTION_ALARM = 'e3 02 01 23 42 01 03 3f ff'
+CANCEL_ALARM = 'e3 02 01 23 41 4e 49 3f ff'
+
+
+def test_filter_threshold():
+    tamper_filter = JA80TamperFilter(2, 600)
+    assert tamper_filter.record(3, now=0)
+    assert tamper_filter.record(3, now=1)
+    assert not tamper_filter.record(3, now=2)
+    assert tamper_filter.count(3, now=3) == 3
+    assert (tamper_filter.suppressed, tamper_filter.passed) == (2, 1)
+
+
+def test_filter_window_expires():
+    tamper_filter = JA80TamperFilter(1, 60)
+    assert tamper_filter.record(3, now=0)
+    assert not tamper_filter.record(3, now=30)
+    assert tamper_filter.count(now=59) == 2
+    assert tamper_filter.count(now=61) == 1
+    assert tamper_filter.record(3, now=200)
+
+
+def test_filter_other_sensor_is_not_suppressed():
+    tamper_filter = JA80TamperFilter(5, 600)
+    assert tamper_filter.record(3, now=0)
+    assert not tamper_filter.record(4, now=1)
+
+
+def test_filter_disabled():
+    assert not JA80TamperFilter(0, 600).record(3, now=0)
+    assert not JA80TamperFilter(1, 0).record(3, now=0)
+
+
+class FakeBus():
+
+    def __init__(self):
+        self.events = []
+
+    def async_listen(self, event_type, listener):
+        return lambda: None
+
+    def async_fire(self, event_type, data):
+        self.events.append((event_type, data))
+
+
+class FakeHass():
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.bus = FakeBus()
+        self.data = {}
+
+
+class MockPanel():
+    """Packets from the mock transport, passed to the entity the way its I/O thread does."""
+
+    def __init__(self, alarm):
+        self.alarm = alarm
+        self.framer = JA80Framer()
+
+    async def send(self, *packets):
+        transport = JA80MockTransport(list(packets), rate=0, timeout=0)
+        data = transport.read(sum(len(bytes.fromhex(packet)) for packet in packets))
+        for packet in self.framer.feed(data):
+            self.alarm._handle_packet(packet)
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+    def keys(self):
+        keys = []
+        while not self.alarm._command_q.empty():
+            keys.append(self.alarm._command_q.get_nowait())
+        return keys
+
+
+def test_cancel_tamper_alarm():
+    pytest.importorskip('homeassistant')
+    from custom_components.Jablotron80 import alarm_control_panel as acp
+
+    published = []
+
+    async def run():
+        hass = FakeHass(asyncio.get_running_loop())
+        # the port does not exist, the I/O thread of the entity waits for it, the test sends the packets
+        alarm = acp.JablotronAlarm(hass, {
+            acp.CONF_NAME: 'test',
+            acp.CONF_SERIAL_PORT: os.path.join(os.path.dirname(os.path.abspath(__file__)), 'no-such-port'),
+            acp.CONF_CODE: '1234',
+            acp.CONF_CODE_ARM_REQUIRED: False,
+            acp.CONF_CODE_DISARM_REQUIRED: False,
+            acp.CONF_CODE_PANEL_ARM_REQUIRED: False,
+            acp.CONF_CODE_PANEL_DISARM_REQUIRED: True,
+            acp.CONF_CODE_SENSOR_NAMES: {},
+            acp.CONF_PUBLISH_WINDOW: 0,
+            acp.CONF_TAMPER_THRESHOLD: 1,
+            acp.CONF_TAMPER_WINDOW: 10,
+        })
+        alarm.entity_id = 'alarm_control_panel.test'
+        alarm._async_update = lambda: published.append(alarm._state)
+        try:
+            while alarm._system is None:
+                await asyncio.sleep(0.01)
+            panel = MockPanel(alarm)
+            await panel.send(ARMED)
+            assert published == ['armed_away']
+
+            await panel.send(TAMPER_ALARM, TRIGGERED)
+            assert panel.keys() == encode_command(ACTION_DISARM_CODE, '1234')
+            # the alarm stays suppressed after the transient cancel state, until the panel is armed again
+            await panel.send(CANCEL_ALARM, TRIGGERED, DISARMED)
+            assert panel.keys() == encode_command(ACTION_ARM_AWAY)
+            await panel.send(ARMING, TRIGGERED, ARMED)
+            assert 'triggered' not in published
+            assert published[-1] == 'armed_away'
+            assert hass.bus.events == [(acp.EVENT_TAMPER_SUPPRESSED, {
+                'entity_id': 'alarm_control_panel.test', 'sensor_id': 3, 'sensor': '?', 'tamper_count': 1})]
+
+            # once re-armed an alarm is reported again
+            await panel.send(MOTION_ALARM, TRIGGERED)
+            assert published[-1] == 'triggered'
+        finally:
+            alarm.shutdown_threads(None)
+        return alarm
+
+    alarm = asyncio.run(run())
+    alarm._io_pool_exc.shutdown()